@@ -38,6 +38,19 @@ DROP VIEW IF EXISTS v_actor_detail_stats;
 DROP VIEW IF EXISTS v_daily_event_trends;
 
 -- 删除表（按依赖关系倒序）
+DROP TABLE IF EXISTS overview_counters;
+DROP TABLE IF EXISTS data_versions;
+DROP TABLE IF EXISTS archive_hour_digests;
+DROP TABLE IF EXISTS index_profile_runs;
+DROP TABLE IF EXISTS events_archive;
+DROP TABLE IF EXISTS repo_related;
+DROP TABLE IF EXISTS stats_job_runs;
+DROP TABLE IF EXISTS rebuild_progress;
+DROP TABLE IF EXISTS stats_dirty_days;
+DROP TABLE IF EXISTS trending_state;
+DROP TABLE IF EXISTS repo_actor_sketches;
+DROP TABLE IF EXISTS actor_activity_daily;
+DROP TABLE IF EXISTS repo_activity_hourly;
 DROP TABLE IF EXISTS event_stats_daily;
 DROP TABLE IF EXISTS user_repo_relation;
 DROP TABLE IF EXISTS actor_stats_cache;
@@ -45,6 +58,7 @@ DROP TABLE IF EXISTS repo_stats_cache;
 DROP TABLE IF EXISTS active_developers;
 DROP TABLE IF EXISTS hot_repos;
 DROP TABLE IF EXISTS events;
+DROP TABLE IF EXISTS event_types;
 DROP TABLE IF EXISTS payload_delete;
 DROP TABLE IF EXISTS payload_create;
 DROP TABLE IF EXISTS payload_watch;
@@ -293,7 +307,7 @@ CREATE TABLE payload_delete (
 CREATE TABLE events (
     event_id BIGINT UNSIGNED AUTO_INCREMENT COMMENT '事件ID（自增主键）',
     gh_event_id BIGINT UNSIGNED NOT NULL COMMENT 'GitHub事件ID',
-    event_type VARCHAR(50) NOT NULL COMMENT '事件类型',
+    type_code TINYINT UNSIGNED NOT NULL COMMENT '事件类型编码（关联event_types.type_code）',
     public TINYINT(1) NOT NULL DEFAULT 1 COMMENT '是否公开（0=否，1=是）',
     created_at DATETIME NOT NULL COMMENT '事件发生时间',
     created_at_date DATE NOT NULL COMMENT '事件发生日期（用于分区）',
@@ -304,26 +318,24 @@ CREATE TABLE events (
     org_id INT UNSIGNED COMMENT '组织ID（关联organizations.org_id，可为空）',
     payload_id INT UNSIGNED NOT NULL COMMENT '载荷ID',
     
-    -- 冗余字段（减少JOIN查询）
-    actor_login VARCHAR(100) COMMENT '用户名（冗余）',
-    repo_name VARCHAR(255) COMMENT '仓库名（冗余）',
+    -- 类型名、用户名、仓库名不在事件行中重复存储，需要时关联 event_types/actors/repos
     
     -- 主键和唯一键
     PRIMARY KEY (event_id, created_at_date),
     UNIQUE KEY uk_gh_event_id (gh_event_id, created_at_date),
     
     -- 核心索引
-    INDEX idx_event_type (event_type, created_at),
+    INDEX idx_event_type (type_code, created_at),
     INDEX idx_created_at (created_at),
     INDEX idx_actor_repo (actor_id, repo_id, created_at),
-    INDEX idx_repo_type (repo_id, event_type, created_at),
+    INDEX idx_repo_type (repo_id, type_code, created_at),
     INDEX idx_created_date (created_at_date),
     INDEX idx_org_created (org_id, created_at),
     INDEX idx_actor_id (actor_id),
     INDEX idx_repo_id (repo_id),
     
     -- 覆盖索引
-    INDEX idx_actor_type_date (actor_id, event_type, created_at_date)
+    INDEX idx_actor_type_date (actor_id, type_code, created_at_date)
     
     -- 外键约束已移除（分区表限制）
     -- 数据完整性由应用层和触发器保证
@@ -399,6 +411,11 @@ CREATE TABLE event_stats_daily (
     unique_repos INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '唯一仓库数',
     unique_orgs INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '唯一组织数',
     
+    -- HyperLogLog 草图（固定 2+2^14 字节，误差约0.8%，可跨天/跨类型合并）
+    actors_hll BLOB COMMENT '去重用户草图',
+    repos_hll BLOB COMMENT '去重仓库草图',
+    orgs_hll BLOB COMMENT '去重组织草图',
+    
     -- 时间字段
     stats_time DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP 
         ON UPDATE CURRENT_TIMESTAMP COMMENT '统计时间',
@@ -548,6 +565,234 @@ CREATE TABLE actor_stats_cache (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 
   COMMENT='用户统计缓存表';
 
+-- 表19：仓库小时活跃汇总表（由摄取脚本增量维护，保留最近720小时）
+CREATE TABLE repo_activity_hourly (
+    repo_id INT UNSIGNED NOT NULL COMMENT '仓库ID',
+    stats_hour DATETIME NOT NULL COMMENT '小时桶（整点）',
+    event_count INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '事件总数',
+    star_count INT UNSIGNED NOT NULL DEFAULT 0 COMMENT 'WatchEvent数',
+    fork_count INT UNSIGNED NOT NULL DEFAULT 0 COMMENT 'ForkEvent数',
+    pr_count INT UNSIGNED NOT NULL DEFAULT 0 COMMENT 'PullRequestEvent数',
+    push_count INT UNSIGNED NOT NULL DEFAULT 0 COMMENT 'PushEvent数',
+    issue_count INT UNSIGNED NOT NULL DEFAULT 0 COMMENT 'IssuesEvent数',
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP 
+        ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    
+    -- 主键：单仓库任意窗口只需主键范围扫描
+    PRIMARY KEY (repo_id, stats_hour),
+    
+    -- 索引
+    INDEX idx_stats_hour (stats_hour)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 
+  COMMENT='仓库小时活跃汇总表';
+
+-- 表20：用户每日活跃汇总表（由摄取脚本增量维护）
+CREATE TABLE actor_activity_daily (
+    actor_id INT UNSIGNED NOT NULL COMMENT '用户ID',
+    stats_date DATE NOT NULL COMMENT '统计日期',
+    event_count INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '事件总数',
+    push_count INT UNSIGNED NOT NULL DEFAULT 0 COMMENT 'PushEvent数',
+    pr_count INT UNSIGNED NOT NULL DEFAULT 0 COMMENT 'PullRequestEvent数',
+    issue_count INT UNSIGNED NOT NULL DEFAULT 0 COMMENT 'IssuesEvent数',
+    watch_count INT UNSIGNED NOT NULL DEFAULT 0 COMMENT 'WatchEvent数',
+    fork_count INT UNSIGNED NOT NULL DEFAULT 0 COMMENT 'ForkEvent数',
+    repo_count INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '当天参与仓库数（草图估计）',
+    repo_sketch VARBINARY(1026) COMMENT '参与仓库HyperLogLog草图（可跨天合并）',
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP 
+        ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    
+    -- 主键：单用户全部历史只需主键范围扫描
+    PRIMARY KEY (actor_id, stats_date),
+    
+    -- 索引：按窗口找出活跃用户
+    INDEX idx_stats_date (stats_date, actor_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 
+  COMMENT='用户每日活跃汇总表';
+
+-- 表21：仓库关注者/贡献者草图表（由摄取脚本增量维护）
+CREATE TABLE repo_actor_sketches (
+    repo_id INT UNSIGNED PRIMARY KEY COMMENT '仓库ID',
+    watchers_est INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '关注者数（草图估计）',
+    contributors_est INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '贡献者数（草图估计）',
+    watchers_hll BLOB COMMENT 'WatchEvent用户HyperLogLog草图',
+    contributors_hll BLOB COMMENT '全部事件用户HyperLogLog草图',
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP 
+        ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 
+  COMMENT='仓库关注者/贡献者草图表';
+
+-- 表22：趋势追踪器状态表（摄取脚本维护，定期刷新到 hot_repos）
+CREATE TABLE trending_state (
+    name VARCHAR(50) PRIMARY KEY COMMENT '追踪器名称',
+    state MEDIUMBLOB COMMENT '压缩后的 Space-Saving 计数器',
+    tracked INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '当前跟踪的项数',
+    events_fed BIGINT UNSIGNED NOT NULL DEFAULT 0 COMMENT '累计计入的事件数',
+    flushed_at DATETIME NULL COMMENT '上次刷新 hot_repos 的时间',
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP 
+        ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 
+  COMMENT='趋势追踪器状态表';
+
+-- 表23：每日统计脏标记表（摄取脚本写入，每日统计任务重算后删除）
+CREATE TABLE stats_dirty_days (
+    stats_date DATE NOT NULL COMMENT '事件日期',
+    event_type VARCHAR(50) NOT NULL COMMENT '事件类型',
+    version INT UNSIGNED NOT NULL DEFAULT 1 COMMENT '标记版本（每次写入递增）',
+    dirty_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '最近标记时间',
+    
+    PRIMARY KEY (stats_date, event_type)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 
+  COMMENT='每日统计脏标记表';
+
+-- 表24：缓存重建进度表（分块重建逐块更新，中断后据此续跑）
+CREATE TABLE rebuild_progress (
+    job_name VARCHAR(50) PRIMARY KEY COMMENT '重建任务名（目标缓存表）',
+    last_id BIGINT UNSIGNED NOT NULL DEFAULT 0 COMMENT '已处理到的最大ID',
+    rows_done BIGINT UNSIGNED NOT NULL DEFAULT 0 COMMENT '已写入行数',
+    chunks_done INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '已完成块数',
+    started_at DATETIME NOT NULL COMMENT '本轮重建开始时间',
+    finished_at DATETIME NULL COMMENT '完成时间（NULL 表示未完成）',
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP 
+        ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 
+  COMMENT='缓存重建进度表';
+
+-- 表25：统计任务语句剖析表（每次运行每条语句一行，stmt_digest='-' 为作业总耗时）
+CREATE TABLE stats_job_runs (
+    run_id VARCHAR(40) NOT NULL COMMENT '运行ID（时间戳-进程号，可按字典序排序）',
+    job_name VARCHAR(100) NOT NULL COMMENT '作业（统计函数名）',
+    stmt_digest VARCHAR(16) NOT NULL COMMENT '语句模板摘要',
+    stmt_text TEXT COMMENT '语句模板（未代入参数）',
+    calls INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '执行次数',
+    wall_ms DECIMAL(14,2) NOT NULL DEFAULT 0 COMMENT '累计墙钟耗时（毫秒）',
+    rows_affected BIGINT UNSIGNED NOT NULL DEFAULT 0 COMMENT '累计影响行数',
+    rows_examined BIGINT UNSIGNED NULL COMMENT '累计扫描行数（performance_schema）',
+    handler_reads JSON COMMENT 'Handler_read_* 累计增量',
+    explain_json JSON NULL COMMENT 'EXPLAIN FORMAT=JSON（首次出现或变慢时抓取）',
+    regression TINYINT(1) NOT NULL DEFAULT 0 COMMENT '是否较基线明显变慢',
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '记录时间',
+    
+    PRIMARY KEY (run_id, job_name, stmt_digest),
+    INDEX idx_job_digest (job_name, stmt_digest, run_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 
+  COMMENT='统计任务语句剖析表';
+
+-- 表26：相关仓库表（related_repos.py 由用户-仓库关联稀疏矩阵批量计算，按仓库单键查询）
+CREATE TABLE repo_related (
+    repo_id INT UNSIGNED NOT NULL COMMENT '仓库ID',
+    relation_kind VARCHAR(20) NOT NULL COMMENT '关联类型（star=共同关注者，contributor=共同贡献者）',
+    rank_position SMALLINT UNSIGNED NOT NULL COMMENT '排名（从1开始）',
+    related_repo_id INT UNSIGNED NOT NULL COMMENT '相关仓库ID',
+    shared_actors INT UNSIGNED NOT NULL COMMENT '共同用户数',
+    score DECIMAL(8,6) NOT NULL COMMENT '余弦相似度',
+    updated_at DATETIME NOT NULL COMMENT '计算时间',
+    
+    PRIMARY KEY (repo_id, relation_kind, rank_position),
+    INDEX idx_kind_updated (relation_kind, updated_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 
+  COMMENT='相关仓库表';
+
+-- 表27：事件归档清单（archive_events.py 维护，exported -> verified -> dropped）
+CREATE TABLE events_archive (
+    month CHAR(7) NOT NULL COMMENT '归档月份（YYYY-MM）',
+    partition_name VARCHAR(20) NOT NULL COMMENT '原 events 分区名',
+    file_path VARCHAR(255) NOT NULL COMMENT 'Parquet 文件路径（相对 ARCHIVE_DIR）',
+    row_count BIGINT UNSIGNED NOT NULL COMMENT '行数',
+    row_checksum DECIMAL(30,0) NOT NULL COMMENT '逐行 CRC32 之和',
+    file_bytes BIGINT UNSIGNED NOT NULL COMMENT '文件大小（字节）',
+    status VARCHAR(20) NOT NULL COMMENT '状态（exported/verified/dropped）',
+    exported_at DATETIME NOT NULL COMMENT '导出时间',
+    verified_at DATETIME NULL COMMENT '校验通过时间',
+    dropped_at DATETIME NULL COMMENT '分区删除时间',
+    
+    PRIMARY KEY (month)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 
+  COMMENT='事件归档清单';
+
+-- 表28：事件类型字典表（events.type_code 的取值；前15个编码固定，其余由摄取脚本按需登记）
+CREATE TABLE event_types (
+    type_code TINYINT UNSIGNED PRIMARY KEY AUTO_INCREMENT COMMENT '事件类型编码',
+    type_name VARCHAR(50) NOT NULL COMMENT '事件类型名',
+    
+    UNIQUE KEY uk_type_name (type_name)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 
+  COMMENT='事件类型字典表';
+
+-- 表29：索引方案切换记录（index_profiles.py 维护，running -> done/failed）
+CREATE TABLE index_profile_runs (
+    run_id INT UNSIGNED PRIMARY KEY AUTO_INCREMENT COMMENT '切换ID',
+    table_name VARCHAR(64) NOT NULL COMMENT '表名',
+    profile VARCHAR(20) NOT NULL COMMENT '索引方案（full/serving/ingest）',
+    statement TEXT NOT NULL COMMENT '执行的 ALTER 语句',
+    status VARCHAR(20) NOT NULL COMMENT '状态（running/done/failed）',
+    stage VARCHAR(100) NULL COMMENT '当前 ALTER 阶段（performance_schema）',
+    progress DECIMAL(5,2) NULL COMMENT '当前阶段进度（%）',
+    error TEXT NULL COMMENT '失败原因',
+    started_at DATETIME NOT NULL COMMENT '开始时间',
+    finished_at DATETIME NULL COMMENT '完成时间',
+    
+    INDEX idx_table_run (table_name, run_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 
+  COMMENT='索引方案切换记录';
+
+-- 表30：GH Archive 小时摘要表（摄取时记录，reconcile.py 与 events 中同一小时的摘要比较）
+CREATE TABLE archive_hour_digests (
+    hour_start DATETIME NOT NULL COMMENT '小时起点（UTC）',
+    event_count INT UNSIGNED NOT NULL COMMENT '事件数',
+    type_counts JSON NOT NULL COMMENT '各类型事件数 {类型名: 数量}',
+    id_hash BIGINT UNSIGNED NOT NULL COMMENT 'gh_event_id 的 CRC32 之和',
+    computed_at DATETIME NOT NULL COMMENT '摘要计算时间',
+    checked_at DATETIME NULL COMMENT '最近核对时间',
+    check_status VARCHAR(20) NULL COMMENT '最近核对结果（match/reingested/mismatch）',
+    
+    PRIMARY KEY (hour_start)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 
+  COMMENT='GH Archive 小时摘要表';
+
+-- 表31：数据版本表（ETL 任务写入后递增，Web 端响应缓存以版本号失效）
+CREATE TABLE data_versions (
+    name VARCHAR(20) NOT NULL COMMENT '数据名称（events/stats/related/archive）',
+    version BIGINT UNSIGNED NOT NULL DEFAULT 0 COMMENT '版本号',
+    updated_at DATETIME NOT NULL COMMENT '最近更新时间',
+    
+    PRIMARY KEY (name)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 
+  COMMENT='数据版本表';
+
+-- 表32：概览计数器（单行，摄取时按新写入行数递增、归档删除分区时递减，/api/stats/overview 按主键读取）
+CREATE TABLE overview_counters (
+    id TINYINT UNSIGNED NOT NULL COMMENT '固定为1',
+    total_events BIGINT NOT NULL DEFAULT 0 COMMENT 'events 表行数',
+    total_actors BIGINT NOT NULL DEFAULT 0 COMMENT 'actors 表行数',
+    total_repos BIGINT NOT NULL DEFAULT 0 COMMENT 'repos 表行数',
+    total_orgs BIGINT NOT NULL DEFAULT 0 COMMENT 'organizations 表行数',
+    latest_event DATETIME COMMENT '最新事件时间',
+    updated_at DATETIME NOT NULL COMMENT '计数器最近更新时间（数据新鲜度）',
+    
+    PRIMARY KEY (id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 
+  COMMENT='概览计数器';
+
+-- 固定编码（与 ghpulse_etl/event_types.py 一致，触发器和存储过程按编码比较）
+INSERT INTO event_types (type_code, type_name) VALUES
+    (1, 'PushEvent'),
+    (2, 'PullRequestEvent'),
+    (3, 'IssuesEvent'),
+    (4, 'WatchEvent'),
+    (5, 'ForkEvent'),
+    (6, 'CreateEvent'),
+    (7, 'DeleteEvent'),
+    (8, 'IssueCommentEvent'),
+    (9, 'PullRequestReviewEvent'),
+    (10, 'PullRequestReviewCommentEvent'),
+    (11, 'CommitCommentEvent'),
+    (12, 'ReleaseEvent'),
+    (13, 'MemberEvent'),
+    (14, 'PublicEvent'),
+    (15, 'GollumEvent');
+
+INSERT INTO overview_counters (id, updated_at) VALUES (1, NOW());
+
 -- ========================================
 -- 第七部分：存储过程
 -- ========================================
@@ -619,14 +864,15 @@ BEGIN
     )
     SELECT 
         p_target_date AS stats_date,
-        event_type,
+        t.type_name AS event_type,
         COUNT(*) AS total_count,
-        COUNT(DISTINCT actor_id) AS unique_actors,
-        COUNT(DISTINCT repo_id) AS unique_repos,
-        COUNT(DISTINCT org_id) AS unique_orgs
-    FROM events
-    WHERE created_at_date = p_target_date
-    GROUP BY event_type;
+        COUNT(DISTINCT e.actor_id) AS unique_actors,
+        COUNT(DISTINCT e.repo_id) AS unique_repos,
+        COUNT(DISTINCT e.org_id) AS unique_orgs
+    FROM events e
+    INNER JOIN event_types t ON t.type_code = e.type_code
+    WHERE e.created_at_date = p_target_date
+    GROUP BY t.type_name;
     
     SET v_rows_affected = ROW_COUNT();
     
@@ -673,19 +919,19 @@ BEGIN
     LEFT JOIN (
         SELECT repo_id, COUNT(*) AS cnt
         FROM events
-        WHERE event_type = 'WatchEvent' AND created_at_date >= v_start_date
+        WHERE type_code = 4 /* WatchEvent */ AND created_at_date >= v_start_date
         GROUP BY repo_id
     ) stars ON r.repo_id = stars.repo_id
     LEFT JOIN (
         SELECT repo_id, COUNT(*) AS cnt
         FROM events
-        WHERE event_type = 'ForkEvent' AND created_at_date >= v_start_date
+        WHERE type_code = 5 /* ForkEvent */ AND created_at_date >= v_start_date
         GROUP BY repo_id
     ) forks ON r.repo_id = forks.repo_id
     LEFT JOIN (
         SELECT repo_id, COUNT(*) AS cnt
         FROM events
-        WHERE event_type = 'PullRequestEvent' AND created_at_date >= v_start_date
+        WHERE type_code = 2 /* PullRequestEvent */ AND created_at_date >= v_start_date
         GROUP BY repo_id
     ) prs ON r.repo_id = prs.repo_id
     LEFT JOIN (
@@ -747,19 +993,19 @@ BEGIN
     LEFT JOIN (
         SELECT actor_id, COUNT(*) AS cnt
         FROM events
-        WHERE event_type = 'PushEvent' AND created_at_date >= v_start_date
+        WHERE type_code = 1 /* PushEvent */ AND created_at_date >= v_start_date
         GROUP BY actor_id
     ) commits ON a.actor_id = commits.actor_id
     LEFT JOIN (
         SELECT actor_id, COUNT(*) AS cnt
         FROM events
-        WHERE event_type = 'PullRequestEvent' AND created_at_date >= v_start_date
+        WHERE type_code = 2 /* PullRequestEvent */ AND created_at_date >= v_start_date
         GROUP BY actor_id
     ) prs ON a.actor_id = prs.actor_id
     LEFT JOIN (
         SELECT actor_id, COUNT(*) AS cnt
         FROM events
-        WHERE event_type = 'IssuesEvent' AND created_at_date >= v_start_date
+        WHERE type_code = 3 /* IssuesEvent */ AND created_at_date >= v_start_date
         GROUP BY actor_id
     ) issues ON a.actor_id = issues.actor_id
     LEFT JOIN (
@@ -840,27 +1086,27 @@ BEGIN
     SELECT 
         p_repo_id,
         COALESCE((SELECT COUNT(*) FROM events 
-                  WHERE repo_id = p_repo_id AND event_type = 'WatchEvent'), 0),
+                  WHERE repo_id = p_repo_id AND type_code = 4 /* WatchEvent */), 0),
         COALESCE((SELECT COUNT(*) FROM events 
-                  WHERE repo_id = p_repo_id AND event_type = 'ForkEvent'), 0),
+                  WHERE repo_id = p_repo_id AND type_code = 5 /* ForkEvent */), 0),
         COALESCE((SELECT COUNT(DISTINCT actor_id) FROM events 
-                  WHERE repo_id = p_repo_id AND event_type = 'WatchEvent'), 0),
+                  WHERE repo_id = p_repo_id AND type_code = 4 /* WatchEvent */), 0),
         COALESCE((SELECT COUNT(DISTINCT actor_id) FROM events 
                   WHERE repo_id = p_repo_id), 0),
         COALESCE((SELECT COUNT(*) FROM events 
-                  WHERE repo_id = p_repo_id AND event_type = 'PushEvent'), 0),
+                  WHERE repo_id = p_repo_id AND type_code = 1 /* PushEvent */), 0),
         COALESCE((SELECT COUNT(*) FROM events 
-                  WHERE repo_id = p_repo_id AND event_type = 'PullRequestEvent'), 0),
+                  WHERE repo_id = p_repo_id AND type_code = 2 /* PullRequestEvent */), 0),
         COALESCE((SELECT COUNT(*) FROM events 
-                  WHERE repo_id = p_repo_id AND event_type = 'IssuesEvent'), 0),
+                  WHERE repo_id = p_repo_id AND type_code = 3 /* IssuesEvent */), 0),
         COALESCE((SELECT COUNT(*) FROM events 
-                  WHERE repo_id = p_repo_id AND event_type = 'WatchEvent'
+                  WHERE repo_id = p_repo_id AND type_code = 4 /* WatchEvent */
                   AND created_at_date >= v_start_date_1d), 0),
         COALESCE((SELECT COUNT(*) FROM events 
-                  WHERE repo_id = p_repo_id AND event_type = 'WatchEvent'
+                  WHERE repo_id = p_repo_id AND type_code = 4 /* WatchEvent */
                   AND created_at_date >= v_start_date_7d), 0),
         COALESCE((SELECT COUNT(*) FROM events 
-                  WHERE repo_id = p_repo_id AND event_type = 'WatchEvent'
+                  WHERE repo_id = p_repo_id AND type_code = 4 /* WatchEvent */
                   AND created_at_date >= v_start_date_30d), 0)
     ON DUPLICATE KEY UPDATE
         total_stars = VALUES(total_stars),
@@ -936,14 +1182,14 @@ BEGIN
     WHERE repo_id = NEW.repo_id;
     
     -- 处理Star事件
-    IF NEW.event_type = 'WatchEvent' THEN
+    IF NEW.type_code = 4 /* WatchEvent */ THEN
         UPDATE repos 
         SET total_stars = total_stars + 1 
         WHERE repo_id = NEW.repo_id;
     END IF;
     
     -- 处理Fork事件
-    IF NEW.event_type = 'ForkEvent' THEN
+    IF NEW.type_code = 5 /* ForkEvent */ THEN
         UPDATE repos 
         SET total_forks = total_forks + 1 
         WHERE repo_id = NEW.repo_id;
@@ -959,8 +1205,8 @@ BEGIN
     
     -- 确定关联类型
     SET v_relation_type = CASE 
-        WHEN NEW.event_type = 'WatchEvent' THEN 'star'
-        WHEN NEW.event_type = 'ForkEvent' THEN 'fork'
+        WHEN NEW.type_code = 4 /* WatchEvent */ THEN 'star'
+        WHEN NEW.type_code = 5 /* ForkEvent */ THEN 'fork'
         ELSE 'contributor'
     END;
     
@@ -999,14 +1245,15 @@ CREATE OR REPLACE VIEW v_recent_events_summary AS
 SELECT 
     e.event_id,
     e.gh_event_id,
-    e.event_type,
+    t.type_name AS event_type,
     e.created_at,
-    e.actor_login,
-    e.repo_name,
+    a.login AS actor_login,
+    r.name AS repo_name,
     a.display_login,
     r.total_stars,
     r.total_forks
 FROM events e
+INNER JOIN event_types t ON e.type_code = t.type_code
 INNER JOIN actors a ON e.actor_id = a.actor_id
 INNER JOIN repos r ON e.repo_id = r.repo_id
 WHERE e.created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY)
@@ -18,6 +18,10 @@ GRANT EXECUTE ON PROCEDURE ghpulse.sp_update_active_developers TO 'ingest_user'@
 GRANT EXECUTE ON PROCEDURE ghpulse.sp_refresh_repo_stats TO 'ingest_user'@'%';
 GRANT EXECUTE ON PROCEDURE ghpulse.sp_cleanup_old_data TO 'ingest_user'@'%';
 GRANT EXECUTE ON PROCEDURE ghpulse.sp_validate_event_data TO 'ingest_user'@'%';
+-- 分块重建缓存时检查从库延迟（SHOW REPLICA STATUS）
+GRANT REPLICATION CLIENT ON *.* TO 'ingest_user'@'%';
+-- 统计任务剖析读取语句扫描行数
+GRANT SELECT ON performance_schema.events_statements_history TO 'ingest_user'@'%';
 
 -- 3. 创建Web只读用户（用于前端展示）
 CREATE USER 'web_user'@'%' IDENTIFIED BY 'your_web_password';
@@ -30,6 +34,14 @@ CREATE USER 'admin_user'@'%' IDENTIFIED BY 'your_admin_password';
 
 -- 授予admin_user完全权限
 GRANT ALL PRIVILEGES ON ghpulse.* TO 'admin_user'@'%';
+-- 索引方案工具读取索引使用统计、语句摘要和 ALTER 进度（只授予用到的表）
+GRANT SELECT ON performance_schema.table_io_waits_summary_by_index_usage TO 'admin_user'@'%';
+GRANT SELECT ON performance_schema.events_statements_summary_by_digest TO 'admin_user'@'%';
+GRANT SELECT ON performance_schema.events_stages_current TO 'admin_user'@'%';
+GRANT SELECT ON performance_schema.threads TO 'admin_user'@'%';
+-- 开启 stage/innodb/alter% 采集（UPDATE ... WHERE 同时需要 SELECT）
+GRANT SELECT, UPDATE ON performance_schema.setup_instruments TO 'admin_user'@'%';
+GRANT SELECT, UPDATE ON performance_schema.setup_consumers TO 'admin_user'@'%';
 
 -- 5. 刷新权限
 FLUSH PRIVILEGES;
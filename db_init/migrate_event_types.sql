@@ -0,0 +1,63 @@
+-- ========================================
+-- 迁移：events 表事件类型字典化
+-- 适用于已按旧版 db_init.sql 建库的数据库（新库直接执行 db_init.sql 即可）
+-- event_type VARCHAR(50) -> type_code TINYINT UNSIGNED（关联 event_types），
+-- 删除冗余的 actor_login / repo_name 列（需要时关联 actors / repos）
+-- 使用 admin_user 在维护窗口执行；执行前请先停止摄取脚本
+-- ========================================
+USE ghpulse;
+
+-- 1. 字典表及固定编码（与 ghpulse_etl/event_types.py 一致）
+CREATE TABLE IF NOT EXISTS event_types (
+    type_code TINYINT UNSIGNED PRIMARY KEY AUTO_INCREMENT COMMENT '事件类型编码',
+    type_name VARCHAR(50) NOT NULL COMMENT '事件类型名',
+
+    UNIQUE KEY uk_type_name (type_name)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+  COMMENT='事件类型字典表';
+
+INSERT IGNORE INTO event_types (type_code, type_name) VALUES
+    (1, 'PushEvent'),
+    (2, 'PullRequestEvent'),
+    (3, 'IssuesEvent'),
+    (4, 'WatchEvent'),
+    (5, 'ForkEvent'),
+    (6, 'CreateEvent'),
+    (7, 'DeleteEvent'),
+    (8, 'IssueCommentEvent'),
+    (9, 'PullRequestReviewEvent'),
+    (10, 'PullRequestReviewCommentEvent'),
+    (11, 'CommitCommentEvent'),
+    (12, 'ReleaseEvent'),
+    (13, 'MemberEvent'),
+    (14, 'PublicEvent'),
+    (15, 'GollumEvent');
+
+-- 登记已有数据中的其他类型
+INSERT IGNORE INTO event_types (type_name)
+SELECT DISTINCT event_type FROM events WHERE event_type <> '';
+
+-- 2. 新增编码列并回填
+ALTER TABLE events
+    ADD COLUMN type_code TINYINT UNSIGNED NOT NULL DEFAULT 0
+        COMMENT '事件类型编码（关联event_types.type_code）' AFTER gh_event_id;
+
+UPDATE events e
+INNER JOIN event_types t ON t.type_name = e.event_type
+SET e.type_code = t.type_code;
+
+-- 3. 删除旧列，按编码重建索引（表重建一次完成）
+ALTER TABLE events
+    DROP INDEX idx_event_type,
+    DROP INDEX idx_repo_type,
+    DROP INDEX idx_actor_type_date,
+    DROP COLUMN event_type,
+    DROP COLUMN actor_login,
+    DROP COLUMN repo_name,
+    ALTER COLUMN type_code DROP DEFAULT,
+    ADD INDEX idx_event_type (type_code, created_at),
+    ADD INDEX idx_repo_type (repo_id, type_code, created_at),
+    ADD INDEX idx_actor_type_date (actor_id, type_code, created_at_date);
+
+-- 4. 触发器、存储过程和视图引用了旧列，请重新执行 db_init.sql 的第七～九部分
+--    （摄取脚本每次运行结束时也会按新定义重建触发器）
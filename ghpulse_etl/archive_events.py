@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+GHPulse 冷分区归档脚本
+把已结束月份的 events 分区（连同载荷表中的行）导出为 zstd 压缩的 Parquet 文件，
+按 month=YYYY-MM 目录分区存放在本地磁盘；校验行数和校验和一致后删除该分区及其载荷行。
+
+归档记录写入 events_archive 表，Web 端据此从 Parquet 文件查询已归档月份的事件。
+每个月份依次经过 exported -> verified -> dropped 三个状态，中断后重新执行会从当前状态继续。
+
+依赖 pyarrow（可选依赖，仅归档和查询归档需要）。
+"""
+
+import os
+import sys
+import zlib
+import argparse
+import logging
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+import pymysql
+import pyarrow as pa
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+
+from event_types import PUSH, WATCH, FORK, CREATE
+from data_versions import bump_version, ARCHIVE
+from rollups import add_overview_counts
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout),
+        logging.FileHandler('archive_events.log', encoding='utf-8')
+    ]
+)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST'),
+    'port': int(os.getenv('DB_PORT', 3306)),
+    'user': os.getenv('DB_USER'),
+    'password': os.getenv('DB_PASSWORD'),
+    'database': os.getenv('DB_NAME'),
+    'charset': 'utf8mb4'
+}
+
+# 删除分区需要 ALTER 权限，使用管理员账号
+ADMIN_CONFIG = dict(DB_CONFIG, user=os.getenv('ADMIN_USER'), password=os.getenv('ADMIN_PASSWORD'))
+
+# 归档根目录（Web 端需配置相同的 ARCHIVE_DIR）
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', 'archive')
+
+# 默认保留在 MySQL 中的完整月份数（不含当月）
+DEFAULT_KEEP_MONTHS = 12
+
+# 每次 fetchmany 的行数，同时是 Parquet 行组大小
+FETCH_ROWS = 100_000
+
+# 删除载荷行时每批的ID数
+DELETE_BATCH = 5000
+
+# 事件类型 -> 载荷表（其余类型的 payload_id 都指向占位行 1，不删除）
+PAYLOAD_TABLES = {
+    'PushEvent': 'payload_push',
+    'WatchEvent': 'payload_star',
+    'ForkEvent': 'payload_fork',
+    'CreateEvent': 'payload_create',
+}
+
+# 导出的列：事件列在前（类型名、用户名、仓库名由字典表解析后一并写入，归档文件自包含），
+# 载荷列按类型加前缀展开（非对应类型为空）
+SCHEMA = pa.schema([
+    ('event_id', pa.uint64()),
+    ('gh_event_id', pa.uint64()),
+    ('type_code', pa.uint8()),
+    ('event_type', pa.string()),
+    ('public', pa.int8()),
+    ('created_at', pa.timestamp('s')),
+    ('created_at_date', pa.date32()),
+    ('actor_id', pa.uint32()),
+    ('repo_id', pa.uint32()),
+    ('org_id', pa.uint32()),
+    ('payload_id', pa.uint32()),
+    ('actor_login', pa.string()),
+    ('repo_name', pa.string()),
+    ('push_id', pa.uint64()),
+    ('push_size', pa.int32()),
+    ('push_distinct_size', pa.int32()),
+    ('push_head', pa.string()),
+    ('push_ref', pa.string()),
+    ('star_repo_id', pa.uint32()),
+    ('forkee_id', pa.uint32()),
+    ('forkee_name', pa.string()),
+    ('create_ref', pa.string()),
+    ('create_ref_type', pa.string()),
+    ('create_description', pa.string()),
+])
+
+EXPORT_SQL = f"""
+    SELECT
+        e.event_id, e.gh_event_id, e.type_code, t.type_name, e.public, e.created_at, e.created_at_date,
+        e.actor_id, e.repo_id, e.org_id, e.payload_id, a.login, r.name,
+        pp.push_id, pp.size, pp.distinct_size, pp.head, pp.ref,
+        ps.star_repo_id,
+        pf.forkee_id, pf.forkee_name,
+        pc.ref, pc.ref_type, pc.description
+    FROM events PARTITION ({{partition}}) e
+    LEFT JOIN event_types t ON t.type_code = e.type_code
+    LEFT JOIN actors a ON a.actor_id = e.actor_id
+    LEFT JOIN repos r ON r.repo_id = e.repo_id
+    LEFT JOIN payload_push pp ON e.type_code = {PUSH} AND pp.payload_id = e.payload_id
+    LEFT JOIN payload_star ps ON e.type_code = {WATCH} AND ps.payload_id = e.payload_id
+    LEFT JOIN payload_fork pf ON e.type_code = {FORK} AND pf.payload_id = e.payload_id
+    LEFT JOIN payload_create pc ON e.type_code = {CREATE} AND pc.payload_id = e.payload_id
+    ORDER BY e.event_id
+"""
+
+# 校验和：逐行 CRC32 求和（与行顺序无关），MySQL 和 Parquet 两侧按相同格式拼接
+CHECKSUM_SQL = """
+    SELECT COUNT(*), COALESCE(SUM(CRC32(CONCAT_WS('#',
+        event_id, gh_event_id, type_code, created_at, actor_id, repo_id, payload_id
+    ))), 0)
+    FROM events PARTITION ({partition})
+"""
+
+
+def row_checksum(event_id, gh_event_id, type_code, created_at, actor_id, repo_id, payload_id) -> int:
+    """与 CHECKSUM_SQL 相同格式的单行 CRC32"""
+    text = '#'.join([
+        str(event_id), str(gh_event_id), str(type_code),
+        created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        str(actor_id), str(repo_id), str(payload_id)
+    ])
+    return zlib.crc32(text.encode('utf-8'))
+
+
+def get_db_connection(config=DB_CONFIG):
+    """获取数据库连接"""
+    try:
+        return pymysql.connect(**config)
+    except Exception as e:
+        logger.error(f"数据库连接失败: {e}")
+        raise
+
+
+def month_path(month: str) -> str:
+    """归档文件相对路径（相对 ARCHIVE_DIR，Hive 风格目录分区）"""
+    return os.path.join('events', f'month={month}', 'events.parquet')
+
+
+def closed_partitions(cursor, keep_months: int) -> List[Tuple[str, str]]:
+    """
+    可归档的月份分区：名称为 pYYYYMM、非空，且整月早于最近 keep_months 个完整月份
+
+    Returns:
+        [(分区名, 'YYYY-MM')]，按月份升序
+    """
+    today = date.today()
+    index = today.year * 12 + today.month - 1 - keep_months
+    cutoff = date(index // 12, index % 12 + 1, 1)
+
+    cursor.execute("""
+        SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'events'
+          AND PARTITION_NAME REGEXP '^p[0-9]{6}$'
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """)
+    result = []
+    for name, description in cursor.fetchall():
+        # PARTITION_DESCRIPTION 形如 '2024-02-01'（带引号），即该分区的上界
+        upper = datetime.strptime(description.strip("'"), '%Y-%m-%d').date()
+        if upper <= cutoff:
+            result.append((name, f'{name[1:5]}-{name[5:7]}'))
+    return result
+
+
+def export_partition(conn, partition: str, month: str) -> Tuple[int, str, int]:
+    """
+    流式导出一个分区到 Parquet（先写临时文件，完成后原子改名）
+
+    Returns:
+        (行数, 相对路径, 文件字节数)
+    """
+    relative = month_path(month)
+    path = os.path.join(ARCHIVE_DIR, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+
+    rows_written = 0
+    cursor = conn.cursor(pymysql.cursors.SSCursor)
+    writer = pq.ParquetWriter(tmp_path, SCHEMA, compression='zstd')
+    try:
+        cursor.execute(EXPORT_SQL.format(partition=partition))
+        while True:
+            rows = cursor.fetchmany(FETCH_ROWS)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, SCHEMA)],
+                schema=SCHEMA
+            ))
+            rows_written += len(rows)
+            logger.info(f"    {partition}: 已导出 {rows_written:,} 行")
+    except Exception:
+        writer.close()
+        os.remove(tmp_path)
+        raise
+    finally:
+        cursor.close()
+    writer.close()
+    os.replace(tmp_path, path)
+    return rows_written, relative, os.path.getsize(path)
+
+
+def file_checksum(path: str) -> Tuple[int, int]:
+    """从归档文件读回并计算 (行数, 校验和)，按行组读取控制内存"""
+    columns = ['event_id', 'gh_event_id', 'type_code', 'created_at', 'actor_id', 'repo_id', 'payload_id']
+    parquet = pq.ParquetFile(path)
+    count, checksum = 0, 0
+    for group in range(parquet.num_row_groups):
+        table = parquet.read_row_group(group, columns=columns)
+        for values in zip(*(table.column(name).to_pylist() for name in columns)):
+            checksum += row_checksum(*values)
+        count += table.num_rows
+    return count, checksum
+
+
+def payload_ids(path: str) -> Dict[str, List[int]]:
+    """归档文件中各载荷表引用的 payload_id"""
+    table = pq.read_table(path, columns=['event_type', 'payload_id'])
+    result: Dict[str, List[int]] = {name: [] for name in PAYLOAD_TABLES.values()}
+    for event_type, payload_id in zip(table.column('event_type').to_pylist(),
+                                      table.column('payload_id').to_pylist()):
+        payload_table = PAYLOAD_TABLES.get(event_type)
+        if payload_table and payload_id != 1:
+            result[payload_table].append(payload_id)
+    return result
+
+
+def load_manifest(cursor, month: str) -> Optional[dict]:
+    cursor.execute("""
+        SELECT status, file_path, row_count, row_checksum FROM events_archive WHERE month = %s
+    """, (month,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return {'status': row[0], 'file_path': row[1], 'row_count': row[2], 'row_checksum': row[3]}
+
+
+def archive_month(conn, partition: str, month: str, drop: bool = True) -> bool:
+    """
+    归档一个月份：导出 -> 校验 -> 删除分区和载荷行
+
+    Returns:
+        是否已完成（drop=False 时校验通过即视为完成）
+    """
+    cursor = conn.cursor()
+    try:
+        manifest = load_manifest(cursor, month)
+        status = manifest['status'] if manifest else None
+        if status == 'dropped':
+            logger.info(f"  {month} 已归档，跳过")
+            return True
+
+        cursor.execute(CHECKSUM_SQL.format(partition=partition))
+        db_count, db_checksum = cursor.fetchone()
+        db_count, db_checksum = int(db_count), int(db_checksum)
+        if db_count == 0 and status is None:
+            logger.info(f"  {partition} 为空，跳过")
+            return False
+
+        if status is None:
+            logger.info(f"⏳ 导出 {partition}（{db_count:,} 行）...")
+            rows, relative, size = export_partition(conn, partition, month)
+            cursor.execute("""
+                INSERT INTO events_archive (
+                    month, partition_name, file_path, row_count, row_checksum,
+                    file_bytes, status, exported_at
+                ) VALUES (%s, %s, %s, %s, %s, %s, 'exported', NOW())
+                ON DUPLICATE KEY UPDATE
+                    file_path = VALUES(file_path), row_count = VALUES(row_count),
+                    row_checksum = VALUES(row_checksum), file_bytes = VALUES(file_bytes),
+                    status = 'exported', exported_at = NOW(), verified_at = NULL
+            """, (month, partition, relative, db_count, db_checksum, size))
+            conn.commit()
+            manifest = load_manifest(cursor, month)
+            status = 'exported'
+            logger.info(f"  ✓ 写入 {relative}（{rows:,} 行，{size / 1024 / 1024:.1f} MB）")
+
+        path = os.path.join(ARCHIVE_DIR, manifest['file_path'])
+        # 校验：分区当前内容 == 导出时记录 == 文件读回内容
+        file_count, file_sum = file_checksum(path)
+        expected = (int(manifest['row_count']), int(manifest['row_checksum']))
+        if (db_count, db_checksum) != expected or (file_count, file_sum) != expected:
+            # 导出后分区又写入了数据（迟到事件）或文件损坏：删除记录，下次重新导出
+            logger.error(f"❌ {month} 校验失败: 分区=({db_count}, {db_checksum}) "
+                         f"记录={expected} 文件=({file_count}, {file_sum})，不删除分区")
+            cursor.execute("DELETE FROM events_archive WHERE month = %s", (month,))
+            conn.commit()
+            return False
+
+        if status == 'exported':
+            cursor.execute("""
+                UPDATE events_archive SET status = 'verified', verified_at = NOW() WHERE month = %s
+            """, (month,))
+            conn.commit()
+            logger.info(f"  ✓ {month} 校验通过（{file_count:,} 行）")
+
+        if not drop:
+            return True
+
+        # 先删载荷行再删分区：中途失败时分区仍在，重新执行会再次校验并继续
+        for table_name, ids in payload_ids(path).items():
+            for offset in range(0, len(ids), DELETE_BATCH):
+                batch = ids[offset:offset + DELETE_BATCH]
+                placeholders = ', '.join(['%s'] * len(batch))
+                cursor.execute(f"DELETE FROM {table_name} WHERE payload_id IN ({placeholders})", batch)
+                conn.commit()
+            if ids:
+                logger.info(f"  ✓ 删除 {table_name} {len(ids):,} 行")
+
+        admin_conn = get_db_connection(ADMIN_CONFIG)
+        try:
+            admin_cursor = admin_conn.cursor()
+            admin_cursor.execute(f"ALTER TABLE events DROP PARTITION {partition}")
+            admin_cursor.close()
+        finally:
+            admin_conn.close()
+
+        cursor.execute("""
+            UPDATE events_archive SET status = 'dropped', dropped_at = NOW() WHERE month = %s
+        """, (month,))
+        add_overview_counts(cursor, events=-int(manifest['row_count']))
+        conn.commit()
+        logger.info(f"  ✓ 已删除分区 {partition}")
+        bump_version(conn, ARCHIVE)
+        return True
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"❌ 归档 {month} 失败: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+def main(keep_months: int = DEFAULT_KEEP_MONTHS, months: Optional[List[str]] = None,
+         drop: bool = True, dry_run: bool = False):
+    """归档所有可归档的月份分区"""
+    logger.info("=" * 60)
+    logger.info("🧊 归档冷分区到 Parquet")
+    logger.info(f"归档目录: {os.path.abspath(ARCHIVE_DIR)}")
+    logger.info("=" * 60)
+
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        candidates = closed_partitions(cursor, keep_months)
+        cursor.close()
+        if months:
+            candidates = [(name, month) for name, month in candidates if month in months]
+        if not candidates:
+            logger.info("没有需要归档的分区")
+            return
+
+        logger.info(f"待归档: {', '.join(month for _, month in candidates)}")
+        if dry_run:
+            return
+
+        done = sum(1 for name, month in candidates if archive_month(conn, name, month, drop))
+        logger.info(f"✓ 完成 {done}/{len(candidates)} 个月份")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='GHPulse 冷分区归档')
+    parser.add_argument('--keep-months', type=int, default=DEFAULT_KEEP_MONTHS,
+                        help='保留在 MySQL 中的完整月份数（不含当月）')
+    parser.add_argument('--month', action='append', help='只归档指定月份 YYYY-MM（可重复）')
+    parser.add_argument('--no-drop', action='store_true', help='只导出和校验，不删除分区')
+    parser.add_argument('--dry-run', action='store_true', help='只列出待归档的分区')
+    args = parser.parse_args()
+
+    try:
+        main(args.keep_months, args.month, not args.no_drop, args.dry_run)
+    except KeyboardInterrupt:
+        logger.warning("\n⚠️  用户中断执行")
+        sys.exit(1)
+    except Exception as e:
+        logger.error(f"\n❌ 执行失败: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        sys.exit(1)
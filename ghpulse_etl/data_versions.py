@@ -0,0 +1,36 @@
+"""
+数据版本水位
+ETL 任务写入数据后把 data_versions 表中对应名称的版本号加一，Web 端的响应缓存以版本号作为键的一部分，
+版本变化后旧缓存自然失效。
+
+名称：
+- events: 摄取写入了新事件（含实体、汇总表、趋势榜单）
+- stats: update_all_stats.py 刷新了统计和缓存表
+- related: related_repos.py 刷新了相关仓库
+- archive: archive_events.py 归档并删除了分区
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+EVENTS = 'events'
+STATS = 'stats'
+RELATED = 'related'
+ARCHIVE = 'archive'
+
+
+def bump_version(conn, name: str):
+    """版本号加一并提交（失败只记录警告，不影响 ETL 任务本身）"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            INSERT INTO data_versions (name, version, updated_at) VALUES (%s, 1, NOW())
+            ON DUPLICATE KEY UPDATE version = version + 1, updated_at = NOW()
+        """, (name,))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.warning(f"⚠ 更新数据版本 {name} 失败: {e}")
+    finally:
+        cursor.close()
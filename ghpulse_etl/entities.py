@@ -0,0 +1,179 @@
+"""
+用户、仓库、组织资料的变更检测写入
+摄取端为每个实体缓存其可变属性的 CRC32（id -> 哈希），只有新实体和哈希变化的实体才写库，
+新实体用 INSERT IGNORE 写入（影响行数即新增数），其余用批量 INSERT ... ON DUPLICATE KEY UPDATE 更新。
+
+改名会与唯一键（actors/organizations.uk_login、repos.uk_name）冲突：名字已被另一个 id 占用时
+（旧账号改名后其旧名被新账号使用），先把占用者的名字批量改成占位名 '~stale-<id>'，
+占用者下次出现时会按新名字重写。
+"""
+
+import zlib
+from typing import Callable, Dict, List, Tuple
+
+# 被改成占位名的实体在缓存中的哈希（不会与真实 CRC32 相等，下次出现时必定重写）
+STALE_HASH = -1
+
+# 每条 IN 查询 / UPDATE 的最大 id 数
+KEY_BATCH = 1000
+
+
+class EntitySpec:
+    """实体表定义"""
+
+    def __init__(self, table: str, id_column: str, key_column: str, columns: Tuple[str, ...],
+                 values: Callable[[dict], tuple], label: str):
+        self.table = table
+        self.id_column = id_column
+        self.key_column = key_column
+        self.columns = columns
+        self.values = values
+        self.label = label
+        self.key_index = columns.index(key_column)
+
+
+ACTORS = EntitySpec(
+    'actors', 'actor_id', 'login',
+    ('login', 'display_login', 'gravatar_id', 'url', 'avatar_url'),
+    lambda a: (a.get('login', '')[:100], a.get('display_login', a.get('login', ''))[:100],
+               a.get('gravatar_id', '')[:100], a.get('url', '')[:255], a.get('avatar_url', '')[:255]),
+    '用户'
+)
+
+REPOS = EntitySpec(
+    'repos', 'repo_id', 'name',
+    ('name', 'url'),
+    lambda r: (r.get('name', '')[:255], r.get('url', '')[:255]),
+    '仓库'
+)
+
+ORGS = EntitySpec(
+    'organizations', 'org_id', 'login',
+    ('login', 'gravatar_id', 'url', 'avatar_url'),
+    lambda o: (o.get('login', '')[:100], o.get('gravatar_id', '')[:100],
+               o.get('url', '')[:255], o.get('avatar_url', '')[:255]),
+    '组织'
+)
+
+
+def attr_hash(values: tuple) -> int:
+    """可变属性的 CRC32，与 load_hashes 中的 SQL 表达式一致"""
+    return zlib.crc32('\x1f'.join(values).encode('utf-8'))
+
+
+def _uk_norm(key: str) -> str:
+    """近似唯一键的比较规则（utf8mb4_unicode_ci 不区分大小写、忽略尾部空格）"""
+    return key.rstrip(' ').casefold()
+
+
+def load_hashes(cursor, spec: EntitySpec) -> Dict[int, int]:
+    """加载已有实体的 id -> 属性哈希"""
+    expression = ', '.join(f"COALESCE({column}, '')" for column in spec.columns)
+    cursor.execute(
+        f"SELECT {spec.id_column} AS id, CRC32(CONCAT_WS(CHAR(31 USING utf8mb4), {expression})) AS attr_hash "
+        f"FROM {spec.table}"
+    )
+    return {row['id']: row['attr_hash'] for row in cursor.fetchall()}
+
+
+def collect_changes(spec: EntitySpec, cache: Dict[int, int], entities: List[dict]) -> Dict[int, tuple]:
+    """
+    需要写库的实体：id -> 属性值
+
+    同一 id 在本批中多次出现时以最后一次为准（并按最后出现的顺序排列），再与缓存的哈希比较。
+    """
+    latest: Dict[int, tuple] = {}
+    for entity in entities:
+        if entity and entity.get('id'):
+            latest.pop(entity['id'], None)
+            latest[entity['id']] = spec.values(entity)
+    return {entity_id: values for entity_id, values in latest.items()
+            if cache.get(entity_id) != attr_hash(values)}
+
+
+def _release_keys(cursor, spec: EntitySpec, cache: Dict[int, int], changes: Dict[int, tuple]) -> int:
+    """
+    把唯一键让给本批中的新主人
+
+    - 本批内多个 id 使用同一名字时，最后出现的 id 保留，其余写入占位名
+    - 数据库中占用这些名字的其他 id 批量改成占位名
+
+    Returns:
+        改成占位名的实体数
+    """
+    owners: Dict[str, int] = {}
+    for entity_id, values in changes.items():
+        owners[_uk_norm(values[spec.key_index])] = entity_id
+
+    released = 0
+    for entity_id, values in list(changes.items()):
+        if owners[_uk_norm(values[spec.key_index])] != entity_id:
+            values = list(values)
+            values[spec.key_index] = f'~stale-{entity_id}'
+            changes[entity_id] = tuple(values)
+            released += 1
+
+    keys = list({changes[entity_id][spec.key_index] for entity_id in owners.values()})
+    stale: List[int] = []
+    for offset in range(0, len(keys), KEY_BATCH):
+        batch = keys[offset:offset + KEY_BATCH]
+        marks = ', '.join(['%s'] * len(batch))
+        cursor.execute(
+            f"SELECT {spec.id_column} AS id, {spec.key_column} AS name FROM {spec.table} "
+            f"WHERE {spec.key_column} IN ({marks})",
+            batch
+        )
+        stale.extend(row['id'] for row in cursor.fetchall() if owners.get(_uk_norm(row['name'])) != row['id'])
+
+    for offset in range(0, len(stale), KEY_BATCH):
+        batch = stale[offset:offset + KEY_BATCH]
+        marks = ', '.join(['%s'] * len(batch))
+        cursor.execute(
+            f"UPDATE {spec.table} SET {spec.key_column} = CONCAT('~stale-', {spec.id_column}) "
+            f"WHERE {spec.id_column} IN ({marks})",
+            batch
+        )
+        for entity_id in batch:
+            if entity_id not in changes:
+                cache[entity_id] = STALE_HASH
+    return released + len(stale)
+
+
+def upsert_entities(cursor, spec: EntitySpec, cache: Dict[int, int], changes: Dict[int, tuple]) -> Tuple[int, int, int]:
+    """
+    批量写入新增和变更的实体，并更新缓存
+
+    缓存中没有的 id 先用 INSERT IGNORE（按 id 升序）写入，影响行数即真正新增的实体数：
+    缓存只属于本进程，并发摄取（定时任务与 --drain）可能同时遇到同一个新实体，
+    后提交的一方等待行锁后被忽略，不会重复计入总数。其余实体再用 ON DUPLICATE KEY UPDATE 写入。
+
+    Returns:
+        (新增数, 更新数, 改成占位名的数)
+    """
+    if not changes:
+        return 0, 0, 0
+
+    released = _release_keys(cursor, spec, cache, changes)
+    columns = ', '.join((spec.id_column,) + spec.columns)
+    marks = ', '.join(['%s'] * (len(spec.columns) + 1))
+    updates = ', '.join(f"{column} = VALUES({column})" for column in spec.columns)
+
+    new_ids = sorted(entity_id for entity_id in changes if entity_id not in cache)
+    inserted = 0
+    if new_ids:
+        cursor.executemany(
+            f"INSERT IGNORE INTO {spec.table} ({columns}) VALUES ({marks})",
+            [(entity_id,) + changes[entity_id] for entity_id in new_ids]
+        )
+        inserted = cursor.rowcount
+    # 新 id 全部写入时只需更新缓存中已有的实体；否则被忽略的新 id（已由其他进程写入）也要更新资料
+    rest = [entity_id for entity_id in changes if entity_id in cache or inserted < len(new_ids)]
+    if rest:
+        cursor.executemany(
+            f"INSERT INTO {spec.table} ({columns}) VALUES ({marks}) ON DUPLICATE KEY UPDATE {updates}",
+            [(entity_id,) + changes[entity_id] for entity_id in rest]
+        )
+
+    for entity_id, values in changes.items():
+        cache[entity_id] = attr_hash(values)
+    return inserted, len(changes) - inserted, released
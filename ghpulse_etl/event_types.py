@@ -0,0 +1,125 @@
+"""
+事件类型字典
+events 表只存 TINYINT 类型编码（type_code），类型名保存在 event_types 表中。
+常用类型的编码固定（与 db_init.sql 中的初始数据一致），SQL 中直接用编码常量比较；
+其他类型在摄取时按需登记，编码与类型名的映射缓存在进程内。
+"""
+
+import time
+from typing import Dict, Iterable
+
+# 固定编码（不可修改，触发器和存储过程中也按这些值比较）
+PUSH = 1
+PULL_REQUEST = 2
+ISSUES = 3
+WATCH = 4
+FORK = 5
+CREATE = 6
+DELETE = 7
+
+FIXED_CODES = {
+    'PushEvent': PUSH,
+    'PullRequestEvent': PULL_REQUEST,
+    'IssuesEvent': ISSUES,
+    'WatchEvent': WATCH,
+    'ForkEvent': FORK,
+    'CreateEvent': CREATE,
+    'DeleteEvent': DELETE,
+    'IssueCommentEvent': 8,
+    'PullRequestReviewEvent': 9,
+    'PullRequestReviewCommentEvent': 10,
+    'CommitCommentEvent': 11,
+    'ReleaseEvent': 12,
+    'MemberEvent': 13,
+    'PublicEvent': 14,
+    'GollumEvent': 15,
+}
+
+# 缓存未命中时重新加载 event_types 的最短间隔（秒）
+RELOAD_INTERVAL = 1.0
+
+
+class UnknownEventType(LookupError):
+    """重新加载后仍没有该编码（不能写入占位名，由调用方中止本次处理，下次重试）"""
+
+
+def _row_values(row):
+    """兼容元组游标和 DictCursor"""
+    if isinstance(row, dict):
+        return row['type_code'], row['type_name']
+    return row[0], row[1]
+
+
+class EventTypeCache:
+    """类型名 <-> 编码的进程内缓存，未知类型名登记到 event_types 表"""
+
+    def __init__(self):
+        self._codes: Dict[str, int] = dict(FIXED_CODES)
+        self._names: Dict[int, str] = {code: name for name, code in FIXED_CODES.items()}
+        self._loaded_at = None  # 上次加载的时间（time.monotonic()）
+
+    def load(self, cursor):
+        """从 event_types 表加载全部映射"""
+        cursor.execute("SELECT type_code, type_name FROM event_types")
+        for row in cursor.fetchall():
+            code, name = _row_values(row)
+            self._codes[name] = code
+            self._names[code] = name
+        self._loaded_at = time.monotonic()
+
+    def _reload_on_miss(self, cursor):
+        """缓存未命中时重新加载（并发摄取可能刚登记了新类型），两次加载至少间隔 RELOAD_INTERVAL 秒"""
+        if self._loaded_at is None or time.monotonic() - self._loaded_at >= RELOAD_INTERVAL:
+            self.load(cursor)
+
+    def register(self, conn, names: Iterable[str]):
+        """
+        确保这些类型名都有编码
+
+        先重新加载 event_types（其他进程或上次运行可能已登记），只插入仍然未知的类型名：
+        INSERT ... ON DUPLICATE KEY UPDATE 遇到已存在的行也会消耗一个 AUTO_INCREMENT 值，
+        type_code 只有 TINYINT 的取值范围，每次摄取都重复登记会很快耗尽编码。
+        新类型在独立事务中登记并立即提交，之后摄取事务回滚也不会留下无效编码。
+        """
+        names = {name for name in names if name}
+        if all(name in self._codes for name in names):
+            return
+        cursor = conn.cursor()
+        try:
+            self.load(cursor)
+            for name in sorted(name for name in names if name not in self._codes):
+                cursor.execute("INSERT IGNORE INTO event_types (type_name) VALUES (%s)", (name,))
+                if cursor.rowcount == 1:
+                    code = cursor.lastrowid
+                else:
+                    # 加载之后被并发摄取登记
+                    cursor.execute("SELECT type_code, type_name FROM event_types WHERE type_name = %s", (name,))
+                    code, _ = _row_values(cursor.fetchone())
+                self._codes[name] = code
+                self._names[code] = name
+            conn.commit()
+        finally:
+            cursor.close()
+
+    def code(self, name: str) -> int:
+        """类型名对应的编码（须先 register）"""
+        return self._codes[name]
+
+    def codes(self, cursor, names: Iterable[str]) -> list:
+        """多个类型名对应的编码，未登记的类型名忽略（数据库中不可能有这些类型的事件）"""
+        names = list(names)
+        if any(name not in self._codes for name in names):
+            self._reload_on_miss(cursor)
+        return [self._codes[name] for name in names if name in self._codes]
+
+    def name(self, cursor, code: int) -> str:
+        """编码对应的类型名，缓存未命中时重新加载；仍然没有时抛出 UnknownEventType"""
+        if code not in self._names:
+            self._reload_on_miss(cursor)
+        try:
+            return self._names[code]
+        except KeyError:
+            raise UnknownEventType(f"未知的事件类型编码: {code}")
+
+
+event_types = EventTypeCache()
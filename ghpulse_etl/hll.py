@@ -0,0 +1,155 @@
+"""
+HyperLogLog 基数估计草图
+用于可合并的去重计数（例如某用户某天参与的仓库数、每日各事件类型的去重用户数），
+多天/多类型的草图取寄存器最大值即可合并。
+
+误差：标准误差约为 1.04 / sqrt(2^p)
+    p=10 -> 约 3.3%    p=12 -> 约 1.6%    p=14 -> 约 0.8%
+基数很小时（稀疏模式且寄存器碰撞很少）使用线性计数，结果基本精确。
+
+序列化格式：
+    1字节格式标记（b'S' 稀疏 / b'D' 稠密） + 1字节精度 p + 数据
+    稀疏：按寄存器下标排序的 (下标 uint16, 秩 uint8) 列表，每项3字节
+    稠密：2^p 个寄存器，每个1字节
+"""
+
+import math
+import struct
+from hashlib import blake2b
+from typing import Dict, Iterable, Optional
+
+_MASK64 = (1 << 64) - 1
+_SPARSE = b'S'
+_DENSE = b'D'
+
+
+def _hash64(value) -> int:
+    """64位哈希；整数ID走 splitmix64 混淆（快），其他类型走 blake2b"""
+    if isinstance(value, int):
+        z = (value + 0x9E3779B97F4A7C15) & _MASK64
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+        return z ^ (z >> 31)
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    return int.from_bytes(blake2b(value, digest_size=8).digest(), 'big')
+
+
+class HyperLogLog:
+    """HyperLogLog 草图（小基数时稀疏存储，超过阈值自动转稠密）"""
+
+    def __init__(self, p: int = 12):
+        if not 4 <= p <= 16:
+            raise ValueError(f"精度 p 必须在 4-16 之间: {p}")
+        self.p = p
+        self.m = 1 << p
+        self._sparse: Optional[Dict[int, int]] = {}
+        self._dense: Optional[bytearray] = None
+
+    @property
+    def standard_error(self) -> float:
+        return 1.04 / math.sqrt(self.m)
+
+    def add(self, value):
+        x = _hash64(value)
+        idx = x >> (64 - self.p)
+        w = x & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - w.bit_length() + 1
+        self._set_register(idx, rank)
+
+    def update(self, values: Iterable):
+        for value in values:
+            self.add(value)
+
+    def _set_register(self, idx: int, rank: int):
+        if self._dense is not None:
+            if rank > self._dense[idx]:
+                self._dense[idx] = rank
+            return
+        if rank > self._sparse.get(idx, 0):
+            self._sparse[idx] = rank
+            # 稀疏编码每项3字节，超过稠密大小时转换
+            if len(self._sparse) * 3 > self.m:
+                self._to_dense()
+
+    def _to_dense(self):
+        dense = bytearray(self.m)
+        for idx, rank in self._sparse.items():
+            dense[idx] = rank
+        self._dense = dense
+        self._sparse = None
+
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        """就地合并另一个草图（寄存器取最大值），返回自身"""
+        if other.p != self.p:
+            raise ValueError(f"精度不一致，无法合并: {self.p} != {other.p}")
+        if other._dense is not None:
+            if self._dense is None:
+                self._to_dense()
+            self._dense = bytearray(map(max, self._dense, other._dense))
+        else:
+            for idx, rank in other._sparse.items():
+                self._set_register(idx, rank)
+        return self
+
+    def count(self) -> int:
+        """估计基数"""
+        m = self.m
+        if self._dense is not None:
+            registers = self._dense
+            zeros = registers.count(0)
+            harmonic = sum(2.0 ** -r for r in registers)
+        else:
+            zeros = m - len(self._sparse)
+            harmonic = zeros + sum(2.0 ** -r for r in self._sparse.values())
+
+        if m >= 128:
+            alpha = 0.7213 / (1 + 1.079 / m)
+        else:
+            alpha = {16: 0.673, 32: 0.697, 64: 0.709}[m]
+        estimate = alpha * m * m / harmonic
+
+        # 小基数修正：线性计数
+        if estimate <= 2.5 * m and zeros > 0:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self, dense: bool = False) -> bytes:
+        """序列化；dense=True 时总是输出固定长度（2 + 2^p 字节）的稠密格式"""
+        if dense and self._dense is None:
+            self._to_dense()
+        if self._dense is not None:
+            return _DENSE + bytes([self.p]) + bytes(self._dense)
+        entries = sorted(self._sparse.items())
+        return _SPARSE + bytes([self.p]) + b''.join(struct.pack('>HB', i, r) for i, r in entries)
+
+    @classmethod
+    def from_bytes(cls, data: Optional[bytes], p: int = 12) -> 'HyperLogLog':
+        """反序列化；data 为空时返回精度为 p 的空草图"""
+        if not data:
+            return cls(p)
+        kind, sketch_p = data[:1], data[1]
+        sketch = cls(sketch_p)
+        body = data[2:]
+        if kind == _DENSE:
+            if len(body) != sketch.m:
+                raise ValueError(f"稠密草图长度错误: {len(body)} != {sketch.m}")
+            sketch._dense = bytearray(body)
+            sketch._sparse = None
+        elif kind == _SPARSE:
+            for i, r in struct.iter_unpack('>HB', body):
+                sketch._sparse[i] = r
+        else:
+            raise ValueError(f"未知的草图格式: {kind!r}")
+        return sketch
+
+
+def merge_all(blobs: Iterable[Optional[bytes]], p: int = 12) -> HyperLogLog:
+    """合并多个序列化草图；全部为空时返回精度为 p 的空草图"""
+    merged = None
+    for blob in blobs:
+        if not blob:
+            continue
+        sketch = HyperLogLog.from_bytes(blob)
+        merged = sketch if merged is None else merged.merge(sketch)
+    return merged if merged is not None else HyperLogLog(p)
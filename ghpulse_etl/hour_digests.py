@@ -0,0 +1,128 @@
+"""
+小时摘要（用于核对摄取结果）
+一个小时的摘要包括：事件数、各类型事件数、gh_event_id 的 CRC32 之和（与顺序无关）。
+GH Archive 一侧在摄取时由下载的事件计算并写入 archive_hour_digests，
+数据库一侧按 created_at 范围扫描 events 计算，两者一致即视为该小时数据完整。
+"""
+
+import json
+import zlib
+from collections import Counter
+from datetime import datetime, date, timedelta
+from typing import Dict, Iterable, Optional
+
+from event_types import event_types
+
+
+class HourDigest:
+    """一个小时的事件摘要"""
+
+    __slots__ = ('event_count', 'type_counts', 'id_hash')
+
+    def __init__(self, event_count: int = 0, type_counts: Optional[Dict[str, int]] = None, id_hash: int = 0):
+        self.event_count = event_count
+        self.type_counts = Counter(type_counts or {})
+        self.id_hash = id_hash
+
+    def add(self, gh_event_id: int, event_type: str):
+        self.event_count += 1
+        self.type_counts[event_type] += 1
+        self.id_hash += id_crc(gh_event_id)
+
+    def __eq__(self, other):
+        return (self.event_count == other.event_count and self.id_hash == other.id_hash
+                and +self.type_counts == +other.type_counts)
+
+    def describe_diff(self, other: 'HourDigest') -> str:
+        """与另一摘要（数据库侧）的差异说明"""
+        parts = [f"事件数 {self.event_count} vs {other.event_count}"]
+        types = sorted(set(self.type_counts) | set(other.type_counts))
+        diffs = [f"{name} {self.type_counts[name]} vs {other.type_counts[name]}"
+                 for name in types if self.type_counts[name] != other.type_counts[name]]
+        if diffs:
+            parts.append('类型 ' + ', '.join(diffs))
+        elif self.event_count == other.event_count:
+            parts.append('事件ID集合不同')
+        return '；'.join(parts)
+
+
+def id_crc(gh_event_id: int) -> int:
+    """与 MySQL CRC32(gh_event_id) 一致（按十进制字符串计算）"""
+    return zlib.crc32(str(gh_event_id).encode('utf-8'))
+
+
+def hour_of(created_dt: datetime) -> datetime:
+    """所属小时（UTC，去掉时区，与 events.created_at 的存储一致）"""
+    return created_dt.replace(tzinfo=None, minute=0, second=0, microsecond=0)
+
+
+def digest_events(events: Iterable[dict]) -> Dict[datetime, HourDigest]:
+    """
+    由 GH Archive 原始事件计算各小时的摘要
+
+    只统计摄取时会写入 events 的事件（有 id、类型、actor 和 repo），按 created_at 所在小时分组；
+    重复的事件ID只计一次（与 INSERT IGNORE 一致）。
+    """
+    digests: Dict[datetime, HourDigest] = {}
+    seen = set()
+    for event in events:
+        try:
+            gh_event_id = int(event['id'])
+            event_type = (event.get('type') or '')[:50]
+            if not event_type or not (event.get('actor') or {}).get('id') or not (event.get('repo') or {}).get('id'):
+                continue
+            created_dt = datetime.fromisoformat(event['created_at'].replace('Z', '+00:00'))
+        except (KeyError, TypeError, ValueError):
+            continue
+        if gh_event_id in seen:
+            continue
+        seen.add(gh_event_id)
+        digests.setdefault(hour_of(created_dt), HourDigest()).add(gh_event_id, event_type)
+    return digests
+
+
+def save_archive_digest(cursor, hour_start: datetime, digest: HourDigest):
+    """记录 GH Archive 一侧的小时摘要（重复摄取时覆盖）"""
+    cursor.execute("""
+        INSERT INTO archive_hour_digests (hour_start, event_count, type_counts, id_hash, computed_at)
+        VALUES (%s, %s, %s, %s, NOW())
+        ON DUPLICATE KEY UPDATE
+            event_count = VALUES(event_count),
+            type_counts = VALUES(type_counts),
+            id_hash = VALUES(id_hash),
+            computed_at = VALUES(computed_at)
+    """, (hour_start, digest.event_count, json.dumps(dict(digest.type_counts)), digest.id_hash))
+
+
+def load_archive_digests(cursor, start: datetime, end: datetime) -> Dict[datetime, HourDigest]:
+    """读取 [start, end) 内已记录的 GH Archive 小时摘要"""
+    cursor.execute("""
+        SELECT hour_start, event_count, type_counts, id_hash FROM archive_hour_digests
+        WHERE hour_start >= %s AND hour_start < %s
+    """, (start, end))
+    return {
+        hour_start: HourDigest(int(count), json.loads(type_counts), int(id_hash))
+        for hour_start, count, type_counts, id_hash in cursor.fetchall()
+    }
+
+
+def database_digests(cursor, day: date) -> Dict[datetime, HourDigest]:
+    """
+    一天内 events 各小时的摘要
+
+    按分区键和 created_at 范围过滤（分区裁剪 + idx_created_at 范围扫描），一条语句得到 24 个小时。
+    """
+    start = datetime.combine(day, datetime.min.time())
+    cursor.execute("""
+        SELECT HOUR(created_at), type_code, COUNT(*), SUM(CRC32(gh_event_id))
+        FROM events
+        WHERE created_at_date = %s AND created_at >= %s AND created_at < %s
+        GROUP BY HOUR(created_at), type_code
+    """, (day, start, start + timedelta(days=1)))
+    digests: Dict[datetime, HourDigest] = {}
+    for hour, type_code, count, id_hash in cursor.fetchall():
+        digest = digests.setdefault(start + timedelta(hours=int(hour)), HourDigest())
+        digest.event_count += int(count)
+        digest.type_counts[event_types.name(cursor, type_code)] += int(count)
+        digest.id_hash += int(id_hash)
+    return digests
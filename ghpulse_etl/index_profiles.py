@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+events 表索引方案（index profile）管理
+夜间回填只需要少数索引，白天看板需要更多；按工作负载切换命名的索引方案，
+每个阶段只承担自己用到的索引的维护开销。
+
+    python index_profiles.py report                # 索引使用情况、未使用/冗余索引、各语句使用的索引
+    python index_profiles.py apply ingest          # 在线切换到回填方案（ALGORITHM=INPLACE, LOCK=NONE）
+    python index_profiles.py apply serving --dry-run
+    python index_profiles.py status                # 最近的切换记录
+
+说明：
+- 主键和唯一键（uk_gh_event_id 用于摄取去重）不受方案管理，始终保留
+- 不在 INDEX_DEFS 中的索引不会被删除
+- 使用管理员账号（需要 ALTER 权限和 performance_schema 查询权限）；
+  切换进度来自 performance_schema.events_stages_current 的 stage/innodb/alter% 阶段
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import pymysql
+from dotenv import load_dotenv
+
+from stats_profiler import plan_keys
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout),
+        logging.FileHandler('index_profiles.log', encoding='utf-8')
+    ]
+)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# ALTER TABLE 需要管理员账号
+ADMIN_CONFIG = {
+    'host': os.getenv('DB_HOST'),
+    'port': int(os.getenv('DB_PORT', 3306)),
+    'user': os.getenv('ADMIN_USER'),
+    'password': os.getenv('ADMIN_PASSWORD'),
+    'database': os.getenv('DB_NAME'),
+    'charset': 'utf8mb4'
+}
+
+TABLE = 'events'
+
+# 受管理的二级索引定义（与 db_init.sql 一致）
+INDEX_DEFS = {
+    'idx_event_type': '(type_code, created_at)',
+    'idx_created_at': '(created_at)',
+    'idx_actor_repo': '(actor_id, repo_id, created_at)',
+    'idx_repo_type': '(repo_id, type_code, created_at)',
+    'idx_created_date': '(created_at_date)',
+    'idx_org_created': '(org_id, created_at)',
+    'idx_actor_id': '(actor_id)',
+    'idx_repo_id': '(repo_id)',
+    'idx_actor_type_date': '(actor_id, type_code, created_at_date)',
+}
+
+# 命名方案 -> 应存在的受管理索引
+PROFILES = {
+    # db_init.sql 的完整索引集合
+    'full': list(INDEX_DEFS),
+    # 白天看板：去掉被更长索引覆盖前缀的 idx_actor_id / idx_repo_id
+    'serving': [
+        'idx_event_type', 'idx_created_at', 'idx_actor_repo', 'idx_repo_type',
+        'idx_created_date', 'idx_org_created', 'idx_actor_type_date',
+    ],
+    # 夜间回填：摄取去重走唯一键，统计任务按类型/时间范围扫描，其余索引只增加写放大
+    'ingest': ['idx_event_type', 'idx_created_at'],
+}
+
+# 切换进度的轮询间隔（秒）
+PROGRESS_INTERVAL = 10
+
+
+def get_admin_connection():
+    """获取管理员连接"""
+    try:
+        return pymysql.connect(**ADMIN_CONFIG)
+    except Exception as e:
+        logger.error(f"数据库连接失败: {e}")
+        raise
+
+
+def current_indexes(cursor, table: str = TABLE) -> Dict[str, Tuple[List[str], bool]]:
+    """表上现有索引：名称 -> (列列表, 是否唯一)"""
+    cursor.execute("""
+        SELECT INDEX_NAME, COLUMN_NAME, SEQ_IN_INDEX, NON_UNIQUE
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        ORDER BY INDEX_NAME, SEQ_IN_INDEX
+    """, (table,))
+    indexes: Dict[str, Tuple[List[str], bool]] = {}
+    for name, column, _, non_unique in cursor.fetchall():
+        columns, _ = indexes.get(name, ([], not non_unique))
+        columns.append(column)
+        indexes[name] = (columns, not non_unique)
+    return indexes
+
+
+def redundant_indexes(indexes: Dict[str, Tuple[List[str], bool]]) -> List[Tuple[str, str]]:
+    """列是另一个索引前导列的非唯一索引，返回 [(冗余索引, 覆盖它的索引)]"""
+    result = []
+    for name, (columns, unique) in indexes.items():
+        if unique or name == 'PRIMARY':
+            continue
+        for other, (other_columns, _) in indexes.items():
+            if other != name and len(other_columns) > len(columns) \
+                    and other_columns[:len(columns)] == columns:
+                result.append((name, other))
+                break
+    return result
+
+
+def index_usage(cursor, table: str = TABLE) -> Optional[Dict[str, dict]]:
+    """自实例启动以来各索引的读写次数；无 performance_schema 权限时返回 None"""
+    try:
+        cursor.execute("""
+            SELECT INDEX_NAME, COUNT_READ, COUNT_WRITE, SUM_TIMER_WAIT
+            FROM performance_schema.table_io_waits_summary_by_index_usage
+            WHERE OBJECT_SCHEMA = DATABASE() AND OBJECT_NAME = %s AND INDEX_NAME IS NOT NULL
+        """, (table,))
+    except pymysql.err.MySQLError as e:
+        logger.warning(f"⚠ 无法读取索引使用统计: {e}")
+        return None
+    return {
+        name: {'reads': int(reads), 'writes': int(writes), 'wait_ms': int(wait) / 1e9}
+        for name, reads, writes, wait in cursor.fetchall()
+    }
+
+
+def stats_job_digests(cursor) -> Dict[str, str]:
+    """
+    统计任务语句的 MySQL 摘要 -> 作业名
+
+    stats_job_runs 记录的是参数占位的语句模板，代入常量后用 STATEMENT_DIGEST() 计算，
+    与 performance_schema 中实际执行语句的摘要一致（常量被归一化）。
+    """
+    try:
+        cursor.execute("""
+            SELECT job_name, stmt_text FROM stats_job_runs
+            WHERE stmt_text LIKE %s
+            GROUP BY job_name, stmt_text
+        """, (f'%{TABLE}%',))
+        rows = cursor.fetchall()
+    except pymysql.err.MySQLError:
+        return {}
+    result = {}
+    for job, text in rows:
+        try:
+            cursor.execute("SELECT STATEMENT_DIGEST(%s)", (text.replace('%s', '0').replace('%%', '%'),))
+            result[cursor.fetchone()[0]] = f'stats:{job}'
+        except pymysql.err.MySQLError:
+            continue
+    return result
+
+
+def workload_digests(cursor, limit: int = 30) -> List[dict]:
+    """
+    访问 events 的语句摘要（按总耗时排序），并用样例语句的 EXPLAIN 找出各自使用的索引
+
+    来源：统计任务的语句通过 stats_job_runs 识别，其余归为 Web/摄取。
+    """
+    labels = stats_job_digests(cursor)
+    try:
+        cursor.execute("""
+            SELECT DIGEST, DIGEST_TEXT, QUERY_SAMPLE_TEXT, COUNT_STAR,
+                SUM_TIMER_WAIT, SUM_ROWS_EXAMINED, SUM_NO_INDEX_USED
+            FROM performance_schema.events_statements_summary_by_digest
+            WHERE SCHEMA_NAME = DATABASE() AND DIGEST_TEXT LIKE %s
+            ORDER BY SUM_TIMER_WAIT DESC
+            LIMIT %s
+        """, (f'%`{TABLE}`%', limit))
+        rows = cursor.fetchall()
+    except pymysql.err.MySQLError as e:
+        logger.warning(f"⚠ 无法读取语句摘要: {e}")
+        return []
+
+    result = []
+    for digest, text, sample, calls, wait, examined, no_index in rows:
+        keys = []
+        head = (sample or '').lstrip().split(None, 1)[0].upper() if sample else ''
+        if head in ('SELECT', 'WITH'):
+            try:
+                cursor.execute("EXPLAIN FORMAT=JSON " + sample)
+                keys = [key.split(':', 1)[1] for key in plan_keys(cursor.fetchone()[0])
+                        if key.startswith(f'{TABLE}:') or key.startswith('e:')]
+            except pymysql.err.MySQLError:
+                pass
+        result.append({
+            'digest': digest,
+            'source': labels.get(digest, 'web/ingest'),
+            'text': ' '.join((text or '').split())[:160],
+            'calls': int(calls),
+            'total_ms': int(wait) / 1e9,
+            'rows_examined': int(examined),
+            'no_index_used': int(no_index),
+            'indexes': keys,
+        })
+    return result
+
+
+def report():
+    """打印索引报告"""
+    conn = get_admin_connection()
+    try:
+        cursor = conn.cursor()
+        indexes = current_indexes(cursor)
+        usage = index_usage(cursor)
+        digests = workload_digests(cursor)
+
+        print(f"\n📇 {TABLE} 现有索引（读写次数自实例启动以来累计）")
+        for name, (columns, unique) in sorted(indexes.items()):
+            stat = (usage or {}).get(name)
+            flag = 'UNIQUE' if unique else ''
+            counts = f"读 {stat['reads']:>12,}  写 {stat['writes']:>12,}" if stat else '无统计'
+            print(f"  {name:<22} {'(' + ', '.join(columns) + ')':<42} {flag:<7} {counts}")
+
+        if usage is not None:
+            unused = [name for name in indexes
+                      if name != 'PRIMARY' and not indexes[name][1] and usage.get(name, {}).get('reads', 0) == 0]
+            print("\n💤 未被读取的索引（只产生写入开销）")
+            for name in unused:
+                print(f"  {name}")
+            if not unused:
+                print("  无")
+
+        print("\n♊ 冗余索引（列是另一个索引的前导列）")
+        redundant = redundant_indexes(indexes)
+        for name, covering in redundant:
+            print(f"  {name} 被 {covering} 覆盖")
+        if not redundant:
+            print("  无")
+
+        used_by = defaultdict(set)
+        if digests:
+            print("\n🔎 访问 events 的主要语句（按总耗时）")
+            for d in digests:
+                for key in d['indexes']:
+                    used_by[key].add(d['source'])
+                print(f"  [{d['source']}] {d['total_ms']:>10.0f}ms  调用 {d['calls']:>8,}  "
+                      f"扫描 {d['rows_examined']:>12,}  索引 {','.join(d['indexes']) or '-'}")
+                print(f"      {d['text']}")
+
+        print("\n📋 各方案删除的、仍被语句使用的索引")
+        for profile, wanted in PROFILES.items():
+            dropped = [name for name in INDEX_DEFS if name not in wanted and name in used_by]
+            detail = ', '.join(f"{name}({'/'.join(sorted(used_by[name]))})" for name in dropped)
+            print(f"  {profile:<8} {detail or '无'}")
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def plan_profile(indexes: Dict[str, Tuple[List[str], bool]], profile: str) -> Tuple[List[str], List[str]]:
+    """切换到方案需要 (删除的索引, 新增的索引)"""
+    wanted = set(PROFILES[profile])
+    drop = [name for name in INDEX_DEFS if name in indexes and name not in wanted]
+    add = [name for name in PROFILES[profile] if name not in indexes]
+    return drop, add
+
+
+def _enable_alter_progress(cursor):
+    """开启 InnoDB ALTER 阶段的进度统计（需 performance_schema UPDATE 权限，失败时只是没有进度）"""
+    try:
+        cursor.execute("""
+            UPDATE performance_schema.setup_instruments SET ENABLED = 'YES', TIMED = 'YES'
+            WHERE NAME LIKE 'stage/innodb/alter%%'
+        """)
+        cursor.execute("""
+            UPDATE performance_schema.setup_consumers SET ENABLED = 'YES'
+            WHERE NAME IN ('events_stages_current', 'events_stages_history')
+        """)
+    except pymysql.err.MySQLError as e:
+        logger.warning(f"  ⚠ 无法开启 ALTER 进度统计: {e}")
+
+
+def _alter_progress(cursor, connection_id: int) -> Optional[Tuple[str, int, int]]:
+    """正在执行的 ALTER 的 (阶段, 已完成, 估计总量)"""
+    try:
+        cursor.execute("""
+            SELECT s.EVENT_NAME, s.WORK_COMPLETED, s.WORK_ESTIMATED
+            FROM performance_schema.events_stages_current s
+            INNER JOIN performance_schema.threads t ON t.THREAD_ID = s.THREAD_ID
+            WHERE t.PROCESSLIST_ID = %s
+        """, (connection_id,))
+        row = cursor.fetchone()
+    except pymysql.err.MySQLError:
+        return None
+    if not row:
+        return None
+    return row[0].rsplit('/', 1)[-1], int(row[1] or 0), int(row[2] or 0)
+
+
+def apply_profile(profile: str, dry_run: bool = False) -> bool:
+    """在线切换索引方案，返回是否成功"""
+    conn = get_admin_connection()
+    try:
+        cursor = conn.cursor()
+        drop, add = plan_profile(current_indexes(cursor), profile)
+        if not drop and not add:
+            logger.info(f"✓ {TABLE} 已是 {profile} 方案，无需变更")
+            return True
+
+        clauses = [f"DROP INDEX {name}" for name in drop]
+        clauses += [f"ADD INDEX {name} {INDEX_DEFS[name]}" for name in add]
+        statement = f"ALTER TABLE {TABLE} {', '.join(clauses)}, ALGORITHM=INPLACE, LOCK=NONE"
+        logger.info(f"切换到 {profile}: 删除 {drop or '无'}，新增 {add or '无'}")
+        logger.info(f"  {statement}")
+        if dry_run:
+            return True
+
+        cursor.execute("""
+            INSERT INTO index_profile_runs (table_name, profile, statement, status, started_at)
+            VALUES (%s, %s, %s, 'running', NOW())
+        """, (TABLE, profile, statement))
+        run_id = cursor.lastrowid
+        conn.commit()
+        _enable_alter_progress(cursor)
+
+        # ALTER 在独立连接上执行，当前连接轮询进度
+        alter_conn = get_admin_connection()
+        outcome = {}
+
+        def run_alter():
+            try:
+                alter_cursor = alter_conn.cursor()
+                alter_cursor.execute(statement)
+                alter_cursor.close()
+            except Exception as e:
+                outcome['error'] = e
+
+        worker = threading.Thread(target=run_alter, daemon=True)
+        started = time.time()
+        worker.start()
+        while worker.is_alive():
+            worker.join(PROGRESS_INTERVAL)
+            progress = _alter_progress(cursor, alter_conn.thread_id())
+            if progress and worker.is_alive():
+                stage, done, estimated = progress
+                percent = 100.0 * done / estimated if estimated else None
+                logger.info(f"  ⏳ {stage}: {done:,}/{estimated:,}"
+                            + (f" ({percent:.1f}%)" if percent is not None else ''))
+                cursor.execute("UPDATE index_profile_runs SET stage = %s, progress = %s WHERE run_id = %s",
+                               (stage, percent, run_id))
+                conn.commit()
+        alter_conn.close()
+
+        error = outcome.get('error')
+        cursor.execute("""
+            UPDATE index_profile_runs
+            SET status = %s, progress = IF(%s, 100, progress), error = %s, finished_at = NOW()
+            WHERE run_id = %s
+        """, ('failed' if error else 'done', error is None, str(error) if error else None, run_id))
+        conn.commit()
+        if error:
+            logger.error(f"❌ 切换到 {profile} 失败: {error}")
+            return False
+        logger.info(f"✓ 已切换到 {profile}，耗时 {time.time() - started:.1f} 秒")
+        return True
+    finally:
+        conn.close()
+
+
+def show_status(limit: int = 10):
+    """打印当前索引所匹配的方案和最近的切换记录"""
+    conn = get_admin_connection()
+    try:
+        cursor = conn.cursor()
+        present = {name for name in current_indexes(cursor) if name in INDEX_DEFS}
+        matched = [name for name, wanted in PROFILES.items() if set(wanted) == present]
+        print(f"当前方案: {', '.join(matched) if matched else '自定义'}（受管理索引: {', '.join(sorted(present))}）")
+        cursor.execute("""
+            SELECT run_id, profile, status, stage, progress, started_at, finished_at, error
+            FROM index_profile_runs WHERE table_name = %s
+            ORDER BY run_id DESC LIMIT %s
+        """, (TABLE, limit))
+        for run_id, profile, status, stage, progress, started_at, finished_at, error in cursor.fetchall():
+            progress = f"{float(progress):.1f}%" if progress is not None else '-'
+            print(f"  #{run_id:<5} {profile:<8} {status:<8} {progress:>7}  {started_at} -> {finished_at or '...'}"
+                  + (f"  {stage}" if status == 'running' and stage else '')
+                  + (f"  {error}" if error else ''))
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='events 表索引方案管理')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('report', help='索引使用情况与冗余索引报告')
+    apply_parser = sub.add_parser('apply', help='在线切换到指定方案')
+    apply_parser.add_argument('profile', choices=list(PROFILES))
+    apply_parser.add_argument('--dry-run', action='store_true', help='只打印 ALTER 语句')
+    status_parser = sub.add_parser('status', help='当前方案与最近的切换记录')
+    status_parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == 'report':
+        report()
+    elif args.command == 'apply':
+        if not apply_profile(args.profile, args.dry_run):
+            sys.exit(1)
+    else:
+        show_status(args.limit)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        logger.warning("\n⚠️  用户中断执行（已开始的 ALTER 会在服务端继续执行）")
+        sys.exit(1)
+    except Exception as e:
+        print(f"❌ {e}")
+        sys.exit(1)
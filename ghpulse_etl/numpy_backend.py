@@ -0,0 +1,362 @@
+"""
+NumPy 聚合后端（update_all_stats.py --backend numpy）
+把窗口内 events 的少量列通过无缓冲 SSCursor 分块流式读出，转成 NumPy 数组后在本地
+用 unique/bincount/argpartition 完成分组计数、时间窗口和 Top-N，再批量写回缓存表。
+数据库只做分区裁剪后的顺序读取，不再执行 GROUP BY / 排序 / 临时表，CPU 负载转移到统计机。
+
+依赖 numpy（可选依赖，仅此后端需要）。
+"""
+
+import logging
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+import pymysql
+
+# 事件类型编码直接读取 events.type_code（固定编码见 event_types.py）
+from event_types import PUSH, PULL_REQUEST as PR, ISSUES as ISSUE, WATCH, FORK
+
+logger = logging.getLogger(__name__)
+
+# 每次 fetchmany 的行数（4列 int64，约 6.4MB/块）
+CHUNK_ROWS = 200_000
+
+# 待合并的分块结果超过该键数时先合并一次，控制内存
+_COMPACT_KEYS = 5_000_000
+
+# 写回时每批行数
+WRITE_BATCH = 5000
+
+
+def stream_events(stream_conn, since_date=None, since_ts: Optional[int] = None,
+                  chunk_rows: int = CHUNK_ROWS) -> Iterator[np.ndarray]:
+    """
+    流式读取 events 的 (actor_id, repo_id, 类型编码, created_at 时间戳)
+
+    Args:
+        since_date: created_at_date 下界（含），用于分区裁剪；None 表示全部历史
+        since_ts: created_at 的 UNIX 时间戳下界（含）
+
+    Yields:
+        形如 (n, 4) 的 int64 数组
+    """
+    sql = """
+        SELECT actor_id, repo_id, type_code, UNIX_TIMESTAMP(created_at)
+        FROM events
+    """
+    conditions, params = [], []
+    if since_date is not None:
+        conditions.append("created_at_date >= %s")
+        params.append(since_date)
+    if since_ts is not None:
+        conditions.append("created_at >= FROM_UNIXTIME(%s)")
+        params.append(since_ts)
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+
+    cursor = stream_conn.cursor(pymysql.cursors.SSCursor)
+    try:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            yield np.array(rows, dtype=np.int64)
+    finally:
+        cursor.close()
+
+
+def _should_compact(pending: int, compacted: int) -> bool:
+    """
+    新增部分超过阈值且超过上次合并结果的两倍时才合并：每次合并的代价由之后新增的数据分摊，
+    键很多时不会每个块都重排全部已累计的数据
+    """
+    return pending > max(_COMPACT_KEYS, 2 * compacted)
+
+
+class GroupSums:
+    """按整数键分组累加多列指标（键可以很稀疏，不要求能直接 bincount）"""
+
+    def __init__(self, n_metrics: int):
+        self.n_metrics = n_metrics
+        self._parts: List[Tuple[np.ndarray, np.ndarray]] = []
+        self._pending_keys = 0  # 上次合并后新增的键数
+        self._compacted = 0     # 上次合并结果的键数
+
+    @staticmethod
+    def _reduce(keys: np.ndarray, metrics: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        uniq, inverse = np.unique(keys, return_inverse=True)
+        sums = np.empty((len(uniq), metrics.shape[1]), dtype=np.int64)
+        for j in range(metrics.shape[1]):
+            sums[:, j] = np.bincount(inverse, weights=metrics[:, j], minlength=len(uniq))
+        return uniq, sums
+
+    def add(self, keys: np.ndarray, metrics: np.ndarray):
+        if len(keys) == 0:
+            return
+        part = self._reduce(keys, metrics)
+        self._parts.append(part)
+        self._pending_keys += len(part[0])
+        if _should_compact(self._pending_keys, self._compacted) and len(self._parts) > 1:
+            self._compact()
+
+    def _compact(self):
+        keys = np.concatenate([k for k, _ in self._parts])
+        metrics = np.concatenate([m for _, m in self._parts])
+        self._parts = [self._reduce(keys, metrics)]
+        self._pending_keys = 0
+        self._compacted = len(self._parts[0][0])
+
+    def result(self) -> Tuple[np.ndarray, np.ndarray]:
+        """返回 (升序键, 每键指标矩阵)"""
+        if not self._parts:
+            return np.empty(0, dtype=np.int64), np.empty((0, self.n_metrics), dtype=np.int64)
+        if len(self._parts) > 1:
+            self._compact()
+        return self._parts[0]
+
+
+class DistinctPairs:
+    """累计去重的 (a, b) 整数对（两者均为 32 位无符号ID），用于精确的去重计数"""
+
+    def __init__(self):
+        self._parts: List[np.ndarray] = []
+        self._pending = 0    # 上次合并后新增的对数
+        self._compacted = 0  # 上次合并结果的对数
+
+    def add(self, a: np.ndarray, b: np.ndarray):
+        if len(a) == 0:
+            return
+        part = np.unique((a.astype(np.uint64) << np.uint64(32)) | b.astype(np.uint64))
+        self._parts.append(part)
+        self._pending += len(part)
+        if _should_compact(self._pending, self._compacted) and len(self._parts) > 1:
+            self._parts = [np.unique(np.concatenate(self._parts))]
+            self._pending = 0
+            self._compacted = len(self._parts[0])
+
+    def count_by_first(self) -> Tuple[np.ndarray, np.ndarray]:
+        """按第一个元素统计不同的第二个元素个数，返回 (键, 个数)"""
+        if not self._parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        pairs = np.unique(np.concatenate(self._parts))
+        first = (pairs >> np.uint64(32)).astype(np.int64)
+        keys, counts = np.unique(first, return_counts=True)
+        return keys, counts
+
+
+def _lookup(keys: np.ndarray, values_keys: np.ndarray, values: np.ndarray, default=0) -> np.ndarray:
+    """按键从 (升序 values_keys, values) 中取值，缺失时取 default"""
+    out = np.full(len(keys), default, dtype=values.dtype if len(values) else np.int64)
+    if len(values_keys) == 0 or len(keys) == 0:
+        return out
+    pos = np.searchsorted(values_keys, keys)
+    pos_clipped = np.minimum(pos, len(values_keys) - 1)
+    found = values_keys[pos_clipped] == keys
+    out[found] = values[pos_clipped[found]]
+    return out
+
+
+def top_n(scores: np.ndarray, n: int) -> np.ndarray:
+    """返回得分最高的 n 个下标（降序），只对前 n 个排序"""
+    if len(scores) <= n:
+        return np.argsort(-scores, kind='stable')
+    part = np.argpartition(-scores, n - 1)[:n]
+    return part[np.argsort(-scores[part], kind='stable')]
+
+
+def _db_now(cursor) -> Tuple[int, object]:
+    """数据库当前时间（UNIX 时间戳和 DATETIME），窗口边界与 SQL 后端一致"""
+    cursor.execute("SELECT UNIX_TIMESTAMP(NOW()), NOW()")
+    row = cursor.fetchone()
+    return int(row[0]), row[1]
+
+
+def _date_of(cursor, ts: int):
+    """UNIX 时间戳在数据库会话时区下的日期（用于分区裁剪）"""
+    cursor.execute("SELECT DATE(FROM_UNIXTIME(%s))", (ts,))
+    return cursor.fetchone()[0]
+
+
+def _fetch_by_ids(cursor, sql_template: str, ids: np.ndarray, batch: int = WRITE_BATCH) -> list:
+    """按ID分批主键查询，sql_template 中用 {ids} 占位"""
+    rows = []
+    ids = [int(i) for i in ids]
+    for i in range(0, len(ids), batch):
+        chunk = ids[i:i + batch]
+        cursor.execute(sql_template.format(ids=', '.join(['%s'] * len(chunk))), chunk)
+        rows.extend(cursor.fetchall())
+    return rows
+
+
+def refresh_hot_repos(conn, stream_conn, limit: int = 100) -> int:
+    """
+    热门仓库榜单：7天窗口内星标/Fork/PR 计数 + 总星标，本地打分取 Top-N
+
+    分数公式与 SQL 后端一致：总星标 + 7天星标×2 + 7天Fork×1.5
+    """
+    cursor = conn.cursor()
+    now_ts, _ = _db_now(cursor)
+    since_ts = now_ts - 7 * 86400
+
+    sums = GroupSums(3)
+    for chunk in stream_events(stream_conn, since_date=_date_of(cursor, since_ts), since_ts=since_ts):
+        types = chunk[:, 2]
+        metrics = np.stack([types == WATCH, types == FORK, types == PR], axis=1).astype(np.int64)
+        sums.add(chunk[:, 1], metrics)
+    repo_ids, window = sums.result()
+
+    # 候选 = 窗口内有活动的仓库 ∪ 历史星标前 limit
+    cursor.execute("SELECT repo_id FROM repos ORDER BY total_stars DESC LIMIT %s", (limit,))
+    top_total = np.array([row[0] for row in cursor.fetchall()], dtype=np.int64)
+    candidates = np.union1d(repo_ids, top_total)
+    info = _fetch_by_ids(cursor, "SELECT repo_id, name, total_stars FROM repos WHERE repo_id IN ({ids})", candidates)
+    info.sort(key=lambda row: row[0])
+    info_ids = np.array([row[0] for row in info], dtype=np.int64)
+    names = [row[1] for row in info]
+    total_stars = np.array([row[2] or 0 for row in info], dtype=np.int64)
+
+    stars_7d = _lookup(info_ids, repo_ids, window[:, 0])
+    forks_7d = _lookup(info_ids, repo_ids, window[:, 1])
+    prs_7d = _lookup(info_ids, repo_ids, window[:, 2])
+    scores = total_stars + stars_7d * 2 + forks_7d * 1.5
+
+    order = [i for i in top_n(scores, limit) if scores[i] > 0]
+    cursor.execute("DELETE FROM hot_repos")
+    cursor.executemany("""
+        INSERT INTO hot_repos (
+            repo_id, repo_name, score, stars_7d, forks_7d, prs_7d, rank_position, updated_at
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
+    """, [
+        (int(info_ids[i]), names[i], float(scores[i]), int(stars_7d[i]), int(forks_7d[i]), int(prs_7d[i]), rank)
+        for rank, i in enumerate(order, start=1)
+    ])
+    conn.commit()
+    cursor.close()
+    return len(order)
+
+
+def refresh_active_developers(conn, stream_conn, window_days: int = 7, limit: int = 100) -> int:
+    """
+    活跃开发者榜单：窗口内各类型计数 + 精确的参与仓库数，本地打分取 Top-N
+
+    分数公式与 SQL 后端一致：总事件数 + 窗口内事件数（窗口按 created_at_date，不含 window_days 天前当天）
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT DATE_SUB(CURDATE(), INTERVAL %s DAY)", (window_days - 1,))
+    since_date = cursor.fetchone()[0]
+
+    sums = GroupSums(4)
+    pairs = DistinctPairs()
+    for chunk in stream_events(stream_conn, since_date=since_date):
+        types = chunk[:, 2]
+        metrics = np.stack([np.ones(len(chunk), dtype=bool), types == PUSH, types == PR, types == ISSUE],
+                           axis=1).astype(np.int64)
+        sums.add(chunk[:, 0], metrics)
+        pairs.add(chunk[:, 0], chunk[:, 1])
+    actor_ids, window = sums.result()
+    repo_actor_ids, repo_counts = pairs.count_by_first()
+
+    cursor.execute("SELECT actor_id FROM actors ORDER BY total_events DESC LIMIT %s", (limit,))
+    top_total = np.array([row[0] for row in cursor.fetchall()], dtype=np.int64)
+    candidates = np.union1d(actor_ids, top_total)
+    info = _fetch_by_ids(cursor, "SELECT actor_id, login, total_events FROM actors WHERE actor_id IN ({ids})",
+                         candidates)
+    info.sort(key=lambda row: row[0])
+    info_ids = np.array([row[0] for row in info], dtype=np.int64)
+    logins = [row[1] for row in info]
+    total_events = np.array([row[2] or 0 for row in info], dtype=np.int64)
+
+    events_7d = _lookup(info_ids, actor_ids, window[:, 0])
+    scores = total_events + events_7d
+    commits_7d = _lookup(info_ids, actor_ids, window[:, 1])
+    prs_7d = _lookup(info_ids, actor_ids, window[:, 2])
+    issues_7d = _lookup(info_ids, actor_ids, window[:, 3])
+    repos_7d = _lookup(info_ids, repo_actor_ids, repo_counts)
+
+    order = [i for i in top_n(scores, limit) if scores[i] > 0]
+    cursor.execute("DELETE FROM active_developers")
+    cursor.executemany("""
+        INSERT INTO active_developers (
+            actor_id, actor_login, activity_score,
+            commits_7d, prs_7d, issues_7d, repos_7d, rank_position, updated_at
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, NOW())
+    """, [
+        (int(info_ids[i]), logins[i], int(scores[i]), int(commits_7d[i]), int(prs_7d[i]),
+         int(issues_7d[i]), int(repos_7d[i]), rank)
+        for rank, i in enumerate(order, start=1)
+    ])
+    conn.commit()
+    cursor.close()
+    return len(order)
+
+
+def refresh_repo_stats_cache(conn, stream_conn) -> int:
+    """
+    仓库统计缓存：流式扫描全部历史事件，本地计算各仓库提交/PR/Issue 总数和 1/7/30 天星标，
+    与 repos、repo_actor_sketches 中的累计值合并后批量 upsert，最后删除本轮未刷新的行
+    """
+    cursor = conn.cursor()
+    now_ts, run_started = _db_now(cursor)
+    day_1, day_7, day_30 = now_ts - 86400, now_ts - 7 * 86400, now_ts - 30 * 86400
+
+    sums = GroupSums(6)
+    for chunk in stream_events(stream_conn):
+        types, ts = chunk[:, 2], chunk[:, 3]
+        watch = types == WATCH
+        metrics = np.stack([
+            types == PUSH, types == PR, types == ISSUE,
+            watch & (ts >= day_1), watch & (ts >= day_7), watch & (ts >= day_30)
+        ], axis=1).astype(np.int64)
+        sums.add(chunk[:, 1], metrics)
+    repo_ids, totals = sums.result()
+
+    # 与 SQL 后端相同的过滤条件：有提交/PR/Issue 或 7 天内有星标
+    keep = (totals[:, 0] > 0) | (totals[:, 1] > 0) | (totals[:, 2] > 0) | (totals[:, 4] > 0)
+    repo_ids, totals = repo_ids[keep], totals[keep]
+
+    written = 0
+    for i in range(0, len(repo_ids), WRITE_BATCH):
+        ids = repo_ids[i:i + WRITE_BATCH]
+        info = {row[0]: row[1:] for row in _fetch_by_ids(cursor, """
+            SELECT r.repo_id, r.total_stars, r.total_forks, r.total_contributors,
+                   sk.watchers_est, sk.contributors_est
+            FROM repos r
+            LEFT JOIN repo_actor_sketches sk ON sk.repo_id = r.repo_id
+            WHERE r.repo_id IN ({ids})
+        """, ids)}
+        values = []
+        for repo_id, t in zip(ids.tolist(), totals[i:i + WRITE_BATCH].tolist()):
+            if repo_id not in info:
+                continue
+            stars, forks, contributors, watchers_est, contributors_est = info[repo_id]
+            values.append((
+                repo_id, stars or 0, forks or 0, watchers_est or 0,
+                max(contributors or 0, contributors_est or 0),
+                t[0], t[1], t[2], t[3], t[4], t[5]
+            ))
+        cursor.executemany("""
+            INSERT INTO repo_stats_cache (
+                repo_id, total_stars, total_forks, total_watchers, total_contributors,
+                total_commits, total_prs, total_issues, stars_1d, stars_7d, stars_30d, updated_at
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+            ON DUPLICATE KEY UPDATE
+                total_stars = VALUES(total_stars),
+                total_forks = VALUES(total_forks),
+                total_watchers = VALUES(total_watchers),
+                total_contributors = VALUES(total_contributors),
+                total_commits = VALUES(total_commits),
+                total_prs = VALUES(total_prs),
+                total_issues = VALUES(total_issues),
+                stars_1d = VALUES(stars_1d),
+                stars_7d = VALUES(stars_7d),
+                stars_30d = VALUES(stars_30d),
+                updated_at = VALUES(updated_at)
+        """, values)
+        conn.commit()
+        written += len(values)
+
+    cursor.execute("DELETE FROM repo_stats_cache WHERE updated_at < %s", (run_started,))
+    conn.commit()
+    cursor.close()
+    return written
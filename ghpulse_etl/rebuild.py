@@ -0,0 +1,188 @@
+"""
+分块、可续跑的缓存表全量重建
+按主键区间分块处理，每块单独提交，进度写入 rebuild_progress，中断后从上次位置继续；
+每块开始前检查从库延迟和行锁等待，超过阈值时退避等待，可在业务时间运行。
+"""
+
+import os
+import time
+import logging
+from typing import Callable, List, Optional
+
+import pymysql
+
+logger = logging.getLogger(__name__)
+
+# 默认节流阈值
+DEFAULT_MAX_REPLICA_LAG = 10      # 秒
+DEFAULT_MAX_LOCK_WAITS = 5        # Innodb_row_lock_current_waits
+MAX_BACKOFF_SECONDS = 60
+
+
+class RebuildThrottle:
+    """
+    根据从库延迟和当前行锁等待数节流
+
+    从库通过环境变量 REPLICA_HOST / REPLICA_PORT 配置（账号沿用 DB_USER），
+    未配置时只检查主库行锁等待。
+    """
+
+    def __init__(self, conn, max_lag: float = DEFAULT_MAX_REPLICA_LAG,
+                 max_lock_waits: int = DEFAULT_MAX_LOCK_WAITS):
+        self.conn = conn
+        self.max_lag = max_lag
+        self.max_lock_waits = max_lock_waits
+        self.throttled_seconds = 0.0
+        self._replica = None
+        self._replica_config = None
+        if os.getenv('REPLICA_HOST'):
+            self._replica_config = {
+                'host': os.getenv('REPLICA_HOST'),
+                'port': int(os.getenv('REPLICA_PORT', 3306)),
+                'user': os.getenv('DB_USER'),
+                'password': os.getenv('DB_PASSWORD'),
+                'charset': 'utf8mb4',
+                'cursorclass': pymysql.cursors.DictCursor,
+                'connect_timeout': 10
+            }
+
+    def close(self):
+        if self._replica:
+            self._replica.close()
+            self._replica = None
+
+    def replica_lag(self) -> Optional[float]:
+        """从库延迟（秒）；未配置从库或无法获取时返回 None"""
+        if not self._replica_config:
+            return None
+        try:
+            if self._replica is None:
+                self._replica = pymysql.connect(**self._replica_config)
+            cursor = self._replica.cursor()
+            try:
+                try:
+                    cursor.execute("SHOW REPLICA STATUS")
+                except pymysql.err.ProgrammingError:
+                    # MySQL 8.0.22 之前的语法
+                    cursor.execute("SHOW SLAVE STATUS")
+                row = cursor.fetchone()
+            finally:
+                cursor.close()
+        except Exception as e:
+            logger.warning(f"  ⚠ 获取从库延迟失败: {e}")
+            self.close()
+            return None
+        if not row:
+            return None
+        lag = row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+        return float(lag) if lag is not None else None
+
+    def lock_waits(self) -> int:
+        """主库当前等待行锁的事务数"""
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("SHOW GLOBAL STATUS LIKE 'Innodb_row_lock_current_waits'")
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+        return int(row[1]) if row else 0
+
+    def wait(self):
+        """阻塞直到延迟和锁等待都回落到阈值以下（指数退避）"""
+        backoff = 1.0
+        while True:
+            lag = self.replica_lag()
+            waits = self.lock_waits()
+            if (lag is None or lag <= self.max_lag) and waits <= self.max_lock_waits:
+                return
+            logger.info(f"  ⏸ 节流: 从库延迟={lag}s 行锁等待={waits}，{backoff:.0f} 秒后重试")
+            time.sleep(backoff)
+            self.throttled_seconds += backoff
+            backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
+
+
+def load_progress(cursor, job_name: str, restart: bool = False):
+    """
+    读取或初始化重建进度
+
+    Returns:
+        (上次处理到的ID, 本轮重建开始时间)；上次已完成或 restart=True 时重新开始
+    """
+    cursor.execute("""
+        SELECT last_id, started_at, finished_at FROM rebuild_progress
+        WHERE job_name = %s
+    """, (job_name,))
+    row = cursor.fetchone()
+    if row and row[2] is None and not restart:
+        logger.info(f"  ↻ 续跑 {job_name}: 从 ID > {row[0]} 继续（开始于 {row[1]}）")
+        return row[0], row[1]
+
+    cursor.execute("""
+        INSERT INTO rebuild_progress (job_name, last_id, rows_done, chunks_done, started_at, finished_at)
+        VALUES (%s, 0, 0, 0, NOW(), NULL)
+        ON DUPLICATE KEY UPDATE
+            last_id = 0, rows_done = 0, chunks_done = 0,
+            started_at = NOW(), finished_at = NULL
+    """, (job_name,))
+    cursor.execute("SELECT started_at FROM rebuild_progress WHERE job_name = %s", (job_name,))
+    return 0, cursor.fetchone()[0]
+
+
+def run_chunked_rebuild(conn, job_name: str, next_ids_sql: str,
+                        process_chunk: Callable[[object, List[int]], int],
+                        purge_sql: str, chunk_size: int = 1000, restart: bool = False,
+                        max_lag: float = DEFAULT_MAX_REPLICA_LAG,
+                        max_lock_waits: int = DEFAULT_MAX_LOCK_WAITS) -> int:
+    """
+    按主键顺序分块重建一张缓存表
+
+    Args:
+        next_ids_sql: 取下一批ID的SQL，参数为 (上次ID, chunk_size)，须按ID升序返回
+        process_chunk: (cursor, ids) -> 写入行数，对这批ID执行 upsert
+        purge_sql: 删除区间内本轮未刷新的过期行，参数为 (区间下界(不含), 区间上界(含), 开始时间)
+
+    Returns:
+        本次运行写入的行数
+    """
+    cursor = conn.cursor()
+    throttle = RebuildThrottle(conn, max_lag, max_lock_waits)
+    total = 0
+    chunks = 0
+    started = time.time()
+    try:
+        last_id, started_at = load_progress(cursor, job_name, restart)
+        conn.commit()
+
+        while True:
+            throttle.wait()
+            cursor.execute(next_ids_sql, (last_id, chunk_size))
+            ids = [row[0] for row in cursor.fetchall()]
+            # 最后一块扩展到无穷大，清理末尾已不存在的ID
+            upper = ids[-1] if len(ids) == chunk_size else 2 ** 63 - 1
+
+            written = process_chunk(cursor, ids) if ids else 0
+            cursor.execute(purge_sql, (last_id, upper, started_at))
+            cursor.execute("""
+                UPDATE rebuild_progress
+                SET last_id = %s, rows_done = rows_done + %s, chunks_done = chunks_done + 1,
+                    finished_at = IF(%s, NOW(), NULL)
+                WHERE job_name = %s
+            """, (ids[-1] if ids else last_id, written, len(ids) < chunk_size, job_name))
+            conn.commit()
+
+            total += written
+            chunks += 1
+            if ids:
+                last_id = ids[-1]
+            if chunks % 50 == 0:
+                logger.info(f"  已处理 {chunks} 块，写入 {total:,} 行（当前ID {last_id}）")
+            if len(ids) < chunk_size:
+                break
+
+        elapsed = time.time() - started
+        logger.info(f"  ✓ {job_name} 重建完成: {chunks} 块，{total:,} 行，耗时 {elapsed:.1f} 秒"
+                    f"（节流等待 {throttle.throttled_seconds:.0f} 秒）")
+        return total
+    finally:
+        throttle.close()
+        cursor.close()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+GHPulse 小时级数据核对脚本
+比较 GH Archive 小时摘要（事件数、各类型事件数、gh_event_id 的 CRC32 之和）与 events 中
+同一小时的摘要，只重新摄取不一致的小时。
+
+GH Archive 一侧的摘要在摄取时记录到 archive_hour_digests，核对时无需重新下载；
+本功能上线前摄取的小时没有摘要，可用 --fetch-missing 下载计算一次（之后即已记录）。
+数据库一侧每天一条语句（分区裁剪 + created_at 范围扫描）得到 24 个小时的摘要。
+
+用法：
+    python reconcile.py 2025-01                  # 核对整月
+    python reconcile.py 2025-01-15 --dry-run     # 只报告，不重新摄取
+    python reconcile.py 2025-01-15-03 --fetch-missing
+"""
+
+import os
+import sys
+import argparse
+import logging
+from datetime import datetime, date, timedelta
+from typing import Dict, List, Tuple
+
+import pymysql
+from dotenv import load_dotenv
+
+from hour_digests import HourDigest, digest_events, save_archive_digest, load_archive_digests, database_digests
+from streaming_ingest import DualConnectionIngestor
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout),
+        logging.FileHandler('reconcile.log', encoding='utf-8')
+    ]
+)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST'),
+    'port': int(os.getenv('DB_PORT', 3306)),
+    'user': os.getenv('DB_USER'),
+    'password': os.getenv('DB_PASSWORD'),
+    'database': os.getenv('DB_NAME'),
+    'charset': 'utf8mb4'
+}
+
+
+def get_db_connection():
+    """获取数据库连接"""
+    try:
+        return pymysql.connect(**DB_CONFIG)
+    except Exception as e:
+        logger.error(f"数据库连接失败: {e}")
+        raise
+
+
+def parse_period(text: str) -> Tuple[datetime, datetime]:
+    """YYYY-MM / YYYY-MM-DD / YYYY-MM-DD-HH -> [start, end)"""
+    parts = [int(part) for part in text.split('-')]
+    if len(parts) == 2:
+        start = datetime(parts[0], parts[1], 1)
+        end = datetime(parts[0] + parts[1] // 12, parts[1] % 12 + 1, 1)
+    elif len(parts) == 3:
+        start = datetime(*parts)
+        end = start + timedelta(days=1)
+    elif len(parts) == 4:
+        start = datetime(*parts)
+        end = start + timedelta(hours=1)
+    else:
+        raise ValueError(f"无法解析时间范围: {text}（格式 YYYY-MM、YYYY-MM-DD 或 YYYY-MM-DD-HH）")
+    # 当前小时的文件尚未发布，不参与核对
+    latest = datetime.utcnow().replace(minute=0, second=0, microsecond=0) - timedelta(hours=1)
+    return start, min(end, latest)
+
+
+def archived_months(cursor) -> set:
+    """已归档并删除分区的月份（这些月份的事件不在 events 中）"""
+    cursor.execute("SELECT month FROM events_archive WHERE status = 'dropped'")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def mark_checked(cursor, hour_start: datetime, status: str):
+    """记录核对结果"""
+    cursor.execute("""
+        UPDATE archive_hour_digests SET checked_at = NOW(), check_status = %s
+        WHERE hour_start = %s
+    """, (status, hour_start))
+
+
+def fetch_digest(conn, ingestor: DualConnectionIngestor, hour_start: datetime) -> HourDigest:
+    """下载 GH Archive 小时文件计算摘要并记录"""
+    logger.info(f"  下载 {hour_start:%Y-%m-%d-%H} 计算摘要")
+    events = ingestor.download_hour(hour_start.year, hour_start.month, hour_start.day, hour_start.hour)
+    digest = digest_events(events).get(hour_start, HourDigest())
+    cursor = conn.cursor()
+    try:
+        save_archive_digest(cursor, hour_start, digest)
+        conn.commit()
+    finally:
+        cursor.close()
+    return digest
+
+
+def reconcile(start: datetime, end: datetime, fetch_missing: bool = False, dry_run: bool = False) -> Dict[str, int]:
+    """
+    核对 [start, end) 内的每个小时，重新摄取不一致的小时
+
+    Returns:
+        各结果的小时数：match / mismatch / reingested / missing / archived
+    """
+    counts = {'match': 0, 'mismatch': 0, 'reingested': 0, 'missing': 0, 'archived': 0}
+    ingestor = DualConnectionIngestor() if fetch_missing or not dry_run else None
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        skipped_months = archived_months(cursor)
+        archive = load_archive_digests(cursor, start, end)
+
+        day = start.date()
+        while datetime.combine(day, datetime.min.time()) < end:
+            if day.strftime('%Y-%m') in skipped_months:
+                next_month = date(day.year + day.month // 12, day.month % 12 + 1, 1)
+                span = min(end, datetime.combine(next_month, datetime.min.time())) \
+                    - max(start, datetime.combine(day, datetime.min.time()))
+                counts['archived'] += int(span.total_seconds() // 3600)
+                day = next_month
+                continue
+
+            database = database_digests(cursor, day)
+            mismatched: List[datetime] = []
+            for hour in range(24):
+                hour_start = datetime.combine(day, datetime.min.time()) + timedelta(hours=hour)
+                if not start <= hour_start < end:
+                    continue
+                expected = archive.get(hour_start)
+                if expected is None:
+                    if not fetch_missing:
+                        counts['missing'] += 1
+                        logger.info(f"  {hour_start:%Y-%m-%d-%H} 无 GH Archive 摘要（--fetch-missing 可下载计算）")
+                        continue
+                    expected = fetch_digest(conn, ingestor, hour_start)
+                actual = database.get(hour_start, HourDigest())
+                if expected == actual:
+                    counts['match'] += 1
+                    mark_checked(cursor, hour_start, 'match')
+                else:
+                    logger.warning(f"  ✗ {hour_start:%Y-%m-%d-%H} 不一致: {expected.describe_diff(actual)}")
+                    mismatched.append(hour_start)
+                    archive[hour_start] = expected
+            conn.commit()
+
+            for hour_start in mismatched:
+                if dry_run:
+                    counts['mismatch'] += 1
+                    mark_checked(cursor, hour_start, 'mismatch')
+                    continue
+                logger.info(f"  ↻ 重新摄取 {hour_start:%Y-%m-%d-%H}")
+                try:
+                    ingestor.ingest_hour(hour_start.year, hour_start.month, hour_start.day, hour_start.hour)
+                except Exception as e:
+                    logger.error(f"  ✗ 重新摄取 {hour_start:%Y-%m-%d-%H} 失败: {e}")
+                    counts['mismatch'] += 1
+                    mark_checked(cursor, hour_start, 'mismatch')
+                    continue
+                # 摄取时已重新记录 GH Archive 摘要；结束当前事务快照后重新读取两侧再比较
+                conn.commit()
+                expected = load_archive_digests(cursor, hour_start, hour_start + timedelta(hours=1)).get(
+                    hour_start, archive[hour_start])
+                actual = database_digests(cursor, day).get(hour_start, HourDigest())
+                if expected == actual:
+                    counts['reingested'] += 1
+                    mark_checked(cursor, hour_start, 'reingested')
+                else:
+                    # 只补缺失的事件；数据库中多出的事件（或跨小时的事件）需人工检查
+                    logger.warning(f"  ✗ {hour_start:%Y-%m-%d-%H} 重新摄取后仍不一致: {expected.describe_diff(actual)}")
+                    counts['mismatch'] += 1
+                    mark_checked(cursor, hour_start, 'mismatch')
+            conn.commit()
+
+            day += timedelta(days=1)
+        cursor.close()
+    finally:
+        conn.close()
+    return counts
+
+
+def main(period: str, fetch_missing: bool = False, dry_run: bool = False):
+    start, end = parse_period(period)
+    logger.info("=" * 60)
+    logger.info(f"🔍 核对 {start:%Y-%m-%d %H:00} ~ {end:%Y-%m-%d %H:00}")
+    logger.info("=" * 60)
+    if start >= end:
+        logger.info("没有可核对的小时")
+        return
+
+    counts = reconcile(start, end, fetch_missing, dry_run)
+    logger.info("=" * 60)
+    logger.info(f"一致 {counts['match']} 小时，重新摄取后一致 {counts['reingested']} 小时，"
+                f"不一致 {counts['mismatch']} 小时，无摘要 {counts['missing']} 小时，已归档 {counts['archived']} 小时")
+    logger.info("=" * 60)
+    if counts['mismatch']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='GHPulse 小时级数据核对')
+    parser.add_argument('period', help='核对范围：YYYY-MM、YYYY-MM-DD 或 YYYY-MM-DD-HH（UTC）')
+    parser.add_argument('--fetch-missing', action='store_true', help='没有记录摘要的小时下载 GH Archive 文件计算')
+    parser.add_argument('--dry-run', action='store_true', help='只报告不一致的小时，不重新摄取')
+    args = parser.parse_args()
+
+    try:
+        main(args.period, args.fetch_missing, args.dry_run)
+    except KeyboardInterrupt:
+        logger.warning("\n⚠️  用户中断执行")
+        sys.exit(1)
+    except Exception as e:
+        logger.error(f"\n❌ 执行失败: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        sys.exit(1)
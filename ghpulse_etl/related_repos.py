@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+GHPulse 相关仓库计算脚本
+把 user_repo_relation（用户-仓库二部图）读入稀疏矩阵（CSR），用稀疏矩阵乘法计算
+仓库之间的共同用户数，按余弦相似度为每个仓库保留 Top-K，写入 repo_related 表。
+
+关联类型：
+- star: 关注/Fork 过同一批用户的仓库（"看过这个的人也看了"）
+- contributor: 由同一批用户贡献的仓库（共同贡献者相似度）
+
+依赖 numpy 和 scipy（可选依赖，仅此脚本需要），适合每天运行一次。
+"""
+
+import os
+import sys
+import time
+import argparse
+import logging
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+import pymysql
+import scipy.sparse as sp
+from dotenv import load_dotenv
+
+from data_versions import bump_version, RELATED
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout),
+        logging.FileHandler('related_repos.log', encoding='utf-8')
+    ]
+)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST'),
+    'port': int(os.getenv('DB_PORT', 3306)),
+    'user': os.getenv('DB_USER'),
+    'password': os.getenv('DB_PASSWORD'),
+    'database': os.getenv('DB_NAME'),
+    'charset': 'utf8mb4'
+}
+
+# 关联类型 -> user_repo_relation.relation_type
+RELATION_KINDS: Dict[str, Tuple[str, ...]] = {
+    'star': ('star', 'fork'),
+    'contributor': ('contributor',),
+}
+
+# 每个仓库保留的相关仓库数
+DEFAULT_TOP_K = 20
+
+# 共同用户少于该值的仓库对不算相关（只有1个共同用户多为噪声）
+MIN_SHARED_ACTORS = 2
+
+# 关联仓库超过该数的用户视为机器人/爬虫，不参与计算（其贡献 deg^2 个仓库对，且几乎不含信息）
+MAX_ACTOR_REPOS = 1000
+
+# 每次矩阵乘法处理的仓库行数，控制中间结果内存
+BLOCK_REPOS = 2000
+
+# 每次 fetchmany / executemany 的行数
+FETCH_ROWS = 200_000
+WRITE_BATCH = 5000
+
+
+def get_db_connection():
+    """获取数据库连接"""
+    try:
+        return pymysql.connect(**DB_CONFIG)
+    except Exception as e:
+        logger.error(f"数据库连接失败: {e}")
+        raise
+
+
+def stream_relations(conn, relation_types: Tuple[str, ...]) -> Iterator[np.ndarray]:
+    """流式读取有效的 (actor_id, repo_id) 关联，每块为 (n, 2) 的 int64 数组"""
+    placeholders = ', '.join(['%s'] * len(relation_types))
+    cursor = conn.cursor(pymysql.cursors.SSCursor)
+    try:
+        cursor.execute(f"""
+            SELECT actor_id, repo_id FROM user_repo_relation
+            WHERE is_valid = 1 AND relation_type IN ({placeholders})
+        """, relation_types)
+        while True:
+            rows = cursor.fetchmany(FETCH_ROWS)
+            if not rows:
+                break
+            yield np.array(rows, dtype=np.int64)
+    finally:
+        cursor.close()
+
+
+def build_matrix(pairs: np.ndarray, max_actor_repos: int = MAX_ACTOR_REPOS):
+    """
+    由 (actor_id, repo_id) 构造 仓库×用户 的 0/1 CSR 矩阵
+
+    Returns:
+        (矩阵, 行号对应的 repo_id 数组)
+    """
+    # 同一用户对同一仓库既 star 又 fork 时只算一次
+    pairs = np.unique(pairs, axis=0)
+    actor_ids, actor_idx = np.unique(pairs[:, 0], return_inverse=True)
+    degree = np.bincount(actor_idx)
+    # 只关联1个仓库的用户不产生仓库对；关联过多的用户剔除
+    keep = (degree[actor_idx] >= 2) & (degree[actor_idx] <= max_actor_repos)
+    dropped = int(np.count_nonzero(degree > max_actor_repos))
+    if dropped:
+        logger.info(f"  忽略 {dropped} 个关联仓库超过 {max_actor_repos} 的用户")
+
+    pairs = pairs[keep]
+    actor_ids, actor_idx = np.unique(pairs[:, 0], return_inverse=True)
+    repo_ids, repo_idx = np.unique(pairs[:, 1], return_inverse=True)
+    matrix = sp.csr_matrix(
+        (np.ones(len(pairs), dtype=np.int32), (repo_idx, actor_idx)),
+        shape=(len(repo_ids), len(actor_ids))
+    )
+    return matrix, repo_ids
+
+
+def top_k_related(matrix, top_k: int = DEFAULT_TOP_K, min_shared: int = MIN_SHARED_ACTORS,
+                  block: int = BLOCK_REPOS) -> Iterator[Tuple[np.ndarray, ...]]:
+    """
+    分块计算共现矩阵 M·Mᵀ 并为每行保留得分最高的 top_k 列
+
+    得分为余弦相似度 shared / sqrt(deg_i * deg_j)，避免热门仓库与所有仓库都相关。
+
+    Yields:
+        (行号, 列号, 排名(从1开始), 共同用户数, 得分)，每块一组
+    """
+    transposed = matrix.T.tocsr()
+    repo_degree = np.asarray(matrix.getnnz(axis=1), dtype=np.float64)
+
+    for start in range(0, matrix.shape[0], block):
+        stop = min(start + block, matrix.shape[0])
+        shared = (matrix[start:stop] @ transposed).tocoo()
+        rows = shared.row.astype(np.int64) + start
+        cols = shared.col.astype(np.int64)
+        counts = shared.data
+
+        mask = (rows != cols) & (counts >= min_shared)
+        rows, cols, counts = rows[mask], cols[mask], counts[mask]
+        if not len(rows):
+            continue
+        scores = counts / np.sqrt(repo_degree[rows] * repo_degree[cols])
+
+        # 按 (行, 得分降序, 共同用户数降序) 排序后取每行前 top_k 个
+        order = np.lexsort((-counts, -scores, rows))
+        rows, cols, counts, scores = rows[order], cols[order], counts[order], scores[order]
+        row_start = np.searchsorted(rows, rows, side='left')
+        rank = np.arange(len(rows)) - row_start
+        keep = rank < top_k
+        yield rows[keep], cols[keep], rank[keep] + 1, counts[keep], scores[keep]
+
+
+def refresh_kind(conn, kind: str, top_k: int = DEFAULT_TOP_K,
+                 max_actor_repos: int = MAX_ACTOR_REPOS) -> int:
+    """
+    计算一种关联类型的相关仓库并写入 repo_related
+
+    以 upsert 覆盖 (repo_id, relation_kind, rank_position)，结束后删除本轮未覆盖的旧行，
+    计算期间 Web 端始终能读到完整结果。
+
+    Returns:
+        写入的行数
+    """
+    started = time.time()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT NOW()")
+        run_started = cursor.fetchone()[0]
+
+        logger.info(f"⏳ 读取 {kind} 关联...")
+        chunks = list(stream_relations(conn, RELATION_KINDS[kind]))
+        if not chunks:
+            logger.warning(f"⚠️  user_repo_relation 中没有 {kind} 关联，跳过")
+            return 0
+        pairs = np.concatenate(chunks)
+        del chunks
+
+        matrix, repo_ids = build_matrix(pairs, max_actor_repos)
+        del pairs
+        logger.info(f"  矩阵: {matrix.shape[0]:,} 个仓库 × {matrix.shape[1]:,} 个用户，"
+                    f"{matrix.nnz:,} 条关联")
+
+        written = 0
+        for rows, cols, ranks, counts, scores in top_k_related(matrix, top_k):
+            values = list(zip(
+                repo_ids[rows].tolist(), [kind] * len(rows), ranks.tolist(),
+                repo_ids[cols].tolist(), counts.tolist(), np.round(scores, 6).tolist()
+            ))
+            for offset in range(0, len(values), WRITE_BATCH):
+                cursor.executemany("""
+                    INSERT INTO repo_related (
+                        repo_id, relation_kind, rank_position,
+                        related_repo_id, shared_actors, score, updated_at
+                    ) VALUES (%s, %s, %s, %s, %s, %s, NOW())
+                    ON DUPLICATE KEY UPDATE
+                        related_repo_id = VALUES(related_repo_id),
+                        shared_actors = VALUES(shared_actors),
+                        score = VALUES(score),
+                        updated_at = VALUES(updated_at)
+                """, values[offset:offset + WRITE_BATCH])
+            conn.commit()
+            written += len(values)
+
+        # 清理本轮没有覆盖到的旧行（仓库不再有相关仓库，或相关仓库数变少）
+        cursor.execute("""
+            DELETE FROM repo_related
+            WHERE relation_kind = %s AND updated_at < %s
+        """, (kind, run_started))
+        purged = cursor.rowcount
+        conn.commit()
+
+        logger.info(f"✓ {kind}: 写入 {written:,} 行，清理 {purged:,} 行过期数据，"
+                    f"耗时 {time.time() - started:.1f} 秒")
+        return written
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"❌ 计算 {kind} 相关仓库失败: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+def main(kinds: List[str], top_k: int = DEFAULT_TOP_K, max_actor_repos: int = MAX_ACTOR_REPOS):
+    """计算指定关联类型的相关仓库"""
+    logger.info("=" * 60)
+    logger.info("🔗 更新相关仓库")
+    logger.info("=" * 60)
+
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SHOW TABLES LIKE 'repo_related'")
+        exists = cursor.fetchone()
+        cursor.close()
+        if not exists:
+            logger.error("❌ repo_related 表不存在，请先执行 db_init.sql")
+            return
+
+        for kind in kinds:
+            refresh_kind(conn, kind, top_k, max_actor_repos)
+        bump_version(conn, RELATED)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='GHPulse 相关仓库计算')
+    parser.add_argument('--kind', choices=list(RELATION_KINDS), action='append',
+                        help='只计算指定关联类型（可重复，默认全部）')
+    parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K, help='每个仓库保留的相关仓库数')
+    parser.add_argument('--max-actor-repos', type=int, default=MAX_ACTOR_REPOS,
+                        help='关联仓库数超过该值的用户不参与计算')
+    args = parser.parse_args()
+
+    try:
+        main(args.kind or list(RELATION_KINDS), args.top_k, args.max_actor_repos)
+    except KeyboardInterrupt:
+        logger.warning("\n⚠️  用户中断执行")
+        sys.exit(1)
+    except Exception as e:
+        logger.error(f"\n❌ 执行失败: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        sys.exit(1)
@@ -0,0 +1,419 @@
+"""
+增量汇总表维护
+摄取脚本在写入新事件后，于同一事务内调用本模块更新各汇总表。
+只传入本次真正新写入的事件，重复摄取同一小时不会重复累加。
+"""
+
+from collections import namedtuple, defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from hll import HyperLogLog
+from topk import DecayedSpaceSaving
+
+# 前 EVENT_INSERT_COLUMNS 列与 events 表插入列顺序一致，row[:EVENT_INSERT_COLUMNS] 可直接作为
+# executemany 的参数；event_type 为类型名，只在进程内供汇总表和趋势追踪使用，不写入 events
+EventRow = namedtuple('EventRow', [
+    'gh_event_id', 'type_code', 'public', 'created_at', 'created_at_date',
+    'actor_id', 'repo_id', 'org_id', 'payload_id', 'event_type'
+])
+EVENT_INSERT_COLUMNS = 9
+
+# 小时汇总表中单独计数的事件类型
+HOURLY_TYPE_COLUMNS = {
+    'WatchEvent': 'star_count',
+    'ForkEvent': 'fork_count',
+    'PullRequestEvent': 'pr_count',
+    'PushEvent': 'push_count',
+    'IssuesEvent': 'issue_count',
+}
+
+# 小时桶保留时长（30天 = 720个桶）
+HOURLY_RETENTION_HOURS = 720
+
+# 用户每日汇总表中单独计数的事件类型
+ACTOR_DAILY_TYPE_COLUMNS = {
+    'PushEvent': 'push_count',
+    'PullRequestEvent': 'pr_count',
+    'IssuesEvent': 'issue_count',
+    'WatchEvent': 'watch_count',
+    'ForkEvent': 'fork_count',
+}
+ACTOR_DAILY_COUNT_COLUMNS = ['event_count'] + list(ACTOR_DAILY_TYPE_COLUMNS.values())
+
+# 用户参与仓库草图精度（误差约3.3%，单用户仓库数通常很小，稀疏模式下基本精确）
+ACTOR_REPO_SKETCH_P = 10
+
+# 仓库关注者/贡献者草图精度（误差约1.6%）
+REPO_ACTOR_SKETCH_P = 12
+
+# 趋势仓库追踪器：计数器个数、衰减半衰期、刷新到 hot_repos 的候选数与最小间隔
+TRENDING_STATE_NAME = 'repos'
+TRENDING_CAPACITY = 2000
+TRENDING_HALF_LIFE_HOURS = 24
+TRENDING_CANDIDATES = 300
+TRENDING_FLUSH_MINUTES = 10
+
+# hot_repos 榜单长度
+HOT_REPOS_LIMIT = 100
+
+# overview_counters 只有一行
+OVERVIEW_ROW_ID = 1
+
+
+class ActorDayAggregate:
+    """单个 (actor_id, 日期) 的增量：各类型计数 + 参与仓库草图"""
+    
+    __slots__ = ('counts', 'repos')
+    
+    def __init__(self):
+        self.counts = defaultdict(int)
+        self.repos = HyperLogLog(ACTOR_REPO_SKETCH_P)
+    
+    def add(self, event_type: str, repo_id: int, n: int = 1):
+        self.counts['event_count'] += n
+        column = ACTOR_DAILY_TYPE_COLUMNS.get(event_type)
+        if column:
+            self.counts[column] += n
+        self.repos.add(repo_id)
+
+
+def hour_bucket(dt: datetime) -> datetime:
+    """截断到整点，作为小时桶键（去掉时区信息，与 DATETIME 列一致）"""
+    return dt.replace(minute=0, second=0, microsecond=0, tzinfo=None)
+
+
+def update_repo_activity_hourly(cursor, rows: Iterable[EventRow], batch_size: int = 1000) -> int:
+    """
+    按 (repo_id, 小时) 聚合新事件并累加到 repo_activity_hourly
+
+    Returns:
+        写入的小时桶数量
+    """
+    buckets = defaultdict(lambda: defaultdict(int))
+    for row in rows:
+        counts = buckets[(row.repo_id, hour_bucket(row.created_at))]
+        counts['event_count'] += 1
+        column = HOURLY_TYPE_COLUMNS.get(row.event_type)
+        if column:
+            counts[column] += 1
+
+    if not buckets:
+        return 0
+
+    sql = """
+        INSERT INTO repo_activity_hourly (
+            repo_id, stats_hour, event_count,
+            star_count, fork_count, pr_count, push_count, issue_count
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            event_count = event_count + VALUES(event_count),
+            star_count = star_count + VALUES(star_count),
+            fork_count = fork_count + VALUES(fork_count),
+            pr_count = pr_count + VALUES(pr_count),
+            push_count = push_count + VALUES(push_count),
+            issue_count = issue_count + VALUES(issue_count)
+    """
+    values: List[tuple] = [
+        (repo_id, stats_hour, c['event_count'],
+         c['star_count'], c['fork_count'], c['pr_count'], c['push_count'], c['issue_count'])
+        for (repo_id, stats_hour), c in buckets.items()
+    ]
+    for i in range(0, len(values), batch_size):
+        cursor.executemany(sql, values[i:i + batch_size])
+    return len(values)
+
+
+def aggregate_actor_days(rows: Iterable[EventRow]) -> Dict[Tuple[int, object], ActorDayAggregate]:
+    """按 (actor_id, 日期) 聚合新事件"""
+    aggregates = defaultdict(ActorDayAggregate)
+    for row in rows:
+        aggregates[(row.actor_id, row.created_at_date)].add(row.event_type, row.repo_id)
+    return aggregates
+
+
+def upsert_actor_activity(cursor, aggregates: Dict[Tuple[int, object], ActorDayAggregate],
+                          batch_size: int = 1000) -> int:
+    """
+    把增量合并进 actor_activity_daily
+    
+    计数列直接在 SQL 中累加；仓库草图无法在 SQL 中合并，
+    先用 SELECT ... FOR UPDATE 读出已有草图并锁住这些行（与 --drain 并发的摄取不会互相覆盖），
+    在内存中合并后整体写回。按键排序加锁，避免并发事务死锁。
+    """
+    keys = sorted(aggregates.keys())
+    sql = f"""
+        INSERT INTO actor_activity_daily (
+            actor_id, stats_date, {', '.join(ACTOR_DAILY_COUNT_COLUMNS)}, repo_count, repo_sketch
+        ) VALUES ({', '.join(['%s'] * (len(ACTOR_DAILY_COUNT_COLUMNS) + 4))})
+        ON DUPLICATE KEY UPDATE
+            {', '.join(f'{c} = {c} + VALUES({c})' for c in ACTOR_DAILY_COUNT_COLUMNS)},
+            repo_count = VALUES(repo_count),
+            repo_sketch = VALUES(repo_sketch)
+    """
+    
+    for i in range(0, len(keys), batch_size):
+        batch = keys[i:i + batch_size]
+        actor_ids = sorted({actor_id for actor_id, _ in batch})
+        dates = sorted({stats_date for _, stats_date in batch})
+        cursor.execute(
+            f"SELECT actor_id, stats_date, repo_sketch FROM actor_activity_daily "
+            f"WHERE actor_id IN ({', '.join(['%s'] * len(actor_ids))}) "
+            f"AND stats_date IN ({', '.join(['%s'] * len(dates))}) FOR UPDATE",
+            actor_ids + dates
+        )
+        for row in cursor.fetchall():
+            if isinstance(row, dict):
+                row = (row['actor_id'], row['stats_date'], row['repo_sketch'])
+            aggregate = aggregates.get((row[0], row[1]))
+            if aggregate is not None and row[2]:
+                aggregate.repos.merge(HyperLogLog.from_bytes(row[2]))
+        
+        values = []
+        for key in batch:
+            aggregate = aggregates[key]
+            values.append(
+                key
+                + tuple(aggregate.counts[c] for c in ACTOR_DAILY_COUNT_COLUMNS)
+                + (aggregate.repos.count(), aggregate.repos.to_bytes())
+            )
+        cursor.executemany(sql, values)
+    return len(keys)
+
+
+def update_actor_activity_daily(cursor, rows: Iterable[EventRow]) -> int:
+    """按 (actor_id, 日期) 聚合新事件并合并到 actor_activity_daily，返回写入行数"""
+    return upsert_actor_activity(cursor, aggregate_actor_days(rows))
+
+
+def update_repo_actor_sketches(cursor, rows: Iterable[EventRow], batch_size: int = 1000) -> int:
+    """
+    按仓库合并关注者（WatchEvent 用户）和贡献者（全部事件用户）草图到 repo_actor_sketches
+    
+    已有草图用 SELECT ... FOR UPDATE 读出并锁住，合并后写回，并发摄取不会丢失彼此的用户；
+    按 repo_id 顺序加锁，避免死锁。
+    
+    Returns:
+        写入的仓库数
+    """
+    sketches = {}
+    for row in rows:
+        pair = sketches.get(row.repo_id)
+        if pair is None:
+            pair = sketches[row.repo_id] = (HyperLogLog(REPO_ACTOR_SKETCH_P), HyperLogLog(REPO_ACTOR_SKETCH_P))
+        if row.event_type == 'WatchEvent':
+            pair[0].add(row.actor_id)
+        pair[1].add(row.actor_id)
+    
+    sql = """
+        INSERT INTO repo_actor_sketches (
+            repo_id, watchers_est, contributors_est, watchers_hll, contributors_hll
+        ) VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            watchers_est = VALUES(watchers_est),
+            contributors_est = VALUES(contributors_est),
+            watchers_hll = VALUES(watchers_hll),
+            contributors_hll = VALUES(contributors_hll)
+    """
+    repo_ids = sorted(sketches.keys())
+    for i in range(0, len(repo_ids), batch_size):
+        batch = repo_ids[i:i + batch_size]
+        cursor.execute(
+            f"SELECT repo_id, watchers_hll, contributors_hll FROM repo_actor_sketches "
+            f"WHERE repo_id IN ({', '.join(['%s'] * len(batch))}) ORDER BY repo_id FOR UPDATE",
+            batch
+        )
+        for row in cursor.fetchall():
+            if isinstance(row, dict):
+                row = (row['repo_id'], row['watchers_hll'], row['contributors_hll'])
+            watchers, contributors = sketches[row[0]]
+            if row[1]:
+                watchers.merge(HyperLogLog.from_bytes(row[1]))
+            if row[2]:
+                contributors.merge(HyperLogLog.from_bytes(row[2]))
+        
+        values = []
+        for repo_id in batch:
+            watchers, contributors = sketches[repo_id]
+            values.append((repo_id, watchers.count(), contributors.count(),
+                           watchers.to_bytes(), contributors.to_bytes()))
+        cursor.executemany(sql, values)
+    return len(repo_ids)
+
+
+def mark_dirty_days(cursor, rows: Iterable[EventRow]) -> int:
+    """
+    记录新事件涉及的 (日期, 事件类型)，供每日统计任务只重算这些组
+    
+    每次标记递增 version，统计任务按读取时的版本删除，避免漏掉期间的新写入。
+    
+    Returns:
+        标记的组数
+    """
+    groups = sorted({(row.created_at_date, row.event_type) for row in rows})
+    if not groups:
+        return 0
+    cursor.executemany("""
+        INSERT INTO stats_dirty_days (stats_date, event_type, version, dirty_at)
+        VALUES (%s, %s, 1, NOW())
+        ON DUPLICATE KEY UPDATE
+            version = version + 1,
+            dirty_at = VALUES(dirty_at)
+    """, groups)
+    return len(groups)
+
+
+def add_overview_counts(cursor, events: int = 0, actors: int = 0, repos: int = 0, orgs: int = 0,
+                        latest_event: Optional[datetime] = None) -> bool:
+    """
+    把本次写入（或删除，传负数）的行数累加到 overview_counters 的单行计数器
+    
+    与对应的写入在同一事务内调用，计数器与表内容同时提交或回滚。
+    
+    Returns:
+        是否有更新
+    """
+    if not (events or actors or repos or orgs or latest_event):
+        return False
+    cursor.execute("""
+        INSERT INTO overview_counters (
+            id, total_events, total_actors, total_repos, total_orgs, latest_event, updated_at
+        ) VALUES (%s, %s, %s, %s, %s, %s, NOW())
+        ON DUPLICATE KEY UPDATE
+            total_events = total_events + VALUES(total_events),
+            total_actors = total_actors + VALUES(total_actors),
+            total_repos = total_repos + VALUES(total_repos),
+            total_orgs = total_orgs + VALUES(total_orgs),
+            latest_event = GREATEST(COALESCE(latest_event, VALUES(latest_event)),
+                                    COALESCE(VALUES(latest_event), latest_event)),
+            updated_at = VALUES(updated_at)
+    """, (OVERVIEW_ROW_ID, events, actors, repos, orgs, latest_event))
+    return True
+
+
+def load_trending(cursor, name: str = TRENDING_STATE_NAME):
+    """
+    读取趋势追踪器状态并加行锁（同一事务内保存），避免并发摄取互相覆盖
+    
+    Returns:
+        (追踪器, 上次刷新 hot_repos 的时间或 None)
+    """
+    cursor.execute(
+        "SELECT state, flushed_at FROM trending_state WHERE name = %s FOR UPDATE",
+        (name,)
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return DecayedSpaceSaving(TRENDING_CAPACITY, TRENDING_HALF_LIFE_HOURS), None
+    if isinstance(row, dict):
+        row = (row['state'], row['flushed_at'])
+    tracker = DecayedSpaceSaving.from_bytes(row[0], TRENDING_CAPACITY, TRENDING_HALF_LIFE_HOURS)
+    return tracker, row[1]
+
+
+def save_trending(cursor, tracker: DecayedSpaceSaving, fed: int, name: str = TRENDING_STATE_NAME):
+    """保存追踪器状态，fed 为本次计入的事件数"""
+    cursor.execute("""
+        INSERT INTO trending_state (name, state, tracked, events_fed)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            state = VALUES(state),
+            tracked = VALUES(tracked),
+            events_fed = events_fed + VALUES(events_fed)
+    """, (name, tracker.to_bytes(), len(tracker), fed))
+
+
+def refresh_hot_repos(cursor, candidate_ids: Optional[List[int]] = None,
+                      limit: int = HOT_REPOS_LIMIT) -> int:
+    """
+    重建 hot_repos 榜单（分数 = 总星标 + 7天星标×2 + 7天Fork×1.5，7天数据取自小时汇总表）
+    
+    候选集 = 历史星标前 limit ∪ candidate_ids；candidate_ids 为 None 时使用近7天
+    全部有活动的仓库（精确结果，定时任务使用）。其余仓库得分只等于 total_stars，不可能进入榜单。
+    
+    Returns:
+        写入的仓库数
+    """
+    params: List = [limit]
+    if candidate_ids is None:
+        active_sql = """
+            SELECT DISTINCT repo_id FROM repo_activity_hourly
+            WHERE stats_hour >= DATE_SUB(NOW(), INTERVAL 7 DAY)
+        """
+        window_filter = ""
+    else:
+        candidate_ids = list(candidate_ids) or [0]
+        marks = ', '.join(['%s'] * len(candidate_ids))
+        active_sql = f"SELECT repo_id FROM repos WHERE repo_id IN ({marks})"
+        window_filter = f"AND repo_id IN ({marks})"
+        params.extend(candidate_ids)
+        params.extend(candidate_ids)
+    params.append(limit)
+    
+    cursor.execute("DELETE FROM hot_repos")
+    cursor.execute(f"""
+        INSERT INTO hot_repos (
+            repo_id, repo_name, score, 
+            stars_7d, forks_7d, prs_7d, 
+            rank_position, updated_at
+        )
+        SELECT 
+            r.repo_id,
+            r.name as repo_name,
+            COALESCE(r.total_stars, 0) + 
+                COALESCE(w.stars_7d, 0) * 2 +
+                COALESCE(w.forks_7d, 0) * 1.5 as score,
+            COALESCE(w.stars_7d, 0) as stars_7d,
+            COALESCE(w.forks_7d, 0) as forks_7d,
+            COALESCE(w.prs_7d, 0) as prs_7d,
+            ROW_NUMBER() OVER (ORDER BY 
+                COALESCE(r.total_stars, 0) + 
+                COALESCE(w.stars_7d, 0) * 2 +
+                COALESCE(w.forks_7d, 0) * 1.5
+                DESC
+            ) as rank_position,
+            NOW() as updated_at
+        FROM (
+            SELECT repo_id FROM (
+                SELECT repo_id FROM repos ORDER BY total_stars DESC LIMIT %s
+            ) top_total
+            UNION
+            {active_sql}
+        ) c
+        INNER JOIN repos r ON r.repo_id = c.repo_id
+        LEFT JOIN (
+            SELECT 
+                repo_id,
+                SUM(star_count) as stars_7d,
+                SUM(fork_count) as forks_7d,
+                SUM(pr_count) as prs_7d
+            FROM repo_activity_hourly
+            WHERE stats_hour >= DATE_SUB(NOW(), INTERVAL 7 DAY)
+            {window_filter}
+            GROUP BY repo_id
+        ) w ON w.repo_id = c.repo_id
+        HAVING score > 0
+        ORDER BY score DESC
+        LIMIT %s
+    """, params)
+    return cursor.rowcount
+
+
+def flush_trending(cursor, tracker: DecayedSpaceSaving, flushed_at: Optional[datetime],
+                   force: bool = False, name: str = TRENDING_STATE_NAME) -> Optional[int]:
+    """
+    距上次刷新超过 TRENDING_FLUSH_MINUTES 时，用追踪器的候选仓库重建 hot_repos
+    
+    Returns:
+        写入的仓库数；未到刷新时间时返回 None
+    """
+    if not force and flushed_at is not None:
+        if (datetime.now() - flushed_at).total_seconds() < TRENDING_FLUSH_MINUTES * 60:
+            return None
+    candidate_ids = [repo_id for repo_id, _, _ in tracker.top(TRENDING_CANDIDATES)]
+    count = refresh_hot_repos(cursor, candidate_ids)
+    cursor.execute(
+        "UPDATE trending_state SET flushed_at = NOW() WHERE name = %s",
+        (name,)
+    )
+    return count
@@ -0,0 +1,156 @@
+"""
+摄取预写 spool
+下载并精简后的一小时事件先写入本地 spool 文件，再由写库阶段重放；数据库不可用时文件留在
+SPOOL_DIR 中，由 `streaming_ingest.py --drain` 按数据库能承受的速度重放，下载不再受数据库可用性影响。
+
+文件格式（每个小时一个文件 YYYY-MM-DD-HH.spool）：
+    MAGIC | 帧 | 帧 | ...
+    帧 = 长度(4字节) + CRC32(4字节) + zlib 压缩的 JSON
+第一帧为元数据 {"hour": ..., "events": ...}，其余每帧为一批事件。文件先写入 .tmp 并 fsync，
+再原子重命名，重放成功后删除；重放是幂等的（已写入的事件在写库前被剔除）。
+"""
+
+import os
+import json
+import zlib
+import fcntl
+import struct
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SPOOL_DIR = os.getenv('SPOOL_DIR', 'spool')
+
+MAGIC = b'GHSPOOL1'
+FRAME_HEADER = struct.Struct('>II')
+
+# 每帧的事件数
+FRAME_EVENTS = 5000
+
+# 各类型载荷中摄取用到的字段，其余字段不写入 spool
+PAYLOAD_FIELDS = {
+    'PushEvent': ('push_id', 'size', 'distinct_size', 'head', 'ref'),
+    'ForkEvent': ('forkee',),
+    'CreateEvent': ('ref', 'ref_type', 'description'),
+}
+ENTITY_FIELDS = {
+    'actor': ('id', 'login', 'display_login', 'gravatar_id', 'url', 'avatar_url'),
+    'repo': ('id', 'name', 'url'),
+    'org': ('id', 'login', 'gravatar_id', 'url', 'avatar_url'),
+}
+
+
+def compact_event(event: dict) -> dict:
+    """只保留摄取用到的字段（原始载荷通常占事件体积的大部分）"""
+    compact = {key: event.get(key) for key in ('id', 'type', 'public', 'created_at')}
+    for name, fields in ENTITY_FIELDS.items():
+        entity = event.get(name)
+        if entity:
+            compact[name] = {field: entity[field] for field in fields if field in entity}
+    payload = event.get('payload') or {}
+    fields = PAYLOAD_FIELDS.get(event.get('type'))
+    if fields:
+        compact['payload'] = {field: payload[field] for field in fields if field in payload}
+        forkee = compact['payload'].get('forkee')
+        if forkee:
+            compact['payload']['forkee'] = {'id': forkee.get('id'), 'full_name': forkee.get('full_name')}
+    return compact
+
+
+def hour_path(hour_start: datetime, spool_dir: str = SPOOL_DIR) -> str:
+    return os.path.join(spool_dir, f"{hour_start:%Y-%m-%d-%H}.spool")
+
+
+def _frame(obj) -> bytes:
+    data = zlib.compress(json.dumps(obj, separators=(',', ':')).encode('utf-8'), 6)
+    return FRAME_HEADER.pack(len(data), zlib.crc32(data)) + data
+
+
+def write_hour(hour_start: datetime, events: Iterable[dict], spool_dir: str = SPOOL_DIR) -> str:
+    """把一小时的（精简后）事件写入 spool 文件，返回文件路径"""
+    os.makedirs(spool_dir, exist_ok=True)
+    path = hour_path(hour_start, spool_dir)
+    events = list(events)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(_frame({'hour': hour_start.isoformat(), 'events': len(events)}))
+        for offset in range(0, len(events), FRAME_EVENTS):
+            f.write(_frame(events[offset:offset + FRAME_EVENTS]))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return path
+
+
+def _frames(f) -> Iterator:
+    while True:
+        header = f.read(FRAME_HEADER.size)
+        if not header:
+            return
+        if len(header) < FRAME_HEADER.size:
+            raise ValueError("帧头不完整")
+        length, crc = FRAME_HEADER.unpack(header)
+        data = f.read(length)
+        if len(data) < length or zlib.crc32(data) != crc:
+            raise ValueError("帧数据损坏（长度或 CRC32 不符）")
+        yield json.loads(zlib.decompress(data).decode('utf-8'))
+
+
+def read_hour(path: str) -> Tuple[datetime, List[dict]]:
+    """读取 spool 文件，校验失败时抛出 ValueError"""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"不是 spool 文件: {path}")
+        frames = _frames(f)
+        meta = next(frames, None)
+        if not meta:
+            raise ValueError(f"缺少元数据帧: {path}")
+        events = []
+        for batch in frames:
+            events.extend(batch)
+    if len(events) != meta['events']:
+        raise ValueError(f"事件数不符: 元数据 {meta['events']}，实际 {len(events)}")
+    return datetime.fromisoformat(meta['hour']), events
+
+
+def pending(spool_dir: str = SPOOL_DIR) -> List[str]:
+    """待重放的 spool 文件，按小时升序"""
+    if not os.path.isdir(spool_dir):
+        return []
+    return sorted(os.path.join(spool_dir, name) for name in os.listdir(spool_dir) if name.endswith('.spool'))
+
+
+def quarantine(path: str) -> str:
+    """损坏的文件改名为 .bad，不再重放"""
+    bad_path = path + '.bad'
+    os.replace(path, bad_path)
+    return bad_path
+
+
+@contextmanager
+def locked(path: str) -> Iterator[Optional[int]]:
+    """
+    对 spool 文件加非阻塞排他锁，防止摄取进程和 drain 进程同时重放同一小时
+
+    拿不到锁（或文件已被重放删除）时返回 None。
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        yield None
+        return
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield None
+            return
+        # 加锁前文件可能已被另一进程重放并删除
+        yield fd if os.path.exists(path) else None
+    finally:
+        os.close(fd)
+
@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+统计任务 SQL 性能剖析
+把 ProfiledCursor 设为连接的 cursorclass 后，统计脚本执行的每条语句都会记录：
+    墙钟耗时、影响行数、Handler_read_* 增量（会话状态）、Rows_examined（performance_schema）
+语句首次出现或明显变慢时额外抓取 EXPLAIN FORMAT=JSON，便于发现执行计划退化
+（例如 idx_repo_type 被删除后变成全表扫描）。
+
+每次运行的结果写入 stats_job_runs 表和 JSON 报告文件，可用命令行对比两次运行：
+    python stats_profiler.py list
+    python stats_profiler.py diff <run_id_a|report_a.json> <run_id_b|report_b.json>
+
+说明：
+- Handler 增量已扣除探测语句自身的开销（每个连接首次使用时校准）
+- Rows_examined 需要 performance_schema.events_statements_history 的查询权限，无权限时记为空
+- 显式使用 SSCursor 的流式读取不经过本模块
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import functools
+from datetime import datetime
+from typing import Dict, Optional
+
+import pymysql
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+# 平均耗时超过基线的倍数且绝对增加超过该毫秒数时视为变慢
+REGRESSION_RATIO = 1.5
+REGRESSION_MIN_MS = 200
+REGRESSION_MIN_EXAMINED = 10000
+
+# 入库的语句文本最大长度
+STMT_TEXT_LIMIT = 4000
+
+# 作业总耗时在 stats_job_runs 中使用的语句摘要
+JOB_TOTAL_DIGEST = '-'
+
+_EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE', 'WITH')
+
+
+def statement_digest(query: str) -> str:
+    """语句模板（未代入参数）的摘要，忽略空白差异"""
+    normalized = ' '.join(query.split())
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16]
+
+
+def _explainable(query: str) -> bool:
+    head = query.lstrip().split(None, 1)[0].upper() if query.strip() else ''
+    if head in _EXPLAINABLE:
+        return True
+    # INSERT ... SELECT / REPLACE ... SELECT
+    return head in ('INSERT', 'REPLACE') and 'SELECT' in query.upper()
+
+
+def plan_keys(explain) -> list:
+    """从 EXPLAIN FORMAT=JSON 中提取每张表使用的索引，形如 'events:idx_repo_type' 或 'events:ALL'"""
+    if isinstance(explain, str):
+        explain = json.loads(explain)
+    keys = set()
+
+    def walk(node):
+        if isinstance(node, dict):
+            if 'table_name' in node and 'access_type' in node:
+                keys.add(f"{node['table_name']}:{node.get('key') or node['access_type']}")
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(explain)
+    return sorted(keys)
+
+
+class StatementStats:
+    """一次运行中同一 (作业, 语句) 的累计指标"""
+
+    __slots__ = ('job', 'digest', 'text', 'calls', 'wall_ms', 'rows_affected',
+                 'rows_examined', 'handler_reads', 'explain', 'regression')
+
+    def __init__(self, job: str, digest: str, text: str):
+        self.job = job
+        self.digest = digest
+        self.text = text
+        self.calls = 0
+        self.wall_ms = 0.0
+        self.rows_affected = 0
+        self.rows_examined: Optional[int] = None
+        self.handler_reads: Dict[str, int] = {}
+        self.explain = None
+        self.regression = False
+
+    def to_dict(self) -> dict:
+        return {
+            'job': self.job,
+            'digest': self.digest,
+            'text': self.text,
+            'calls': self.calls,
+            'wall_ms': round(self.wall_ms, 2),
+            'rows_affected': self.rows_affected,
+            'rows_examined': self.rows_examined,
+            'handler_reads': self.handler_reads,
+            'plan_keys': plan_keys(self.explain) if self.explain else None,
+            'explain': self.explain,
+            'regression': self.regression
+        }
+
+
+class StatsProfiler:
+    """收集一次统计运行中所有语句的指标（模块级单例 profiler）"""
+
+    def __init__(self):
+        self.active = False
+        self.run_id: Optional[str] = None
+        self.started_at: Optional[datetime] = None
+        self.statements: Dict[tuple, StatementStats] = {}
+        self.job_totals: Dict[str, float] = {}
+        self.baseline: Dict[tuple, tuple] = {}
+        self.ps_available = True
+        self._jobs = []
+
+    @property
+    def current_job(self) -> str:
+        return self._jobs[-1] if self._jobs else 'main'
+
+    def job(self, func):
+        """装饰器：把函数内执行的语句归到以函数名命名的作业下，并记录作业总耗时"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            self._jobs.append(func.__name__)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._jobs.pop()
+                elapsed = (time.perf_counter() - start) * 1000
+                self.job_totals[func.__name__] = self.job_totals.get(func.__name__, 0.0) + elapsed
+        return wrapper
+
+    # ---------- 运行生命周期 ----------
+
+    def start_run(self, conn):
+        """开始一次运行，并从 stats_job_runs 读取每条语句最近一次的平均耗时作为基线"""
+        self.run_id = datetime.now().strftime('%Y%m%d-%H%M%S') + f'-{os.getpid()}'
+        self.started_at = datetime.now()
+        self.statements = {}
+        self.job_totals = {}
+        self.baseline = {}
+        cursor = conn.cursor(pymysql.cursors.Cursor)
+        try:
+            cursor.execute("""
+                SELECT r.job_name, r.stmt_digest, r.wall_ms / GREATEST(r.calls, 1),
+                       r.rows_examined / GREATEST(r.calls, 1)
+                FROM stats_job_runs r
+                INNER JOIN (
+                    SELECT job_name, stmt_digest, MAX(run_id) as run_id
+                    FROM stats_job_runs
+                    GROUP BY job_name, stmt_digest
+                ) latest USING (job_name, stmt_digest, run_id)
+            """)
+            for job, digest, avg_ms, avg_examined in cursor.fetchall():
+                self.baseline[(job, digest)] = (float(avg_ms), avg_examined)
+        except Exception as e:
+            logger.warning(f"⚠ 读取性能基线失败（首次运行或缺少 stats_job_runs 表）: {e}")
+        finally:
+            cursor.close()
+        self.active = True
+        logger.info(f"📐 SQL 剖析已开启，运行ID: {self.run_id}（基线语句 {len(self.baseline)} 条）")
+
+    def finish_run(self, conn, report_dir: Optional[str] = None) -> Optional[str]:
+        """结束运行：写入 stats_job_runs 和 JSON 报告，返回报告路径"""
+        if not self.active:
+            return None
+        self.active = False
+        finished_at = datetime.now()
+
+        rows = [
+            (self.run_id, s.job, s.digest, s.text[:STMT_TEXT_LIMIT], s.calls, round(s.wall_ms, 2),
+             s.rows_affected, s.rows_examined, json.dumps(s.handler_reads),
+             json.dumps(s.explain) if s.explain else None, 1 if s.regression else 0)
+            for s in self.statements.values()
+        ]
+        rows.extend(
+            (self.run_id, job, JOB_TOTAL_DIGEST, '(作业总耗时)', 1, round(ms, 2), 0, None, '{}', None, 0)
+            for job, ms in self.job_totals.items()
+        )
+        cursor = conn.cursor(pymysql.cursors.Cursor)
+        try:
+            cursor.executemany("""
+                INSERT INTO stats_job_runs (
+                    run_id, job_name, stmt_digest, stmt_text, calls, wall_ms,
+                    rows_affected, rows_examined, handler_reads, explain_json, regression
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, rows)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.warning(f"⚠ 写入 stats_job_runs 失败: {e}")
+        finally:
+            cursor.close()
+
+        report = {
+            'run_id': self.run_id,
+            'started_at': self.started_at.isoformat(),
+            'finished_at': finished_at.isoformat(),
+            'jobs': {job: round(ms, 2) for job, ms in self.job_totals.items()},
+            'statements': sorted((s.to_dict() for s in self.statements.values()),
+                                 key=lambda s: s['wall_ms'], reverse=True)
+        }
+        report_dir = report_dir or os.getenv('STATS_REPORT_DIR', 'stats_reports')
+        os.makedirs(report_dir, exist_ok=True)
+        path = os.path.join(report_dir, f'stats_run_{self.run_id}.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+
+        logger.info("\n📐 最耗时的语句:")
+        for s in report['statements'][:5]:
+            logger.info(f"  {s['wall_ms']:>10.1f}ms ×{s['calls']:<5} 扫描:{s['rows_examined']} "
+                        f"[{s['job']}] {' '.join(s['text'].split())[:80]}")
+        for s in report['statements']:
+            if s['regression']:
+                logger.warning(f"  ⚠ 变慢: [{s['job']}] {s['digest']} 执行计划: {s['plan_keys']}")
+        logger.info(f"📄 剖析报告: {path}")
+        return path
+
+    # ---------- 单条语句测量 ----------
+
+    def _handler_status(self, probe) -> Dict[str, int]:
+        probe.execute("SHOW SESSION STATUS LIKE 'Handler_read%'")
+        return {name: int(value) for name, value in probe.fetchall()}
+
+    def _ps_marker(self, probe) -> Optional[int]:
+        if not self.ps_available:
+            return None
+        try:
+            probe.execute("""
+                SELECT COALESCE(MAX(EVENT_ID), 0) FROM performance_schema.events_statements_history
+                WHERE THREAD_ID = PS_CURRENT_THREAD_ID()
+            """)
+            return probe.fetchone()[0]
+        except Exception as e:
+            self.ps_available = False
+            logger.warning(f"⚠ 无法读取 performance_schema，Rows_examined 将不记录: {e}")
+            return None
+
+    def _rows_examined(self, probe, marker: Optional[int]) -> Optional[int]:
+        if marker is None:
+            return None
+        probe.execute("""
+            SELECT COALESCE(SUM(ROWS_EXAMINED), 0) FROM performance_schema.events_statements_history
+            WHERE THREAD_ID = PS_CURRENT_THREAD_ID() AND EVENT_ID > %s
+                AND SQL_TEXT NOT LIKE '%%performance_schema.events_statements_history%%'
+        """, (marker,))
+        return int(probe.fetchone()[0])
+
+    def _probe(self, cursor, run):
+        """执行 run() 并返回 (结果, 耗时ms, Handler增量, Rows_examined)"""
+        probe = cursor.connection.cursor(pymysql.cursors.Cursor)
+        try:
+            before = self._handler_status(probe)
+            marker = self._ps_marker(probe)
+            start = time.perf_counter()
+            result = run()
+            wall_ms = (time.perf_counter() - start) * 1000
+            examined = self._rows_examined(probe, marker)
+            after = self._handler_status(probe)
+        finally:
+            probe.close()
+        deltas = {name: after.get(name, 0) - value for name, value in before.items()}
+        return result, wall_ms, deltas, examined
+
+    def _overhead(self, cursor) -> Dict[str, int]:
+        """探测语句自身造成的 Handler 增量（每个连接校准一次）"""
+        conn = cursor.connection
+        overhead = getattr(conn, '_profiler_overhead', None)
+        if overhead is None:
+            noop = conn.cursor(pymysql.cursors.Cursor)
+            try:
+                _, _, overhead, _ = self._probe(noop, lambda: noop.execute("SELECT 1"))
+            finally:
+                noop.close()
+            conn._profiler_overhead = overhead
+        return overhead
+
+    def measure(self, cursor, query: str, sample_args, run):
+        """测量一次 execute/executemany，累计到当前作业下"""
+        overhead = self._overhead(cursor)
+        result, wall_ms, deltas, examined = self._probe(cursor, run)
+
+        key = (self.current_job, statement_digest(query))
+        stats = self.statements.get(key)
+        first_call = stats is None
+        if first_call:
+            stats = self.statements[key] = StatementStats(key[0], key[1], query.strip())
+        stats.calls += 1
+        stats.wall_ms += wall_ms
+        stats.rows_affected += max(cursor.rowcount, 0)
+        if examined is not None:
+            stats.rows_examined = (stats.rows_examined or 0) + examined
+        for name, delta in deltas.items():
+            stats.handler_reads[name] = stats.handler_reads.get(name, 0) + max(delta - overhead.get(name, 0), 0)
+
+        if stats.explain is None and _explainable(query):
+            baseline = self.baseline.get(key)
+            slower = baseline is not None and (
+                (wall_ms > baseline[0] * REGRESSION_RATIO and wall_ms - baseline[0] > REGRESSION_MIN_MS)
+                or (examined is not None and baseline[1] is not None
+                    and examined > float(baseline[1]) * REGRESSION_RATIO
+                    and examined - float(baseline[1]) > REGRESSION_MIN_EXAMINED)
+            )
+            if slower:
+                stats.regression = True
+            if (first_call and baseline is None) or slower:
+                stats.explain = self._explain(cursor, query, sample_args)
+        return result
+
+    def _explain(self, cursor, query: str, args):
+        probe = cursor.connection.cursor(pymysql.cursors.Cursor)
+        try:
+            probe.execute("EXPLAIN FORMAT=JSON " + cursor.mogrify(query, args))
+            return json.loads(probe.fetchone()[0])
+        except Exception as e:
+            logger.debug(f"EXPLAIN 失败: {e}")
+            return None
+        finally:
+            probe.close()
+
+
+profiler = StatsProfiler()
+
+
+class ProfiledCursor(pymysql.cursors.Cursor):
+    """剖析开启时测量每条语句的普通游标（作为连接的 cursorclass 使用）"""
+
+    _measuring = False
+
+    def execute(self, query, args=None):
+        if not profiler.active or self._measuring:
+            return super().execute(query, args)
+        self._measuring = True
+        try:
+            return profiler.measure(self, query, args, lambda: super(ProfiledCursor, self).execute(query, args))
+        finally:
+            self._measuring = False
+
+    def executemany(self, query, args):
+        if not profiler.active or self._measuring or not args:
+            return super().executemany(query, args)
+        self._measuring = True
+        try:
+            return profiler.measure(self, query, args[0],
+                                    lambda: super(ProfiledCursor, self).executemany(query, args))
+        finally:
+            self._measuring = False
+
+
+# ---------- 命令行：列出 / 对比运行 ----------
+
+def _get_connection():
+    load_dotenv()
+    return pymysql.connect(
+        host=os.getenv('DB_HOST'),
+        port=int(os.getenv('DB_PORT', 3306)),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        database=os.getenv('DB_NAME'),
+        charset='utf8mb4'
+    )
+
+
+def load_run(source: str, conn=None) -> Dict[tuple, dict]:
+    """
+    读取一次运行的语句指标，source 为 JSON 报告路径或 run_id
+
+    从数据库读取时，本次未抓取 EXPLAIN 的语句使用该运行之前最近一次的执行计划。
+    """
+    if source.endswith('.json'):
+        with open(source, encoding='utf-8') as f:
+            report = json.load(f)
+        runs = {(s['job'], s['digest']): s for s in report['statements']}
+        for job, ms in report.get('jobs', {}).items():
+            runs[(job, JOB_TOTAL_DIGEST)] = {'job': job, 'digest': JOB_TOTAL_DIGEST, 'text': '(作业总耗时)',
+                                             'calls': 1, 'wall_ms': ms, 'rows_examined': None,
+                                             'handler_reads': {}, 'plan_keys': None}
+        return runs
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT job_name, stmt_digest, stmt_text, calls, wall_ms, rows_examined, handler_reads,
+                (SELECT p.explain_json FROM stats_job_runs p
+                 WHERE p.job_name = r.job_name AND p.stmt_digest = r.stmt_digest
+                    AND p.run_id <= r.run_id AND p.explain_json IS NOT NULL
+                 ORDER BY p.run_id DESC LIMIT 1) as explain_json
+            FROM stats_job_runs r
+            WHERE run_id = %s
+        """, (source,))
+        runs = {}
+        for job, digest, text, calls, wall_ms, examined, handler_reads, explain in cursor.fetchall():
+            runs[(job, digest)] = {
+                'job': job, 'digest': digest, 'text': text, 'calls': calls,
+                'wall_ms': float(wall_ms), 'rows_examined': examined,
+                'handler_reads': json.loads(handler_reads) if handler_reads else {},
+                'plan_keys': plan_keys(explain) if explain else None
+            }
+        if not runs:
+            raise ValueError(f"未找到运行: {source}")
+        return runs
+    finally:
+        cursor.close()
+
+
+def _fmt(value, digits=1) -> str:
+    if value is None:
+        return '-'
+    return f"{value:,.{digits}f}" if isinstance(value, float) else f"{value:,}"
+
+
+def diff_runs(a: Dict[tuple, dict], b: Dict[tuple, dict]):
+    """逐条对比两次运行（按每次调用的平均值），打印耗时、扫描行数和执行计划的变化"""
+    print(f"  {'作业':<26} {'摘要':<16} {'耗时A(ms)':>11} {'耗时B(ms)':>11} {'倍数':>6} "
+          f"{'扫描A':>12} {'扫描B':>12}  语句")
+    for key in sorted(set(a) | set(b)):
+        sa, sb = a.get(key), b.get(key)
+        wall_a = sa['wall_ms'] / max(sa['calls'], 1) if sa else None
+        wall_b = sb['wall_ms'] / max(sb['calls'], 1) if sb else None
+        ratio = wall_b / wall_a if wall_a and wall_b else None
+        text = ' '.join(((sb or sa)['text'] or '').split())[:60]
+        flag = '⚠ ' if ratio and ratio >= REGRESSION_RATIO else '  '
+        print(f"{flag}{key[0]:<26} {key[1]:<16} {_fmt(wall_a):>11} {_fmt(wall_b):>11} "
+              f"{_fmt(ratio, 2):>6} {_fmt(sa['rows_examined'] if sa else None):>12} "
+              f"{_fmt(sb['rows_examined'] if sb else None):>12}  {text}")
+
+        keys_a = sa.get('plan_keys') if sa else None
+        keys_b = sb.get('plan_keys') if sb else None
+        if keys_a is not None and keys_b is not None and keys_a != keys_b:
+            print(f"    执行计划变化: -{sorted(set(keys_a) - set(keys_b))} +{sorted(set(keys_b) - set(keys_a))}")
+
+        if sa and sb:
+            for name in sorted(set(sa['handler_reads']) | set(sb['handler_reads'])):
+                ha, hb = sa['handler_reads'].get(name, 0), sb['handler_reads'].get(name, 0)
+                if hb > max(ha, 1) * REGRESSION_RATIO and hb - ha > REGRESSION_MIN_EXAMINED:
+                    print(f"    {name}: {ha:,} -> {hb:,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='统计任务 SQL 剖析结果查看与对比')
+    sub = parser.add_subparsers(dest='command', required=True)
+    list_parser = sub.add_parser('list', help='列出最近的运行')
+    list_parser.add_argument('--limit', type=int, default=20)
+    diff_parser = sub.add_parser('diff', help='对比两次运行')
+    diff_parser.add_argument('run_a', help='run_id 或 JSON 报告路径')
+    diff_parser.add_argument('run_b', help='run_id 或 JSON 报告路径')
+    args = parser.parse_args()
+
+    conn = None
+    try:
+        if args.command == 'list':
+            conn = _get_connection()
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT run_id, MIN(created_at), COUNT(*),
+                    SUM(CASE WHEN stmt_digest = %s THEN wall_ms ELSE 0 END), SUM(regression)
+                FROM stats_job_runs
+                GROUP BY run_id
+                ORDER BY run_id DESC
+                LIMIT %s
+            """, (JOB_TOTAL_DIGEST, args.limit))
+            for run_id, created_at, rows, total_ms, regressions in cursor.fetchall():
+                print(f"{run_id}  {created_at}  语句:{rows:<5} 作业总耗时:{float(total_ms or 0) / 1000:>8.1f}s  变慢:{regressions}")
+        else:
+            if not (args.run_a.endswith('.json') and args.run_b.endswith('.json')):
+                conn = _get_connection()
+            diff_runs(load_run(args.run_a, conn), load_run(args.run_b, conn))
+    finally:
+        if conn:
+            conn.close()
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ {e}")
+        sys.exit(1)
@@ -5,17 +5,28 @@ ingest_user: 插入数据
 """
 
 import os
+import time
 import gzip
 import json
 import logging
 from datetime import datetime
-from typing import Dict, Any, List, Set
+from typing import Dict, Any, List
 from io import BytesIO
 from dotenv import load_dotenv
 import pymysql
 from pymysql import cursors
 import requests
 import argparse
+from rollups import (
+    EventRow, EVENT_INSERT_COLUMNS, update_repo_activity_hourly, update_actor_activity_daily, update_repo_actor_sketches,
+    mark_dirty_days, load_trending, save_trending, flush_trending, add_overview_counts
+)
+from topk import feed_trending
+from event_types import event_types
+from hour_digests import digest_events, save_archive_digest
+from spool import compact_event, write_hour, read_hour, pending, quarantine, locked
+from data_versions import bump_version, EVENTS
+from entities import ACTORS, REPOS, ORGS, load_hashes, collect_changes, upsert_entities
 
 logging.basicConfig(
     level=logging.INFO,
@@ -61,14 +72,16 @@ class DualConnectionIngestor:
         }
         self._validate_config()
         
-        self.existing_actors: Set[int] = set()
-        self.existing_repos: Set[int] = set()
-        self.existing_orgs: Set[int] = set()
+        # id -> 可变属性哈希（entities.attr_hash），只写入新增或变更的实体
+        self.existing_actors: Dict[int, int] = {}
+        self.existing_repos: Dict[int, int] = {}
+        self.existing_orgs: Dict[int, int] = {}
         
         self.stats = {
             'events_inserted': 0,
             'actors_inserted': 0,
             'repos_inserted': 0,
+            'entities_updated': 0,
             'skipped': 0
         }
     
@@ -181,14 +194,14 @@ class DualConnectionIngestor:
                     WHERE repo_id = NEW.repo_id;
                     
                     -- 处理Star事件
-                    IF NEW.event_type = 'WatchEvent' THEN
+                    IF NEW.type_code = 4 /* WatchEvent */ THEN
                         UPDATE repos 
                         SET total_stars = total_stars + 1 
                         WHERE repo_id = NEW.repo_id;
                     END IF;
                     
                     -- 处理Fork事件
-                    IF NEW.event_type = 'ForkEvent' THEN
+                    IF NEW.type_code = 5 /* ForkEvent */ THEN
                         UPDATE repos 
                         SET total_forks = total_forks + 1 
                         WHERE repo_id = NEW.repo_id;
@@ -206,8 +219,8 @@ class DualConnectionIngestor:
                     
                     -- 确定关联类型
                     SET v_relation_type = CASE 
-                        WHEN NEW.event_type = 'WatchEvent' THEN 'star'
-                        WHEN NEW.event_type = 'ForkEvent' THEN 'fork'
+                        WHEN NEW.type_code = 4 /* WatchEvent */ THEN 'star'
+                        WHEN NEW.type_code = 5 /* ForkEvent */ THEN 'fork'
                         ELSE 'contributor'
                     END;
                     
@@ -258,30 +271,133 @@ class DualConnectionIngestor:
 
     
     def load_existing_ids(self, conn):
-        """预加载已存在的ID"""
+        """预加载已存在的ID及其属性哈希"""
         cursor = conn.cursor()
         logger.info("正在加载已存在的ID...")
         
-        cursor.execute("SELECT actor_id FROM actors")
-        self.existing_actors = {row['actor_id'] for row in cursor.fetchall()}
-        
-        cursor.execute("SELECT repo_id FROM repos")
-        self.existing_repos = {row['repo_id'] for row in cursor.fetchall()}
-        
-        cursor.execute("SELECT org_id FROM organizations")
-        self.existing_orgs = {row['org_id'] for row in cursor.fetchall()}
+        self.existing_actors = load_hashes(cursor, ACTORS)
+        self.existing_repos = load_hashes(cursor, REPOS)
+        self.existing_orgs = load_hashes(cursor, ORGS)
         
         logger.info(f"  已有: {len(self.existing_actors)}用户, {len(self.existing_repos)}仓库, {len(self.existing_orgs)}组织")
         cursor.close()
     
-    def stream_download_and_process(self, year: int, month: int, day: int, hour: int):
-        """流式下载并处理"""
+    def download_hour(self, year: int, month: int, day: int, hour: int) -> List[Dict]:
+        """下载并解析一个小时的 GH Archive 文件"""
         url = self.GH_ARCHIVE_URL.format(year=year, month=month, day=day, hour=hour)
-        target_date = f"{year}-{month:02d}-{day:02d}"
-        logger.info(f"开始处理: {target_date} {hour:02d}:00")
+        logger.info("正在下载...")
+        response = requests.get(url, stream=True, timeout=300)
+        response.raise_for_status()
+        
+        events = []
+        logger.info("正在解压...")
+        with gzip.GzipFile(fileobj=BytesIO(response.content)) as gz_file:
+            for line in gz_file:
+                try:
+                    event = json.loads(line.decode('utf-8'))
+                    events.append(event)
+                except:
+                    pass
+        
+        logger.info(f"✓ 下载完成，共 {len(events)} 条事件")
+        return events
+    
+    def _save_digest(self, conn, hour_start: datetime, events: List[Dict]):
+        """记录该小时文件的摘要，供 reconcile.py 核对（只记录文件所属小时，失败不影响摄取）"""
+        cursor = conn.cursor()
+        try:
+            digest = digest_events(events).get(hour_start)
+            if digest:
+                save_archive_digest(cursor, hour_start, digest)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.warning(f"  ⚠ 记录小时摘要失败: {e}")
+        finally:
+            cursor.close()
+    
+    def spool_hour(self, year: int, month: int, day: int, hour: int) -> str:
+        """下载一个小时并把精简后的事件写入 spool 文件（不需要数据库）"""
+        events = self.download_hour(year, month, day, hour)
+        path = write_hour(datetime(year, month, day, hour), (compact_event(event) for event in events))
+        logger.info(f"✓ 已写入 spool: {path}（{os.path.getsize(path) / 1024 / 1024:.1f} MB）")
+        return path
+    
+    def replay_spool(self, path: str) -> bool:
+        """
+        把一个 spool 文件写入数据库，成功后删除文件
+        
+        Returns:
+            是否重放了该文件（文件被其他进程锁定或已损坏时返回 False）
+        """
+        with locked(path) as fd:
+            if fd is None:
+                logger.info(f"跳过 {path}（正在被其他进程重放或已完成）")
+                return False
+            try:
+                hour_start, events = read_hour(path)
+            except ValueError as e:
+                logger.error(f"✗ spool 文件损坏，已隔离为 {quarantine(path)}: {e}")
+                return False
+            self.stats = {k: 0 for k in self.stats}
+            self.process_hour(hour_start, events)
+            os.remove(path)
+            return True
+    
+    def drain(self, follow: bool = False, interval: int = 60, max_backoff: int = 900) -> int:
+        """
+        按小时顺序重放 spool 中积压的文件
+        
+        写库失败时按指数退避重试；不跟随（follow=False）时遇到失败即停止，积压文件保留。
+        被其他进程锁定的文件本轮跳过：不跟随时处理完其余文件即返回，跟随时等待 interval 秒后再检查。
+        
+        Returns:
+            重放的文件数
+        """
+        replayed = 0
+        backoff = interval
+        skipped = set()  # 本轮被其他进程锁定或已隔离的文件
+        while True:
+            files = [path for path in pending() if path not in skipped]
+            if not files:
+                if not follow:
+                    break
+                # 剩下的文件都被其他进程占用（或没有积压）：等待后重新检查全部文件
+                skipped.clear()
+                time.sleep(interval)
+                continue
+            logger.info(f"spool 积压 {len(files)} 个文件")
+            for path in files:
+                try:
+                    if self.replay_spool(path):
+                        replayed += 1
+                    else:
+                        skipped.add(path)
+                    backoff = interval
+                except Exception as e:
+                    if not follow:
+                        logger.error(f"✗ 重放 {path} 失败，停止: {e}")
+                        return replayed
+                    logger.error(f"✗ 重放 {path} 失败，{backoff} 秒后重试: {e}")
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, max_backoff)
+                    break
+        return replayed
+    
+    def stream_download_and_process(self, year: int, month: int, day: int, hour: int):
+        """下载写入 spool 后立即重放；写库失败时数据保留在 spool 中等待 --drain"""
+        path = self.spool_hour(year, month, day, hour)
+        try:
+            self.replay_spool(path)
+        except Exception:
+            logger.error(f"✗ 写库失败，数据已保留在 {path}，可用 --drain 重放")
+            raise
+    
+    def process_hour(self, hour_start: datetime, events: List[Dict]):
+        """把一个小时的事件写入数据库"""
+        logger.info(f"开始处理: {hour_start:%Y-%m-%d %H}:00")
         
         ingest_conn = None
-        admin_conn = None
         
         try:
             # 步骤1: 使用admin禁用触发器
@@ -297,22 +413,8 @@ class DualConnectionIngestor:
             
             self.load_existing_ids(ingest_conn)
             
-            # 步骤3: 下载数据
-            logger.info("正在下载...")
-            response = requests.get(url, stream=True, timeout=300)
-            response.raise_for_status()
-            
-            events = []
-            logger.info("正在解压...")
-            with gzip.GzipFile(fileobj=BytesIO(response.content)) as gz_file:
-                for line in gz_file:
-                    try:
-                        event = json.loads(line.decode('utf-8'))
-                        events.append(event)
-                    except:
-                        pass
-            
-            logger.info(f"✓ 下载完成，共 {len(events)} 条事件")
+            # 步骤3: 记录该小时的摘要供核对
+            self._save_digest(ingest_conn, hour_start, events)
             
             # 步骤4: 批量处理
             self._process_all_events(ingest_conn, events)
@@ -345,55 +447,58 @@ class DualConnectionIngestor:
         cursor = conn.cursor()
         
         try:
-            # 收集实体
+            # 收集新增或资料变更的实体
             logger.info("  [1/4] 收集实体数据...")
-            actors_to_insert = []
-            repos_to_insert = []
-            orgs_to_insert = []
+            actor_changes = collect_changes(ACTORS, self.existing_actors, [event.get('actor') for event in events])
+            repo_changes = collect_changes(REPOS, self.existing_repos, [event.get('repo') for event in events])
+            org_changes = collect_changes(ORGS, self.existing_orgs, [event.get('org') for event in events])
             
-            for event in events:
-                if 'actor' in event and event['actor'] and event['actor'].get('id'):
-                    actor_id = event['actor']['id']
-                    if actor_id not in self.existing_actors:
-                        actors_to_insert.append(event['actor'])
-                        self.existing_actors.add(actor_id)
-                
-                if 'repo' in event and event['repo'] and event['repo'].get('id'):
-                    repo_id = event['repo']['id']
-                    if repo_id not in self.existing_repos:
-                        repos_to_insert.append(event['repo'])
-                        self.existing_repos.add(repo_id)
-                
-                if 'org' in event and event['org'] and event['org'].get('id'):
-                    org_id = event['org']['id']
-                    if org_id not in self.existing_orgs:
-                        orgs_to_insert.append(event['org'])
-                        self.existing_orgs.add(org_id)
-            
-            # 批量插入实体
-            logger.info("  [2/4] 批量插入实体...")
-            if actors_to_insert:
-                self._bulk_insert_actors(cursor, actors_to_insert)
-            if repos_to_insert:
-                self._bulk_insert_repos(cursor, repos_to_insert)
-            if orgs_to_insert:
-                self._bulk_insert_orgs(cursor, orgs_to_insert)
+            # 批量写入实体（新增 + 更新）
+            logger.info("  [2/4] 批量写入实体...")
+            self.stats['actors_inserted'] = self._upsert_entities(cursor, ACTORS, self.existing_actors, actor_changes)
+            self.stats['repos_inserted'] = self._upsert_entities(cursor, REPOS, self.existing_repos, repo_changes)
+            orgs_inserted = self._upsert_entities(cursor, ORGS, self.existing_orgs, org_changes)
+            add_overview_counts(cursor, actors=self.stats['actors_inserted'],
+                                repos=self.stats['repos_inserted'], orgs=orgs_inserted)
             
             conn.commit()
-            logger.info("    ✓ 实体插入完成")
+            logger.info("    ✓ 实体写入完成")
+            
+            # 新出现的事件类型先登记编码（独立提交，后续事务回滚不受影响）
+            event_types.register(conn, (event.get('type', '')[:50] for event in events))
+            
+            # 剔除已写入的事件（重放 spool 或重复摄取时）和文件内重复的事件，避免产生重复的Payload和重复汇总
+            events = self._drop_ingested(cursor, events)
             
-            # 批量插入Payload
+            # 批量插入Payload（与事件在同一事务内提交，中途失败可整体重放）
             logger.info("  [3/4] 批量插入Payload...")
             payload_id_map = self._bulk_insert_payloads(cursor, events)
-            conn.commit()
-            logger.info("    ✓ Payload插入完成")
             
-            # 批量插入Events
+            # 批量插入Events，并在同一事务内更新汇总表
             logger.info("  [4/4] 批量插入事件...")
-            self._bulk_insert_events_safe(cursor, events, payload_id_map)
+            new_events = self._bulk_insert_events_safe(cursor, events, payload_id_map)
+            buckets = update_repo_activity_hourly(cursor, new_events)
+            logger.info(f"    更新 {buckets} 个仓库小时汇总桶")
+            actor_days = update_actor_activity_daily(cursor, new_events)
+            logger.info(f"    更新 {actor_days} 条用户每日汇总")
+            sketched = update_repo_actor_sketches(cursor, new_events)
+            logger.info(f"    更新 {sketched} 个仓库关注者/贡献者草图")
+            dirty = mark_dirty_days(cursor, new_events)
+            logger.info(f"    标记 {dirty} 个待重算的日期-事件类型组")
+            tracker, flushed_at = load_trending(cursor)
+            fed = feed_trending(tracker, new_events)
+            save_trending(cursor, tracker, fed)
+            logger.info(f"    趋势追踪器计入 {fed} 条事件（跟踪 {len(tracker)} 个仓库）")
+            if new_events:
+                latest = max(row.created_at for row in new_events).replace(tzinfo=None)
+                add_overview_counts(cursor, events=self.stats['events_inserted'], latest_event=latest)
             conn.commit()
             logger.info("    ✓ 事件插入完成")
             
+            self._flush_trending(conn, tracker, flushed_at)
+            if new_events:
+                bump_version(conn, EVENTS)
+            
         except Exception as e:
             conn.rollback()
             logger.error(f"✗ 批量处理失败: {e}")
@@ -401,51 +506,28 @@ class DualConnectionIngestor:
         finally:
             cursor.close()
     
-    def _bulk_insert_actors(self, cursor, actors):
-        """批量插入用户"""
-        if not actors:
-            return
-        
-        sql = "INSERT IGNORE INTO actors (actor_id, login, display_login, gravatar_id, url, avatar_url) VALUES (%s, %s, %s, %s, %s, %s)"
-        values = [
-            (a.get('id'), a.get('login', '')[:100], a.get('display_login', a.get('login', ''))[:100],
-             a.get('gravatar_id', '')[:100], a.get('url', '')[:255], a.get('avatar_url', '')[:255])
-            for a in actors if a.get('id')
-        ]
-        if values:
-            cursor.executemany(sql, values)
-            self.stats['actors_inserted'] = cursor.rowcount
-            logger.info(f"    插入 {cursor.rowcount} 个新用户")
-    
-    def _bulk_insert_repos(self, cursor, repos):
-        """批量插入仓库"""
-        if not repos:
-            return
-        
-        sql = "INSERT IGNORE INTO repos (repo_id, name, url) VALUES (%s, %s, %s)"
-        values = [
-            (r.get('id'), r.get('name', '')[:255], r.get('url', '')[:255])
-            for r in repos if r.get('id')
-        ]
-        if values:
-            cursor.executemany(sql, values)
-            self.stats['repos_inserted'] = cursor.rowcount
-            logger.info(f"    插入 {cursor.rowcount} 个新仓库")
+    def _flush_trending(self, conn, tracker, flushed_at):
+        """按间隔把趋势候选刷新到 hot_repos（失败不影响已提交的事件）"""
+        cursor = conn.cursor()
+        try:
+            count = flush_trending(cursor, tracker, flushed_at)
+            if count is not None:
+                conn.commit()
+                logger.info(f"    ✓ 热门仓库榜单已刷新: {count} 个")
+        except Exception as e:
+            conn.rollback()
+            logger.warning(f"    ⚠ 刷新热门仓库榜单失败: {e}")
+        finally:
+            cursor.close()
     
-    def _bulk_insert_orgs(self, cursor, orgs):
-        """批量插入组织"""
-        if not orgs:
-            return
-        
-        sql = "INSERT IGNORE INTO organizations (org_id, login, gravatar_id, url, avatar_url) VALUES (%s, %s, %s, %s, %s)"
-        values = [
-            (o.get('id'), o.get('login', '')[:100], o.get('gravatar_id', '')[:100],
-             o.get('url', '')[:255], o.get('avatar_url', '')[:255])
-            for o in orgs if o.get('id')
-        ]
-        if values:
-            cursor.executemany(sql, values)
-            logger.info(f"    插入 {cursor.rowcount} 个新组织")
+    def _upsert_entities(self, cursor, spec, cache, changes) -> int:
+        """批量写入新增和资料变更的实体，返回新增数"""
+        inserted, updated, released = upsert_entities(cursor, spec, cache, changes)
+        self.stats['entities_updated'] += updated
+        if changes:
+            logger.info(f"    新增 {inserted} 个{spec.label}，更新 {updated} 个{spec.label}资料"
+                        + (f"，{released} 个旧名改为占位名" if released else ''))
+        return inserted
     
     def _bulk_insert_payloads(self, cursor, events: List[Dict]) -> Dict[int, int]:
         """批量插入Payload"""
@@ -509,13 +591,80 @@ class DualConnectionIngestor:
         logger.info(f"    插入 {len(payload_id_map)} 个Payload")
         return payload_id_map
     
-    def _bulk_insert_events_safe(self, cursor, events: List[Dict], payload_map: Dict):
-        """批量插入事件（应用层验证）"""
+    def _drop_ingested(self, cursor, events: List[Dict]) -> List[Dict]:
+        """
+        剔除 events 表中已存在的事件和同一文件中重复出现的事件（只保留第一次出现）
+        
+        在写入 Payload 之前执行，是写入事件前唯一的一次查重；之后 INSERT IGNORE 仍被忽略的行
+        （并发摄取刚写入）由 _inserted_rows 排除。
+        """
+        unique = []
+        seen = set()
+        duplicates = 0
+        for event in events:
+            try:
+                key = (int(event['id']), event['created_at'][:10])
+            except (KeyError, TypeError, ValueError):
+                unique.append(event)  # 写入事件时计为跳过
+                continue
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+            unique.append(event)
+        if duplicates:
+            self.stats['skipped'] += duplicates
+            logger.info(f"    {duplicates} 条事件在文件中重复出现，跳过")
+        
+        existing = set()
+        keys = sorted(seen)
+        batch_size = 1000
+        for i in range(0, len(keys), batch_size):
+            batch = keys[i:i + batch_size]
+            existing |= self._lookup_event_ids(cursor, [key[0] for key in batch], {key[1] for key in batch})
+        
+        if not existing:
+            return unique
+        logger.info(f"    {len(existing)} 条事件已写入过，跳过")
+        
+        def ingested(event):
+            try:
+                return int(event['id']) in existing
+            except (KeyError, TypeError, ValueError):
+                return False
+        return [event for event in unique if not ingested(event)]
+    
+    def _lookup_event_ids(self, cursor, ids: List[int], dates) -> set:
+        """ids 中在 events 表可见的 gh_event_id"""
+        dates = sorted(dates)
+        date_marks = ', '.join(['%s'] * len(dates))
+        id_marks = ', '.join(['%s'] * len(ids))
+        # 按分区键过滤可触发分区裁剪，再走 uk_gh_event_id
+        cursor.execute(
+            f"SELECT gh_event_id FROM events "
+            f"WHERE created_at_date IN ({date_marks}) AND gh_event_id IN ({id_marks})",
+            dates + list(ids)
+        )
+        return {row['gh_event_id'] for row in cursor.fetchall()}
+    
+    def _inserted_rows(self, cursor, batch: List[EventRow]) -> List[EventRow]:
+        """
+        INSERT IGNORE 忽略了部分行时，查出本事务实际写入的行
+        
+        batch 在写入前已剔除了事务快照中存在的事件；一致性读（REPEATABLE READ）只能看到
+        快照中的行和本事务写入的行，并发摄取在快照之后提交的同一事件不可见，因此查到的就是本次写入的行。
+        """
+        inserted = self._lookup_event_ids(
+            cursor, [row.gh_event_id for row in batch], {row.created_at_date for row in batch})
+        return [row for row in batch if row.gh_event_id in inserted]
+    
+    def _bulk_insert_events_safe(self, cursor, events: List[Dict], payload_map: Dict) -> List[EventRow]:
+        """批量插入事件（应用层验证），返回本次新写入的事件"""
         sql = """
             INSERT IGNORE INTO events (
-                gh_event_id, event_type, public, created_at, created_at_date,
-                actor_id, repo_id, org_id, payload_id, actor_login, repo_name
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                gh_event_id, type_code, public, created_at, created_at_date,
+                actor_id, repo_id, org_id, payload_id
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
         """
         
         values = []
@@ -539,9 +688,10 @@ class DualConnectionIngestor:
                 if org_id and org_id not in self.existing_orgs:
                     org_id = None
                 
-                values.append((
-                    event.get('id'),
-                    event.get('type', '')[:50],
+                event_type = event.get('type', '')[:50]
+                values.append(EventRow(
+                    int(event.get('id')),
+                    event_types.code(event_type),
                     1 if event.get('public') else 0,
                     created_dt,
                     created_dt.date(),
@@ -549,8 +699,7 @@ class DualConnectionIngestor:
                     repo_id,
                     org_id,
                     payload_map.get(idx, 1),
-                    event.get('actor', {}).get('login', '')[:100],
-                    event.get('repo', {}).get('name', '')[:255]
+                    event_type
                 ))
             except:
                 self.stats['skipped'] += 1
@@ -558,13 +707,19 @@ class DualConnectionIngestor:
         
         batch_size = 1000
         total = 0
+        new_events = []
         for i in range(0, len(values), batch_size):
             batch = values[i:i+batch_size]
-            cursor.executemany(sql, batch)
+            cursor.executemany(sql, [row[:EVENT_INSERT_COLUMNS] for row in batch])
             total += cursor.rowcount
+            if cursor.rowcount < len(batch):
+                # 有行被忽略（并发摄取刚写入了同一事件）：只把实际写入的行计入汇总表
+                batch = self._inserted_rows(cursor, batch)
+            new_events.extend(batch)
         
         self.stats['events_inserted'] = total
         logger.info(f"    插入 {total} 条事件，跳过 {self.stats['skipped']} 条")
+        return new_events
     
     def _print_stats(self):
         logger.info("=" * 60)
@@ -572,21 +727,25 @@ class DualConnectionIngestor:
         logger.info(f"  插入事件: {self.stats['events_inserted']}")
         logger.info(f"  新增用户: {self.stats['actors_inserted']}")
         logger.info(f"  新增仓库: {self.stats['repos_inserted']}")
+        logger.info(f"  更新资料: {self.stats['entities_updated']}")
         logger.info(f"  跳过: {self.stats['skipped']}")
         logger.info("=" * 60)
     
-    def ingest_hour(self, year: int, month: int, day: int, hour: int):
-        """处理单个小时"""
+    def ingest_hour(self, year: int, month: int, day: int, hour: int, spool_only: bool = False):
+        """处理单个小时（spool_only 时只下载写入 spool，由 --drain 写库）"""
         self.stats = {k: 0 for k in self.stats}
-        self.stream_download_and_process(year, month, day, hour)
+        if spool_only:
+            self.spool_hour(year, month, day, hour)
+        else:
+            self.stream_download_and_process(year, month, day, hour)
     
-    def ingest_day(self, year: int, month: int, day: int):
+    def ingest_day(self, year: int, month: int, day: int, spool_only: bool = False):
         """处理一整天"""
         logger.info(f"开始处理 {year}-{month:02d}-{day:02d} 全天数据")
         
         for hour in range(24):
             try:
-                self.ingest_hour(year, month, day, hour)
+                self.ingest_hour(year, month, day, hour, spool_only)
             except Exception as e:
                 logger.error(f"处理 {hour:02d}:00 失败: {e}")
                 continue
@@ -594,10 +753,22 @@ class DualConnectionIngestor:
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='GH Archive数据摄取脚本')
-    parser.add_argument('date', type=str, help='日期时间，格式: YYYY-MM-DD-HH (例如: 2025-12-24-15) 或 YYYY-MM-DD (处理整天)')
+    parser.add_argument('date', type=str, nargs='?',
+                        help='日期时间，格式: YYYY-MM-DD-HH (例如: 2025-12-24-15) 或 YYYY-MM-DD (处理整天)；只重放 spool 时可省略')
+    parser.add_argument('--spool-only', action='store_true', help='只下载并写入 spool，不写库')
+    parser.add_argument('--drain', action='store_true', help='重放 spool 中积压的文件（在处理 date 之后执行）')
+    parser.add_argument('--follow', action='store_true', help='与 --drain 一起使用：持续监视 spool 目录，写库失败时退避重试')
     
     args = parser.parse_args()
     
+    if not args.date:
+        if not args.drain:
+            print("错误: 请指定日期，或使用 --drain 重放 spool")
+            exit(1)
+        ingestor = DualConnectionIngestor()
+        ingestor.drain(follow=args.follow)
+        exit(0)
+    
     # 解析日期字符串
     date_parts = args.date.split('-')
     
@@ -611,7 +782,7 @@ if __name__ == '__main__':
             
             if 0 <= hour <= 23:
                 ingestor = DualConnectionIngestor()
-                ingestor.ingest_hour(year, month, day, hour)
+                ingestor.ingest_hour(year, month, day, hour, args.spool_only)
             else:
                 print("错误: 小时必须在 0-23 之间")
                 exit(1)
@@ -626,10 +797,13 @@ if __name__ == '__main__':
             day = int(date_parts[2])
             
             ingestor = DualConnectionIngestor()
-            ingestor.ingest_day(year, month, day)
+            ingestor.ingest_day(year, month, day, args.spool_only)
         except ValueError:
             print("错误: 日期格式不正确，请使用 YYYY-MM-DD 格式")
             exit(1)
     else:
         print("错误: 日期格式不正确，请使用 YYYY-MM-DD-HH (单个小时) 或 YYYY-MM-DD (整天) 格式")
-        exit(1)
\ No newline at end of file
+        exit(1)
+    
+    if args.drain:
+        ingestor.drain(follow=args.follow)
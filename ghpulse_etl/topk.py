@@ -0,0 +1,178 @@
+"""
+带时间衰减的 Space-Saving 热点追踪（Top-K 重流量项）
+摄取脚本把星标/Fork/PR 事件按权重喂入，内存占用固定为 capacity 个计数器，
+不需要对全部仓库做聚合查询即可得到近实时的趋势榜候选。
+
+误差：每个计数器的高估量不超过 error 字段（被淘汰计数器的最小值），
+    真实值位于 [score - error, score]；总权重为 N 时 error <= N / capacity。
+
+衰减：采用前向衰减（forward decay），权重按 2^((t - landmark) / half_life) 放大后累加，
+读取时再统一缩小，因此每次 add 只需 O(log k)，不必遍历全部计数器。
+衰减时间基于事件自身的 created_at，回填历史数据时结果与实时摄取一致。
+"""
+
+import heapq
+import math
+import struct
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 事件类型权重（与 hot_repos 热度分数中星标×2、Fork×1.5 保持一致）
+TRENDING_WEIGHTS = {
+    'WatchEvent': 2.0,
+    'ForkEvent': 1.5,
+    'PullRequestEvent': 1.0,
+}
+
+# 放大指数超过该值时重设基准时间，避免浮点溢出
+_REBASE_EXPONENT = 512
+
+# 序列化格式：版本 + 容量 + 半衰期(秒) + 基准时间 + 最新事件时间 + 条目数，之后为 (key, 计数, 误差)
+_HEADER = struct.Struct('>BIddqI')
+_ENTRY = struct.Struct('>Qdd')
+_VERSION = 1
+
+
+def _timestamp(dt: datetime) -> float:
+    """DATETIME（无时区，按 UTC 理解）或带时区时间转为秒级时间戳"""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+class DecayedSpaceSaving:
+    """带指数时间衰减的 Space-Saving 计数器"""
+
+    def __init__(self, capacity: int = 2000, half_life_hours: float = 24.0):
+        if capacity <= 0:
+            raise ValueError(f"容量必须为正数: {capacity}")
+        self.capacity = capacity
+        self.half_life = half_life_hours * 3600.0
+        self.landmark: Optional[float] = None
+        self.latest: float = 0.0
+        # key -> [放大后的计数, 放大后的误差]
+        self._counters: Dict[int, List[float]] = {}
+        # 最小堆 (计数, key)，计数更新后旧条目惰性作废
+        self._heap: List[Tuple[float, int]] = []
+
+    def __len__(self):
+        return len(self._counters)
+
+    def _scale(self, ts: float) -> float:
+        return 2.0 ** ((ts - self.landmark) / self.half_life)
+
+    def _rebase(self, ts: float):
+        """把所有计数缩放到新的基准时间"""
+        factor = 1.0 / self._scale(ts)
+        for counter in self._counters.values():
+            counter[0] *= factor
+            counter[1] *= factor
+        self.landmark = ts
+        self._rebuild_heap()
+
+    def _rebuild_heap(self):
+        self._heap = [(counter[0], key) for key, counter in self._counters.items()]
+        heapq.heapify(self._heap)
+
+    def _pop_min(self) -> Tuple[int, List[float]]:
+        """弹出当前计数最小的 key（跳过已过期的堆条目）"""
+        while True:
+            count, key = heapq.heappop(self._heap)
+            counter = self._counters.get(key)
+            if counter is not None and counter[0] == count:
+                return key, counter
+
+    def add(self, key: int, weight: float, when: datetime):
+        """按事件时间累加一次权重"""
+        ts = _timestamp(when)
+        if self.landmark is None:
+            self.landmark = ts
+        if ts > self.latest:
+            self.latest = ts
+        if (ts - self.landmark) / self.half_life > _REBASE_EXPONENT:
+            self._rebase(ts)
+        scaled = weight * self._scale(ts)
+
+        counter = self._counters.get(key)
+        if counter is not None:
+            counter[0] += scaled
+        elif len(self._counters) < self.capacity:
+            counter = self._counters[key] = [scaled, 0.0]
+        else:
+            # 替换最小计数器，新项继承其计数作为误差上界
+            evicted_key, evicted = self._pop_min()
+            del self._counters[evicted_key]
+            counter = self._counters[key] = [evicted[0] + scaled, evicted[0]]
+        heapq.heappush(self._heap, (counter[0], key))
+
+        # 惰性条目过多时重建，保持堆大小为 O(capacity)
+        if len(self._heap) > 4 * self.capacity:
+            self._rebuild_heap()
+
+    def top(self, k: int, now: Optional[datetime] = None) -> List[Tuple[int, float, float]]:
+        """
+        按衰减后的分数返回前 k 项
+
+        Args:
+            now: 衰减参考时间，默认取已见到的最新事件时间
+
+        Returns:
+            [(key, 分数, 误差上界), ...]，分数降序
+        """
+        if not self._counters:
+            return []
+        ts = _timestamp(now) if now is not None else self.latest
+        factor = 1.0 / self._scale(ts)
+        items = heapq.nlargest(k, self._counters.items(), key=lambda item: item[1][0])
+        return [(key, counter[0] * factor, counter[1] * factor) for key, counter in items]
+
+    def to_bytes(self) -> bytes:
+        """序列化并压缩（每个计数器24字节，压缩前）"""
+        landmark = self.landmark if self.landmark is not None else math.nan
+        parts = [_HEADER.pack(_VERSION, self.capacity, self.half_life, landmark,
+                              int(self.latest), len(self._counters))]
+        parts.extend(_ENTRY.pack(key, c[0], c[1]) for key, c in self._counters.items())
+        return zlib.compress(b''.join(parts))
+
+    @classmethod
+    def from_bytes(cls, data: Optional[bytes], capacity: int = 2000,
+                   half_life_hours: float = 24.0) -> 'DecayedSpaceSaving':
+        """
+        反序列化；data 为空时返回新的空追踪器
+
+        容量或半衰期与保存时不同时以新参数为准：容量变小则保留计数最大的项。
+        """
+        tracker = cls(capacity, half_life_hours)
+        if not data:
+            return tracker
+        raw = zlib.decompress(data)
+        version, _, half_life, landmark, latest, size = _HEADER.unpack_from(raw)
+        if version != _VERSION:
+            raise ValueError(f"未知的追踪器状态版本: {version}")
+        entries = [_ENTRY.unpack_from(raw, _HEADER.size + i * _ENTRY.size) for i in range(size)]
+        if math.isnan(landmark):
+            return tracker
+        tracker.landmark = landmark
+        tracker.latest = float(latest)
+        if half_life != tracker.half_life:
+            # 半衰期变化：先把计数折算到最新时间点，再以该时间为基准
+            factor = 2.0 ** ((landmark - tracker.latest) / half_life)
+            entries = [(key, count * factor, error * factor) for key, count, error in entries]
+            tracker.landmark = tracker.latest
+        entries.sort(key=lambda e: e[1], reverse=True)
+        for key, count, error in entries[:capacity]:
+            tracker._counters[key] = [count, error]
+        tracker._rebuild_heap()
+        return tracker
+
+
+def feed_trending(tracker: DecayedSpaceSaving, rows: Iterable) -> int:
+    """把新事件中的星标/Fork/PR 按权重喂入追踪器，返回计入的事件数"""
+    fed = 0
+    for row in rows:
+        weight = TRENDING_WEIGHTS.get(row.event_type)
+        if weight:
+            tracker.add(row.repo_id, weight, row.created_at)
+            fed += 1
+    return fed
@@ -5,11 +5,14 @@ GHPulse 完整统计更新脚本
 更新所有统计和缓存表，适合定时任务运行
 
 更新的表：
+0. repo_activity_hourly - 仓库小时汇总（回填与过期清理）
+   actor_activity_daily - 用户每日汇总（首次回填）
+   repo_actor_sketches - 仓库关注者/贡献者草图（首次回填）
 1. hot_repos - 热门仓库榜单
 2. active_developers - 活跃开发者榜单
 3. actor_stats_cache - 用户统计缓存
 4. repo_stats_cache - 仓库统计缓存
-5. event_stats_daily - 每日事件统计
+5. event_stats_daily - 每日事件统计（按摄取脏标记增量重算）
 6. base_stats - 基础统计数据
 """
 
@@ -17,8 +20,20 @@ import pymysql
 import os
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
+import argparse
 import logging
 import sys
+from collections import defaultdict
+from hll import HyperLogLog, merge_all
+import rollups
+from rollups import (
+    EventRow, HOURLY_RETENTION_HOURS, ACTOR_REPO_SKETCH_P, ActorDayAggregate, upsert_actor_activity,
+    OVERVIEW_ROW_ID
+)
+from rebuild import run_chunked_rebuild, load_progress, DEFAULT_MAX_REPLICA_LAG, DEFAULT_MAX_LOCK_WAITS
+from stats_profiler import profiler, ProfiledCursor
+from event_types import event_types as event_type_cache, PUSH, PULL_REQUEST, ISSUES, WATCH, FORK
+from data_versions import bump_version, STATS
 
 # 配置日志
 logging.basicConfig(
@@ -33,13 +48,21 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# 用户近期统计窗口（天，含当天）
+ACTOR_WINDOW_DAYS = 7
+
+# 每日事件统计草图精度（固定 2+16384 字节，误差约0.8%）
+EVENT_STATS_SKETCH_P = 14
+
 DB_CONFIG = {
     'host': os.getenv('DB_HOST'),
     'port': int(os.getenv('DB_PORT', 3306)),
     'user': os.getenv('DB_USER'),
     'password': os.getenv('DB_PASSWORD'),
     'database': os.getenv('DB_NAME'),
-    'charset': 'utf8mb4'
+    'charset': 'utf8mb4',
+    # 剖析开启时记录每条语句的耗时、扫描行数和执行计划（见 stats_profiler.py）
+    'cursorclass': ProfiledCursor
 }
 
 
@@ -52,66 +75,118 @@ def get_db_connection():
         raise
 
 
-def update_hot_repos():
-    """更新热门仓库榜单"""
+def _numpy_backend():
+    """按需加载 NumPy 聚合后端（numpy 为可选依赖）"""
+    try:
+        import numpy_backend
+    except ImportError as e:
+        raise RuntimeError(f"--backend numpy 需要安装 numpy: {e}")
+    return numpy_backend
+
+
+def _run_numpy(func, conn):
+    """用独立的流式连接运行 NumPy 后端的某个刷新函数"""
+    stream_conn = get_db_connection()
+    try:
+        return func(conn, stream_conn)
+    finally:
+        stream_conn.close()
+
+
+@profiler.job
+def update_repo_activity_hourly(backfill_hours=HOURLY_RETENTION_HOURS):
+    """
+    维护仓库小时汇总表
+    
+    汇总表由摄取脚本增量写入；这里负责从 events 回填保留期内最早的桶之前缺失的小时
+    （升级后摄取先于本任务运行时汇总表非空，但更早的小时仍需回填），以及清理超出保留期（720小时）的旧桶。
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
     
     try:
         logger.info("=" * 60)
-        logger.info("🔥 更新热门仓库榜单")
+        logger.info("⏱️  维护仓库小时汇总表")
         logger.info("=" * 60)
         
-        # 检查表是否存在
-        cursor.execute("SHOW TABLES LIKE 'hot_repos'")
+        cursor.execute("SHOW TABLES LIKE 'repo_activity_hourly'")
         if not cursor.fetchone():
-            logger.error("❌ hot_repos 表不存在，请先运行初始化脚本")
+            logger.error("❌ repo_activity_hourly 表不存在，请先运行初始化脚本")
             return
         
-        cursor.execute("DELETE FROM hot_repos")
-        deleted = cursor.rowcount
-        logger.info(f"✓ 清空旧数据: {deleted} 行")
+        cursor.execute("""
+            SELECT MIN(stats_hour), TIMESTAMP(DATE_FORMAT(DATE_SUB(NOW(), INTERVAL %s HOUR), '%%Y-%%m-%%d %%H:00:00'))
+            FROM repo_activity_hourly
+        """, (backfill_hours,))
+        earliest, window_start = cursor.fetchone()
+        if earliest is None or earliest > window_start:
+            # 只回填最早的已有桶之前的小时，已有的桶由摄取写入，不重复累加
+            until_sql, until_params = ("AND created_at < %s", [earliest]) if earliest else ('', [])
+            logger.info(f"⏳ 从 events 回填 {window_start} 至 {earliest or '现在'} 的小时桶...")
+            cursor.execute(f"""
+                INSERT INTO repo_activity_hourly (
+                    repo_id, stats_hour, event_count,
+                    star_count, fork_count, pr_count, push_count, issue_count
+                )
+                SELECT 
+                    repo_id,
+                    DATE_FORMAT(created_at, '%%Y-%%m-%%d %%H:00:00') as stats_hour,
+                    COUNT(*) as event_count,
+                    SUM(type_code = {WATCH}) as star_count,
+                    SUM(type_code = {FORK}) as fork_count,
+                    SUM(type_code = {PULL_REQUEST}) as pr_count,
+                    SUM(type_code = {PUSH}) as push_count,
+                    SUM(type_code = {ISSUES}) as issue_count
+                FROM events
+                WHERE created_at >= %s {until_sql}
+                  AND created_at_date >= %s
+                GROUP BY repo_id, stats_hour
+            """, [window_start] + until_params + [window_start.date()])
+            logger.info(f"✓ 回填 {cursor.rowcount} 个小时桶")
         
-        logger.info("⏳ 计算热门仓库（基于星标、Fork、PR 活跃度）...")
         cursor.execute("""
-            INSERT INTO hot_repos (
-                repo_id, repo_name, score, 
-                stars_7d, forks_7d, prs_7d, 
-                rank_position, updated_at
-            )
-            SELECT 
-                r.repo_id,
-                r.name as repo_name,
-                COALESCE(r.total_stars, 0) + 
-                    COUNT(CASE WHEN e.event_type = 'WatchEvent' 
-                        AND e.created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY) THEN 1 END) * 2 +
-                    COUNT(CASE WHEN e.event_type = 'ForkEvent' 
-                        AND e.created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY) THEN 1 END) * 1.5 as score,
-                COUNT(CASE WHEN e.event_type = 'WatchEvent' 
-                    AND e.created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY) THEN 1 END) as stars_7d,
-                COUNT(CASE WHEN e.event_type = 'ForkEvent' 
-                    AND e.created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY) THEN 1 END) as forks_7d,
-                COUNT(CASE WHEN e.event_type = 'PullRequestEvent' 
-                    AND e.created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY) THEN 1 END) as prs_7d,
-                ROW_NUMBER() OVER (ORDER BY 
-                    COALESCE(r.total_stars, 0) + 
-                    COUNT(CASE WHEN e.event_type = 'WatchEvent' 
-                        AND e.created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY) THEN 1 END) * 2 +
-                    COUNT(CASE WHEN e.event_type = 'ForkEvent' 
-                        AND e.created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY) THEN 1 END) * 1.5
-                    DESC
-                ) as rank_position,
-                NOW() as updated_at
-            FROM repos r
-            LEFT JOIN events e ON r.repo_id = e.repo_id
-            GROUP BY r.repo_id, r.name, r.total_stars
-            HAVING score > 0
-            ORDER BY score DESC
-            LIMIT 100
-        """)
+            DELETE FROM repo_activity_hourly
+            WHERE stats_hour < DATE_SUB(NOW(), INTERVAL %s HOUR)
+        """, (HOURLY_RETENTION_HOURS,))
+        logger.info(f"✓ 清理过期小时桶: {cursor.rowcount} 行")
         
-        count = cursor.rowcount
         conn.commit()
+        
+    except Exception as e:
+        logger.error(f"❌ 更新失败: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        conn.rollback()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@profiler.job
+def update_hot_repos(backend='sql'):
+    """更新热门仓库榜单（backend='numpy' 时在本地聚合 7 天事件）"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        logger.info("=" * 60)
+        logger.info("🔥 更新热门仓库榜单")
+        logger.info("=" * 60)
+        
+        # 检查表是否存在
+        cursor.execute("SHOW TABLES LIKE 'hot_repos'")
+        if not cursor.fetchone():
+            logger.error("❌ hot_repos 表不存在，请先运行初始化脚本")
+            return
+        
+        if backend == 'numpy':
+            logger.info("⏳ 计算热门仓库（NumPy 后端，流式读取近7天事件）...")
+            count = _run_numpy(_numpy_backend().refresh_hot_repos, conn)
+        else:
+            logger.info("⏳ 计算热门仓库（基于星标、Fork、PR 活跃度，读取小时汇总表）...")
+            # 精确重算：候选集为近7天全部有活动的仓库（摄取时的趋势刷新只取追踪器候选）
+            count = rollups.refresh_hot_repos(cursor)
+            conn.commit()
         logger.info(f"✓ 成功插入 {count} 个热门仓库")
         
         # 显示 Top 3
@@ -133,8 +208,9 @@ def update_hot_repos():
         conn.close()
 
 
-def update_active_developers():
-    """更新活跃开发者榜单"""
+@profiler.job
+def update_active_developers(backend='sql'):
+    """更新活跃开发者榜单（backend='numpy' 时在本地聚合窗口内事件，repos_7d 为精确值）"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -148,11 +224,20 @@ def update_active_developers():
             logger.error("❌ active_developers 表不存在")
             return
         
+        if backend == 'numpy':
+            logger.info("⏳ 计算活跃开发者（NumPy 后端，流式读取窗口内事件）...")
+            count = _run_numpy(
+                lambda c, sc: _numpy_backend().refresh_active_developers(c, sc, ACTOR_WINDOW_DAYS), conn
+            )
+            logger.info(f"✓ 成功插入 {count} 个活跃开发者")
+            return
+        
         cursor.execute("DELETE FROM active_developers")
         deleted = cursor.rowcount
         logger.info(f"✓ 清空旧数据: {deleted} 行")
         
-        logger.info("⏳ 计算活跃开发者（基于提交、PR、Issue 活跃度）...")
+        logger.info("⏳ 计算活跃开发者（基于提交、PR、Issue 活跃度，读取用户每日汇总表）...")
+        # 候选集 = 历史事件数前100 ∪ 窗口内活跃用户；其余用户得分只等于 total_events，不可能进入前100
         cursor.execute("""
             INSERT INTO active_developers (
                 actor_id, actor_login, activity_score,
@@ -162,30 +247,62 @@ def update_active_developers():
             SELECT 
                 a.actor_id,
                 a.login as actor_login,
-                COALESCE(a.total_events, 0) + 
-                    COUNT(CASE WHEN e.created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY) THEN 1 END) as activity_score,
-                COUNT(CASE WHEN e.event_type = 'PushEvent' 
-                    AND e.created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY) THEN 1 END) as commits_7d,
-                COUNT(CASE WHEN e.event_type = 'PullRequestEvent' 
-                    AND e.created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY) THEN 1 END) as prs_7d,
-                COUNT(CASE WHEN e.event_type = 'IssuesEvent' 
-                    AND e.created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY) THEN 1 END) as issues_7d,
-                COUNT(DISTINCT CASE WHEN e.created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY) THEN e.repo_id END) as repos_7d,
+                COALESCE(a.total_events, 0) + COALESCE(w.events_7d, 0) as activity_score,
+                COALESCE(w.commits_7d, 0) as commits_7d,
+                COALESCE(w.prs_7d, 0) as prs_7d,
+                COALESCE(w.issues_7d, 0) as issues_7d,
+                0 as repos_7d,
                 ROW_NUMBER() OVER (ORDER BY 
-                    COALESCE(a.total_events, 0) + 
-                    COUNT(CASE WHEN e.created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY) THEN 1 END) 
+                    COALESCE(a.total_events, 0) + COALESCE(w.events_7d, 0) 
                     DESC
                 ) as rank_position,
                 NOW() as updated_at
-            FROM actors a
-            LEFT JOIN events e ON a.actor_id = e.actor_id
-            GROUP BY a.actor_id, a.login, a.total_events
+            FROM (
+                SELECT actor_id FROM (
+                    SELECT actor_id FROM actors ORDER BY total_events DESC LIMIT 100
+                ) top_total
+                UNION
+                SELECT DISTINCT actor_id FROM actor_activity_daily
+                WHERE stats_date > DATE_SUB(CURDATE(), INTERVAL %s DAY)
+            ) c
+            INNER JOIN actors a ON a.actor_id = c.actor_id
+            LEFT JOIN (
+                SELECT 
+                    actor_id,
+                    SUM(event_count) as events_7d,
+                    SUM(push_count) as commits_7d,
+                    SUM(pr_count) as prs_7d,
+                    SUM(issue_count) as issues_7d
+                FROM actor_activity_daily
+                WHERE stats_date > DATE_SUB(CURDATE(), INTERVAL %s DAY)
+                GROUP BY actor_id
+            ) w ON w.actor_id = c.actor_id
             HAVING activity_score > 0
             ORDER BY activity_score DESC
             LIMIT 100
-        """)
+        """, (ACTOR_WINDOW_DAYS, ACTOR_WINDOW_DAYS))
         
         count = cursor.rowcount
+        
+        # 7日参与仓库数：只为上榜用户合并每日草图
+        cursor.execute("SELECT actor_id FROM active_developers")
+        actor_ids = [row[0] for row in cursor.fetchall()]
+        if actor_ids:
+            placeholders = ', '.join(['%s'] * len(actor_ids))
+            cursor.execute(f"""
+                SELECT actor_id, repo_sketch FROM actor_activity_daily
+                WHERE actor_id IN ({placeholders})
+                  AND stats_date > DATE_SUB(CURDATE(), INTERVAL %s DAY)
+            """, actor_ids + [ACTOR_WINDOW_DAYS])
+            sketches = {}
+            for actor_id, blob in cursor.fetchall():
+                sketches.setdefault(actor_id, []).append(blob)
+            cursor.executemany(
+                "UPDATE active_developers SET repos_7d = %s WHERE actor_id = %s",
+                [(merge_all(blobs, ACTOR_REPO_SKETCH_P).count(), actor_id)
+                 for actor_id, blobs in sketches.items()]
+            )
+        
         conn.commit()
         logger.info(f"✓ 成功插入 {count} 个活跃开发者")
         
@@ -206,8 +323,86 @@ def update_active_developers():
         conn.close()
 
 
-def update_actor_stats_cache():
-    """更新用户统计缓存（全量）"""
+def _refresh_actor_stats(cursor, actor_ids, window_start):
+    """
+    根据 actor_activity_daily 重算一批用户的统计缓存
+    
+    Args:
+        actor_ids: 用户ID列表（建议每批不超过1000个）
+        window_start: 近期窗口起始日期（含）
+    
+    Returns:
+        写入的缓存行数
+    """
+    if not actor_ids:
+        return 0
+    
+    placeholders = ', '.join(['%s'] * len(actor_ids))
+    cursor.execute(f"""
+        SELECT actor_id, stats_date, push_count, pr_count, issue_count, watch_count, repo_sketch
+        FROM actor_activity_daily
+        WHERE actor_id IN ({placeholders})
+    """, list(actor_ids))
+    
+    totals = {}
+    for actor_id, stats_date, pushes, prs, issues, watches, blob in cursor.fetchall():
+        t = totals.get(actor_id)
+        if t is None:
+            t = totals[actor_id] = {
+                'commits': 0, 'prs': 0, 'issues': 0, 'stars': 0,
+                'commits_7d': 0, 'prs_7d': 0,
+                'repos': HyperLogLog(ACTOR_REPO_SKETCH_P),
+                'repos_7d': HyperLogLog(ACTOR_REPO_SKETCH_P)
+            }
+        t['commits'] += pushes
+        t['prs'] += prs
+        t['issues'] += issues
+        t['stars'] += watches
+        sketch = HyperLogLog.from_bytes(blob, ACTOR_REPO_SKETCH_P) if blob else None
+        if sketch is not None:
+            t['repos'].merge(sketch)
+        if stats_date >= window_start:
+            t['commits_7d'] += pushes
+            t['prs_7d'] += prs
+            if sketch is not None:
+                t['repos_7d'].merge(sketch)
+    
+    values = [
+        (actor_id, t['commits'], t['prs'], t['issues'], t['repos'].count(), t['stars'],
+         t['commits_7d'], t['prs_7d'], t['repos_7d'].count())
+        for actor_id, t in totals.items()
+        if t['commits'] > 0 or t['prs'] > 0 or t['issues'] > 0
+    ]
+    if values:
+        cursor.executemany("""
+            INSERT INTO actor_stats_cache (
+                actor_id, total_commits, total_prs, total_issues, total_repos,
+                total_stars_received, commits_7d, prs_7d, repos_7d, updated_at
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+            ON DUPLICATE KEY UPDATE
+                total_commits = VALUES(total_commits),
+                total_prs = VALUES(total_prs),
+                total_issues = VALUES(total_issues),
+                total_repos = VALUES(total_repos),
+                total_stars_received = VALUES(total_stars_received),
+                commits_7d = VALUES(commits_7d),
+                prs_7d = VALUES(prs_7d),
+                repos_7d = VALUES(repos_7d),
+                updated_at = VALUES(updated_at)
+        """, values)
+    return len(values)
+
+
+@profiler.job
+def update_actor_stats_cache(full=False, chunk_size=1000, restart=False,
+                             max_lag=DEFAULT_MAX_REPLICA_LAG, max_lock_waits=DEFAULT_MAX_LOCK_WAITS):
+    """
+    更新用户统计缓存（基于用户每日汇总表）
+    
+    默认只重算窗口期内（多留1天，让滑出窗口的用户7日数据归零）有活动的用户，
+    耗时取决于活跃用户数而非全部历史；缓存为空或 full=True 时分块重算全部用户，
+    进度记录在 rebuild_progress，中断后可续跑。
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -221,66 +416,306 @@ def update_actor_stats_cache():
             logger.error("❌ actor_stats_cache 表不存在")
             return
         
-        cursor.execute("DELETE FROM actor_stats_cache")
-        deleted = cursor.rowcount
-        logger.info(f"✓ 清空旧数据: {deleted} 行")
+        cursor.execute("SELECT DATE_SUB(CURDATE(), INTERVAL %s DAY)", (ACTOR_WINDOW_DAYS - 1,))
+        window_start = cursor.fetchone()[0]
         
-        logger.info("⏳ 计算用户统计（可能需要几分钟）...")
-        cursor.execute("""
-            INSERT INTO actor_stats_cache (
-                actor_id,
-                total_commits,
-                total_prs,
-                total_issues,
-                total_repos,
-                total_stars_received,
-                commits_7d,
-                prs_7d,
-                repos_7d,
-                updated_at
+        cursor.execute("SELECT 1 FROM actor_stats_cache LIMIT 1")
+        if full or not cursor.fetchone():
+            logger.info("⏳ 分块全量重算用户统计（按 actor_id 区间，每块提交）...")
+            count = run_chunked_rebuild(
+                conn, 'actor_stats_cache',
+                """
+                    SELECT DISTINCT actor_id FROM actor_activity_daily
+                    WHERE actor_id > %s ORDER BY actor_id LIMIT %s
+                """,
+                lambda cur, ids: _refresh_actor_stats(cur, ids, window_start),
+                """
+                    DELETE FROM actor_stats_cache
+                    WHERE actor_id > %s AND actor_id <= %s AND updated_at < %s
+                """,
+                chunk_size=chunk_size, restart=restart,
+                max_lag=max_lag, max_lock_waits=max_lock_waits
             )
-            SELECT 
-                a.actor_id,
-                COUNT(CASE WHEN e.event_type = 'PushEvent' THEN 1 END) as total_commits,
-                COUNT(CASE WHEN e.event_type = 'PullRequestEvent' THEN 1 END) as total_prs,
-                COUNT(CASE WHEN e.event_type = 'IssuesEvent' THEN 1 END) as total_issues,
-                COUNT(DISTINCT e.repo_id) as total_repos,
-                COUNT(CASE WHEN e.event_type = 'WatchEvent' THEN 1 END) as total_stars_received,
-                COUNT(CASE 
-                    WHEN e.event_type = 'PushEvent' 
-                    AND e.created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY) 
-                    THEN 1 
-                END) as commits_7d,
-                COUNT(CASE 
-                    WHEN e.event_type = 'PullRequestEvent' 
-                    AND e.created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY) 
-                    THEN 1 
-                END) as prs_7d,
-                COUNT(DISTINCT CASE 
-                    WHEN e.created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY) 
-                    THEN e.repo_id 
-                END) as repos_7d,
-                NOW() as updated_at
-            FROM actors a
-            LEFT JOIN events e ON a.actor_id = e.actor_id
-            GROUP BY a.actor_id
-            HAVING total_commits > 0 OR total_prs > 0 OR total_issues > 0
-        """)
+            logger.info(f"✓ 成功更新 {count} 个用户统计")
+            return
         
-        count = cursor.rowcount
+        logger.info("⏳ 增量重算近期活跃用户统计...")
+        cursor.execute("""
+            SELECT DISTINCT actor_id FROM actor_activity_daily
+            WHERE stats_date >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
+        """, (ACTOR_WINDOW_DAYS,))
+        actor_ids = [row[0] for row in cursor.fetchall()]
+        logger.info(f"  待重算用户: {len(actor_ids):,}")
+        
+        count = 0
+        for i in range(0, len(actor_ids), chunk_size):
+            count += _refresh_actor_stats(cursor, actor_ids[i:i + chunk_size], window_start)
+            conn.commit()
+        
+        logger.info(f"✓ 成功更新 {count} 个用户统计")
+        
+    except Exception as e:
+        logger.error(f"❌ 更新失败: {e}")
+        conn.rollback()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@profiler.job
+def update_actor_activity_daily(flush_actors=5000):
+    """
+    维护用户每日汇总表
+    
+    汇总表由摄取脚本增量写入；这里从 events 按天流式回填汇总表最早日期之前的历史
+    （升级后摄取先于本任务运行时汇总表非空，但更早的日期仍需回填）。
+    从新到旧逐天回填、每天单独提交，中断后再次运行从已回填的最早日期之前继续，不重复累加。
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    stream_conn = None
+    
+    try:
+        logger.info("=" * 60)
+        logger.info("🗓️  维护用户每日汇总表")
+        logger.info("=" * 60)
+        
+        cursor.execute("SHOW TABLES LIKE 'actor_activity_daily'")
+        if not cursor.fetchone():
+            logger.error("❌ actor_activity_daily 表不存在，请先运行初始化脚本")
+            return
+        
+        # 只回填最早的已有日期之前的天，已有的日期由摄取写入，不重复累加
+        cursor.execute("SELECT MIN(stats_date) FROM actor_activity_daily")
+        earliest = cursor.fetchone()[0]
+        until_sql, until_params = ("WHERE created_at_date < %s", (earliest,)) if earliest else ('', ())
+        cursor.execute(f"""
+            SELECT DISTINCT created_at_date FROM events {until_sql}
+            ORDER BY created_at_date DESC
+        """, until_params)
+        days = [row[0] for row in cursor.fetchall()]
+        if not days:
+            logger.info("✓ 汇总表已覆盖全部历史，无需回填")
+            return
+        logger.info(f"⏳ 从 events 回填 {earliest or '现在'} 之前的 {len(days)} 天（从新到旧）...")
+        
+        # 流式读取需独占一个连接，写入走另一个连接
+        stream_conn = get_db_connection()
+        for day in days:
+            stream = stream_conn.cursor(pymysql.cursors.SSCursor)
+            stream.execute("""
+                SELECT actor_id, repo_id, type_code, COUNT(*)
+                FROM events
+                WHERE created_at_date = %s
+                GROUP BY actor_id, repo_id, type_code
+                ORDER BY actor_id
+            """, (day,))
+            
+            aggregates = defaultdict(ActorDayAggregate)
+            written = 0
+            for actor_id, repo_id, type_code, n in stream:
+                # 按 actor_id 有序，切换用户时之前的用户已完整，可以落盘
+                if len(aggregates) >= flush_actors and (actor_id, day) not in aggregates:
+                    written += upsert_actor_activity(cursor, aggregates)
+                    aggregates = defaultdict(ActorDayAggregate)
+                aggregates[(actor_id, day)].add(event_type_cache.name(cursor, type_code), repo_id, n)
+            written += upsert_actor_activity(cursor, aggregates)
+            stream.close()
+            
+            conn.commit()
+            logger.info(f"  {day}: {written:,} 个用户")
+        
+    except Exception as e:
+        logger.error(f"❌ 更新失败: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        conn.rollback()
+    finally:
+        cursor.close()
+        conn.close()
+        if stream_conn:
+            stream_conn.close()
+
+
+@profiler.job
+def update_repo_actor_sketches(flush_repos=5000):
+    """
+    维护仓库关注者/贡献者草图表
+    
+    草图由摄取脚本增量写入；这里从 events 流式回填一次全部历史，合并进已有草图
+    （HLL 合并幂等，摄取已写入的用户不会重复计数）。
+    按 repo_id 分批提交，进度记录在 rebuild_progress，中断后从上次的仓库继续；完成后不再回填。
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    stream_conn = None
+    
+    try:
+        logger.info("=" * 60)
+        logger.info("🧮 维护仓库关注者/贡献者草图")
+        logger.info("=" * 60)
+        
+        cursor.execute("SHOW TABLES LIKE 'repo_actor_sketches'")
+        if not cursor.fetchone():
+            logger.error("❌ repo_actor_sketches 表不存在，请先运行初始化脚本")
+            return
+        
+        cursor.execute("SELECT finished_at FROM rebuild_progress WHERE job_name = 'repo_actor_sketches'")
+        row = cursor.fetchone()
+        if row and row[0] is not None:
+            logger.info(f"✓ 历史已于 {row[0]} 回填完成，草图由摄取脚本增量维护")
+            return
+        
+        last_id, _ = load_progress(cursor, 'repo_actor_sketches')
         conn.commit()
-        logger.info(f"✓ 成功插入 {count} 个用户统计")
+        logger.info(f"⏳ 从 events 回填草图（repo_id > {last_id}）...")
+        stream_conn = get_db_connection()
+        stream = stream_conn.cursor(pymysql.cursors.SSCursor)
+        stream.execute(f"""
+            SELECT repo_id, actor_id, MAX(type_code = {WATCH}) as watched
+            FROM events
+            WHERE repo_id > %s
+            GROUP BY repo_id, actor_id
+            ORDER BY repo_id
+        """, (last_id,))
+        
+        def flush(rows, last_repo, finished):
+            written = rollups.update_repo_actor_sketches(cursor, rows)
+            cursor.execute("""
+                UPDATE rebuild_progress
+                SET last_id = %s, rows_done = rows_done + %s, chunks_done = chunks_done + 1,
+                    finished_at = IF(%s, NOW(), NULL)
+                WHERE job_name = 'repo_actor_sketches'
+            """, (last_repo if last_repo is not None else last_id, written, finished))
+            conn.commit()
+            return written
+        
+        rows = []
+        written = 0
+        last_repo = None
+        for repo_id, actor_id, watched in stream:
+            # 按 repo_id 有序，切换仓库时之前的仓库已完整，可以落盘
+            if repo_id != last_repo and len(rows) >= flush_repos:
+                written += flush(rows, last_repo, False)
+                rows = []
+            # 回填时每个 (仓库, 用户) 只出现一次，构造等价的事件行
+            event_type = 'WatchEvent' if watched else None
+            rows.append(EventRow(None, None, 1, None, None, actor_id, repo_id, None, None, event_type))
+            last_repo = repo_id
+        stream.close()
+        written += flush(rows, last_repo, True)
+        logger.info(f"✓ 回填 {written:,} 个仓库草图")
         
     except Exception as e:
         logger.error(f"❌ 更新失败: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
         conn.rollback()
     finally:
         cursor.close()
         conn.close()
+        if stream_conn:
+            stream_conn.close()
+
+
+def _refresh_repo_stats(cursor, repo_ids):
+    """
+    重算一段连续 repo_id 区间（repo_ids 首尾）的仓库统计缓存
+    
+    Returns:
+        处理的仓库数
+    """
+    if not repo_ids:
+        return 0
+    low, high = repo_ids[0], repo_ids[-1]
+    cursor.execute(f"""
+        INSERT INTO repo_stats_cache (
+            repo_id,
+            total_stars,
+            total_forks,
+            total_watchers,
+            total_contributors,
+            total_commits,
+            total_prs,
+            total_issues,
+            stars_1d,
+            stars_7d,
+            stars_30d,
+            updated_at
+        )
+        SELECT 
+            r.repo_id,
+            
+            -- 历史累计数据（从 repos 表直接读取）
+            COALESCE(r.total_stars, 0) as total_stars,
+            COALESCE(r.total_forks, 0) as total_forks,
+            
+            -- total_watchers / total_contributors 取自草图估计（误差约1.6%），避免 COUNT(DISTINCT)
+            COALESCE(sk.watchers_est, 0) as total_watchers,
+            GREATEST(
+                COALESCE(r.total_contributors, 0),
+                COALESCE(sk.contributors_est, 0)
+            ) as total_contributors,
+            
+            -- 从 events 聚合的统计
+            COUNT(CASE WHEN e.type_code = {PUSH} THEN 1 END) as total_commits,
+            COUNT(CASE WHEN e.type_code = {PULL_REQUEST} THEN 1 END) as total_prs,
+            COUNT(CASE WHEN e.type_code = {ISSUES} THEN 1 END) as total_issues,
+            
+            -- 近期星标增量（从小时汇总表读取）
+            COALESCE(w.stars_1d, 0) as stars_1d,
+            COALESCE(w.stars_7d, 0) as stars_7d,
+            COALESCE(w.stars_30d, 0) as stars_30d,
+            
+            NOW() as updated_at
+            
+        FROM repos r
+        LEFT JOIN events e ON r.repo_id = e.repo_id
+        LEFT JOIN (
+            SELECT 
+                repo_id,
+                SUM(CASE WHEN stats_hour >= DATE_SUB(NOW(), INTERVAL 1 DAY) 
+                    THEN star_count ELSE 0 END) as stars_1d,
+                SUM(CASE WHEN stats_hour >= DATE_SUB(NOW(), INTERVAL 7 DAY) 
+                    THEN star_count ELSE 0 END) as stars_7d,
+                SUM(star_count) as stars_30d
+            FROM repo_activity_hourly
+            WHERE repo_id BETWEEN %s AND %s
+                AND stats_hour >= DATE_SUB(NOW(), INTERVAL 30 DAY)
+            GROUP BY repo_id
+        ) w ON w.repo_id = r.repo_id
+        LEFT JOIN repo_actor_sketches sk ON sk.repo_id = r.repo_id
+        WHERE r.repo_id BETWEEN %s AND %s
+        GROUP BY r.repo_id, r.total_stars, r.total_forks, r.total_contributors,
+            w.stars_1d, w.stars_7d, w.stars_30d, sk.watchers_est, sk.contributors_est
+        HAVING total_commits > 0 OR total_prs > 0 OR total_issues > 0 OR stars_7d > 0
+        ON DUPLICATE KEY UPDATE
+            total_stars = VALUES(total_stars),
+            total_forks = VALUES(total_forks),
+            total_watchers = VALUES(total_watchers),
+            total_contributors = VALUES(total_contributors),
+            total_commits = VALUES(total_commits),
+            total_prs = VALUES(total_prs),
+            total_issues = VALUES(total_issues),
+            stars_1d = VALUES(stars_1d),
+            stars_7d = VALUES(stars_7d),
+            stars_30d = VALUES(stars_30d),
+            updated_at = VALUES(updated_at)
+    """, (low, high, low, high))
+    return len(repo_ids)
 
 
-def update_repo_stats_cache():
-    """更新仓库统计缓存（全量）"""
+@profiler.job
+def update_repo_stats_cache(chunk_size=5000, restart=False,
+                            max_lag=DEFAULT_MAX_REPLICA_LAG, max_lock_waits=DEFAULT_MAX_LOCK_WAITS,
+                            backend='sql'):
+    """
+    更新仓库统计缓存（全量，分块可续跑）
+    
+    按 repo_id 区间分块 upsert 并逐块提交，不再整表 DELETE + 单个大事务；
+    中断后再次运行从 rebuild_progress 记录的位置继续，restart=True 时从头开始。
+    backend='numpy' 时流式读取全部事件在本地聚合，数据库不执行 GROUP BY。
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -295,77 +730,23 @@ def update_repo_stats_cache():
             logger.warning("⚠️  repo_stats_cache 表不存在，跳过")
             return
         
-        cursor.execute("DELETE FROM repo_stats_cache")
-        deleted = cursor.rowcount
-        logger.info(f"✓ 清空旧数据: {deleted} 行")
-        
-        logger.info("⏳ 计算仓库统计（可能需要几分钟）...")
-        
-        # 根据实际表结构，从 repos 和 events 聚合数据
-        cursor.execute("""
-            INSERT INTO repo_stats_cache (
-                repo_id,
-                total_stars,
-                total_forks,
-                total_watchers,
-                total_contributors,
-                total_commits,
-                total_prs,
-                total_issues,
-                stars_1d,
-                stars_7d,
-                stars_30d,
-                updated_at
+        if backend == 'numpy':
+            logger.info("⏳ 计算仓库统计（NumPy 后端，流式读取全部事件）...")
+            count = _run_numpy(_numpy_backend().refresh_repo_stats_cache, conn)
+        else:
+            logger.info("⏳ 分块计算仓库统计（按 repo_id 区间，每块提交）...")
+            count = run_chunked_rebuild(
+                conn, 'repo_stats_cache',
+                "SELECT repo_id FROM repos WHERE repo_id > %s ORDER BY repo_id LIMIT %s",
+                _refresh_repo_stats,
+                """
+                    DELETE FROM repo_stats_cache
+                    WHERE repo_id > %s AND repo_id <= %s AND updated_at < %s
+                """,
+                chunk_size=chunk_size, restart=restart,
+                max_lag=max_lag, max_lock_waits=max_lock_waits
             )
-            SELECT 
-                r.repo_id,
-                
-                -- 历史累计数据（从 repos 表直接读取）
-                COALESCE(r.total_stars, 0) as total_stars,
-                COALESCE(r.total_forks, 0) as total_forks,
-                
-                -- total_watchers 从 events 计算（WatchEvent 的唯一用户数）
-                COUNT(DISTINCT CASE WHEN e.event_type = 'WatchEvent' THEN e.actor_id END) as total_watchers,
-                
-                -- total_contributors 从 repos 表或 events 计算
-                GREATEST(
-                    COALESCE(r.total_contributors, 0),
-                    COUNT(DISTINCT e.actor_id)
-                ) as total_contributors,
-                
-                -- 从 events 聚合的统计
-                COUNT(CASE WHEN e.event_type = 'PushEvent' THEN 1 END) as total_commits,
-                COUNT(CASE WHEN e.event_type = 'PullRequestEvent' THEN 1 END) as total_prs,
-                COUNT(CASE WHEN e.event_type = 'IssuesEvent' THEN 1 END) as total_issues,
-                
-                -- 近期星标增量
-                COUNT(CASE 
-                    WHEN e.event_type = 'WatchEvent' 
-                    AND e.created_at >= DATE_SUB(NOW(), INTERVAL 1 DAY) 
-                    THEN 1 
-                END) as stars_1d,
-                COUNT(CASE 
-                    WHEN e.event_type = 'WatchEvent' 
-                    AND e.created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY) 
-                    THEN 1 
-                END) as stars_7d,
-                COUNT(CASE 
-                    WHEN e.event_type = 'WatchEvent' 
-                    AND e.created_at >= DATE_SUB(NOW(), INTERVAL 30 DAY) 
-                    THEN 1 
-                END) as stars_30d,
-                
-                NOW() as updated_at
-                
-            FROM repos r
-            LEFT JOIN events e ON r.repo_id = e.repo_id
-            GROUP BY r.repo_id, r.total_stars, r.total_forks, r.total_contributors
-            HAVING total_commits > 0 OR total_prs > 0 OR total_issues > 0 OR stars_7d > 0
-        """)
-        
-        count = cursor.rowcount
-        conn.commit()
-        logger.info(f"✓ 成功插入 {count} 个仓库统计")
+        logger.info(f"✓ 已处理 {count} 个仓库的统计")
         
         # 显示统计摘要
         cursor.execute("""
@@ -407,6 +788,7 @@ def update_repo_stats_cache():
         conn.close()
 
 
+@profiler.job
 def update_base_statistics():
     """更新基础统计数据（actors、repos表的统计信息）"""
     conn = get_db_connection()
@@ -437,15 +819,15 @@ def update_base_statistics():
         
         # 更新repos统计
         logger.info("  更新仓库统计...")
-        cursor.execute("""
+        cursor.execute(f"""
             UPDATE repos r
             INNER JOIN (
                 SELECT 
                     repo_id,
                     MAX(created_at) AS last_event,
                     COUNT(*) AS event_count,
-                    SUM(CASE WHEN event_type = 'WatchEvent' THEN 1 ELSE 0 END) AS stars,
-                    SUM(CASE WHEN event_type = 'ForkEvent' THEN 1 ELSE 0 END) AS forks
+                    SUM(CASE WHEN type_code = {WATCH} THEN 1 ELSE 0 END) AS stars,
+                    SUM(CASE WHEN type_code = {FORK} THEN 1 ELSE 0 END) AS forks
                 FROM events
                 GROUP BY repo_id
             ) e ON r.repo_id = e.repo_id
@@ -459,7 +841,7 @@ def update_base_statistics():
         
         # 更新用户-仓库关联
         logger.info("  更新用户-仓库关联...")
-        cursor.execute("""
+        cursor.execute(f"""
             INSERT INTO user_repo_relation (
                 actor_id, repo_id, relation_type, relation_time,
                 first_event_at, last_event_at, event_count
@@ -468,8 +850,8 @@ def update_base_statistics():
                 e.actor_id,
                 e.repo_id,
                 CASE 
-                    WHEN e.event_type = 'WatchEvent' THEN 'star'
-                    WHEN e.event_type = 'ForkEvent' THEN 'fork'
+                    WHEN e.type_code = {WATCH} THEN 'star'
+                    WHEN e.type_code = {FORK} THEN 'fork'
                     ELSE 'contributor'
                 END AS relation_type,
                 MIN(e.created_at) AS relation_time,
@@ -481,8 +863,8 @@ def update_base_statistics():
             INNER JOIN repos r ON e.repo_id = r.repo_id      -- 确保repo存在
             GROUP BY e.actor_id, e.repo_id, 
                 CASE 
-                    WHEN e.event_type = 'WatchEvent' THEN 'star'
-                    WHEN e.event_type = 'ForkEvent' THEN 'fork'
+                    WHEN e.type_code = {WATCH} THEN 'star'
+                    WHEN e.type_code = {FORK} THEN 'fork'
                     ELSE 'contributor'
                 END
             ON DUPLICATE KEY UPDATE
@@ -504,19 +886,266 @@ def update_base_statistics():
         conn.close()
 
 
-def update_event_stats_daily(days=30):
+@profiler.job
+def update_overview_counters():
+    """
+    全量重算 overview_counters（摄取时增量维护，仅在初始化或计数漂移后校准）
+
+    先锁住计数行再统计：进行中的摄取事务提交后才开始计数，之后的摄取等待重算完成，结果精确。
+    COUNT(*) 需全索引扫描，重算期间摄取会阻塞在计数器更新上。
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        logger.info("=" * 60)
+        logger.info("🔢 重算概览计数器")
+        logger.info("=" * 60)
+        
+        cursor.execute("""
+            INSERT IGNORE INTO overview_counters (id, updated_at) VALUES (%s, NOW())
+        """, (OVERVIEW_ROW_ID,))
+        conn.commit()
+        
+        cursor.execute("SELECT id FROM overview_counters WHERE id = %s FOR UPDATE", (OVERVIEW_ROW_ID,))
+        counts = {}
+        for table in ('events', 'actors', 'repos', 'organizations'):
+            cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            counts[table] = cursor.fetchone()[0]
+            logger.info(f"  {table}: {counts[table]:,}")
+        cursor.execute("SELECT MAX(created_at) FROM events")
+        latest = cursor.fetchone()[0]
+        
+        cursor.execute("""
+            UPDATE overview_counters SET
+                total_events = %s, total_actors = %s, total_repos = %s, total_orgs = %s,
+                latest_event = %s, updated_at = NOW()
+            WHERE id = %s
+        """, (counts['events'], counts['actors'], counts['repos'], counts['organizations'],
+              latest, OVERVIEW_ROW_ID))
+        conn.commit()
+        logger.info("  ✓ 概览计数器已校准")
+        
+    except Exception as e:
+        logger.error(f"  ✗ 重算概览计数器失败: {e}")
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _compute_daily_groups(stream_conn, stats_date, event_types=None):
+    """
+    流式扫描某一天的事件，按事件类型构建精确总数和去重草图
+    
+    数据库只做分区内的索引范围扫描，去重计算在本地草图中完成，
+    避免 COUNT(DISTINCT) 在主库上排序/建临时表。
+    指定 event_types 时只扫描这些类型（走 idx_event_type 的 created_at 范围）。
+    """
+    sql = """
+        SELECT type_code, actor_id, repo_id, org_id
+        FROM events
+        WHERE created_at_date = %s
+    """
+    params = [stats_date]
+    if event_types:
+        lookup = stream_conn.cursor()
+        codes = event_type_cache.codes(lookup, event_types)
+        lookup.close()
+        if not codes:
+            return {}
+        day_start = datetime.combine(stats_date, datetime.min.time())
+        sql += f"""
+            AND type_code IN ({', '.join(['%s'] * len(codes))})
+            AND created_at >= %s AND created_at < %s
+        """
+        params.extend(codes)
+        params.extend([day_start, day_start + timedelta(days=1)])
+    
+    by_code = {}
+    stream = stream_conn.cursor(pymysql.cursors.SSCursor)
+    try:
+        stream.execute(sql, params)
+        for type_code, actor_id, repo_id, org_id in stream:
+            group = by_code.get(type_code)
+            if group is None:
+                group = by_code[type_code] = {
+                    'total': 0,
+                    'actors': HyperLogLog(EVENT_STATS_SKETCH_P),
+                    'repos': HyperLogLog(EVENT_STATS_SKETCH_P),
+                    'orgs': HyperLogLog(EVENT_STATS_SKETCH_P)
+                }
+            group['total'] += 1
+            group['actors'].add(actor_id)
+            group['repos'].add(repo_id)
+            if org_id is not None:
+                group['orgs'].add(org_id)
+    finally:
+        stream.close()
+    
+    # event_stats_daily 按类型名存储，流式读取结束后再把编码解析为类型名
+    lookup = stream_conn.cursor()
+    try:
+        return {event_type_cache.name(lookup, code): group for code, group in by_code.items()}
+    finally:
+        lookup.close()
+
+
+def _upsert_daily_groups(cursor, stats_date, groups):
+    """把某天各事件类型的统计和草图写入 event_stats_daily（按 uk_date_type 覆盖）"""
+    if not groups:
+        return 0
+    cursor.executemany("""
+        INSERT INTO event_stats_daily (
+            stats_date, event_type, total_count,
+            unique_actors, unique_repos, unique_orgs,
+            actors_hll, repos_hll, orgs_hll, stats_time
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+        ON DUPLICATE KEY UPDATE
+            total_count = VALUES(total_count),
+            unique_actors = VALUES(unique_actors),
+            unique_repos = VALUES(unique_repos),
+            unique_orgs = VALUES(unique_orgs),
+            actors_hll = VALUES(actors_hll),
+            repos_hll = VALUES(repos_hll),
+            orgs_hll = VALUES(orgs_hll),
+            stats_time = VALUES(stats_time)
+    """, [
+        (stats_date, event_type, g['total'],
+         g['actors'].count(), g['repos'].count(), g['orgs'].count(),
+         g['actors'].to_bytes(dense=True), g['repos'].to_bytes(dense=True), g['orgs'].to_bytes(dense=True))
+        for event_type, g in groups.items()
+    ])
+    return len(groups)
+
+
+def merged_unique_counts(cursor, start_date, end_date, event_types=None):
+    """
+    合并日期区间（含两端）内、可选限定事件类型的草图，估计去重用户/仓库/组织数
+    
+    误差约 0.8%（p=14）；直接对 unique_* 求和会跨天、跨类型重复计数。
+    
+    Returns:
+        {'actors': int, 'repos': int, 'orgs': int}
+    """
+    sql = """
+        SELECT actors_hll, repos_hll, orgs_hll FROM event_stats_daily
+        WHERE stats_date BETWEEN %s AND %s
+    """
+    params = [start_date, end_date]
+    if event_types:
+        sql += f" AND event_type IN ({', '.join(['%s'] * len(event_types))})"
+        params.extend(event_types)
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+    return {
+        'actors': merge_all((r[0] for r in rows), EVENT_STATS_SKETCH_P).count(),
+        'repos': merge_all((r[1] for r in rows), EVENT_STATS_SKETCH_P).count(),
+        'orgs': merge_all((r[2] for r in rows), EVENT_STATS_SKETCH_P).count()
+    }
+
+
+def _recompute_full_days(conn, cursor, stream_conn, days):
+    """重算最近 days 天的全部事件类型，返回写入记录数"""
+    start_date = (datetime.now() - timedelta(days=days)).date()
+    cursor.execute("""
+        SELECT DISTINCT created_at_date FROM events
+        WHERE created_at_date >= %s
+        ORDER BY created_at_date
+    """, (start_date,))
+    stats_dates = [row[0] for row in cursor.fetchall()]
+    
+    logger.info(f"⏳ 全量重算最近 {days} 天（{len(stats_dates)} 天有数据）...")
+    conn.commit()
+    count = 0
+    for stats_date in stats_dates:
+        # 先读当天脏标记的版本，再开启流式连接的新快照扫描：快照至少包含这些版本对应的写入，
+        # 之后提交的写入会递增版本号，标记保留到下次处理
+        cursor.execute(
+            "SELECT event_type, version FROM stats_dirty_days WHERE stats_date = %s",
+            (stats_date,)
+        )
+        versions = cursor.fetchall()
+        stream_conn.commit()
+        groups = _compute_daily_groups(stream_conn, stats_date)
+        count += _upsert_daily_groups(cursor, stats_date, groups)
+        if groups:
+            # 清理当天已不存在的事件类型
+            cursor.execute(f"""
+                DELETE FROM event_stats_daily
+                WHERE stats_date = %s AND event_type NOT IN ({', '.join(['%s'] * len(groups))})
+            """, [stats_date] + list(groups.keys()))
+        # 已全量重算的天无需再按脏标记处理（版本号变化说明期间又有新写入，保留）
+        cursor.executemany("""
+            DELETE FROM stats_dirty_days
+            WHERE stats_date = %s AND event_type = %s AND version = %s
+        """, [(stats_date, t, v) for t, v in versions])
+        conn.commit()
+    return count
+
+
+def _recompute_dirty_groups(conn, cursor, stream_conn):
+    """只重算脏标记表中的 (日期, 事件类型)，返回写入记录数"""
+    cursor.execute("""
+        SELECT stats_date, event_type, version
+        FROM stats_dirty_days
+        ORDER BY stats_date, event_type
+    """)
+    dirty = defaultdict(dict)
+    for stats_date, event_type, version in cursor.fetchall():
+        dirty[stats_date][event_type] = version
+    
+    logger.info(f"⏳ 增量重算脏数据（{len(dirty)} 天，{sum(len(v) for v in dirty.values())} 个日期-类型组）...")
+    count = 0
+    for stats_date, versions in dirty.items():
+        event_types = list(versions.keys())
+        stream_conn.commit()  # 每天用新快照扫描，不长期持有旧快照
+        groups = _compute_daily_groups(stream_conn, stats_date, event_types)
+        count += _upsert_daily_groups(cursor, stats_date, groups)
+        
+        # 事件已被删除的类型（例如重新摄取前清理过），同步删除统计
+        gone = [t for t in event_types if t not in groups]
+        if gone:
+            cursor.execute(f"""
+                DELETE FROM event_stats_daily
+                WHERE stats_date = %s AND event_type IN ({', '.join(['%s'] * len(gone))})
+            """, [stats_date] + gone)
+        
+        # 只清除读取时的版本，期间摄取脚本再次标记的组留到下次处理
+        cursor.executemany("""
+            DELETE FROM stats_dirty_days
+            WHERE stats_date = %s AND event_type = %s AND version = %s
+        """, [(stats_date, t, v) for t, v in versions.items()])
+        conn.commit()
+    return count
+
+
+@profiler.job
+def update_event_stats_daily(days=None):
     """
     更新每日事件统计
     
+    默认只重算摄取脚本标记过的 (日期, 事件类型)（stats_dirty_days），
+    未被重新摄取的旧日期不会再次扫描；指定 days 时强制全量重算最近 days 天。
+    统计表为空时自动全量重算最近30天。
+    
+    total_count 为精确值；unique_* 为 HyperLogLog 估计值（误差约0.8%），
+    草图一并写入，供跨天/跨类型合并。
+    
     Args:
-        days: 更新最近几天的数据（默认30天）
+        days: 强制全量重算最近几天（默认 None，按脏标记增量更新）
     """
     conn = get_db_connection()
     cursor = conn.cursor()
+    stream_conn = None
     
     try:
         logger.info("=" * 60)
-        logger.info(f"📅 更新每日事件统计（最近 {days} 天）")
+        if days:
+            logger.info(f"📅 更新每日事件统计（全量重算最近 {days} 天）")
+        else:
+            logger.info("📅 更新每日事件统计（增量）")
         logger.info("=" * 60)
         
         # 检查表是否存在
@@ -525,54 +1154,26 @@ def update_event_stats_daily(days=30):
             logger.error("❌ event_stats_daily 表不存在")
             return
         
-        # 删除最近N天的数据，重新计算
-        start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
-        cursor.execute("""
-            DELETE FROM event_stats_daily 
-            WHERE stats_date >= %s
-        """, (start_date,))
-        deleted = cursor.rowcount
-        logger.info(f"✓ 清空最近 {days} 天的旧数据: {deleted} 行")
+        if not days:
+            cursor.execute("SELECT 1 FROM event_stats_daily LIMIT 1")
+            if not cursor.fetchone():
+                logger.info("  统计表为空，先全量重算最近30天")
+                days = 30
         
-        logger.info("⏳ 计算每日事件统计...")
+        stream_conn = get_db_connection()
+        if days:
+            count = _recompute_full_days(conn, cursor, stream_conn, days)
+        else:
+            count = _recompute_dirty_groups(conn, cursor, stream_conn)
         
-        # 使用正确的字段名：total_count, unique_actors, unique_repos, unique_orgs, stats_time
-        cursor.execute("""
-            INSERT INTO event_stats_daily (
-                stats_date,
-                event_type,
-                total_count,
-                unique_actors,
-                unique_repos,
-                unique_orgs,
-                stats_time
-            )
-            SELECT 
-                DATE(e.created_at) as stats_date,
-                e.event_type,
-                COUNT(*) as total_count,
-                COUNT(DISTINCT e.actor_id) as unique_actors,
-                COUNT(DISTINCT e.repo_id) as unique_repos,
-                COUNT(DISTINCT e.org_id) as unique_orgs,
-                NOW() as stats_time
-            FROM events e
-            WHERE e.created_at >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
-            GROUP BY DATE(e.created_at), e.event_type
-            ORDER BY stats_date DESC, total_count DESC
-        """, (days,))
+        logger.info(f"✓ 成功写入 {count} 条每日统计记录")
         
-        count = cursor.rowcount
-        conn.commit()
-        logger.info(f"✓ 成功插入 {count} 条每日统计记录")
-        
-        # 显示最近3天的统计摘要（使用正确的字段名）
+        # 显示最近3天的统计摘要（去重数由草图跨类型合并得到）
         cursor.execute("""
             SELECT 
                 stats_date,
                 SUM(total_count) as total_events,
-                COUNT(DISTINCT event_type) as event_types,
-                SUM(unique_actors) as total_actors,
-                SUM(unique_repos) as total_repos
+                COUNT(DISTINCT event_type) as event_types
             FROM event_stats_daily
             WHERE stats_date >= DATE_SUB(CURDATE(), INTERVAL 3 DAY)
             GROUP BY stats_date
@@ -582,7 +1183,12 @@ def update_event_stats_daily(days=30):
         
         logger.info("\n📊 最近3天事件统计摘要:")
         for row in cursor.fetchall():
-            logger.info(f"  {row[0]} - 事件:{row[1]:,} | 类型:{row[2]} | 用户:{row[3]:,} | 仓库:{row[4]:,}")
+            unique = merged_unique_counts(cursor, row[0], row[0])
+            logger.info(f"  {row[0]} - 事件:{row[1]:,} | 类型:{row[2]} | 用户:{unique['actors']:,} | 仓库:{unique['repos']:,}")
+        
+        week_end = datetime.now().date()
+        unique = merged_unique_counts(cursor, week_end - timedelta(days=6), week_end)
+        logger.info(f"  近7天去重 - 用户:{unique['actors']:,} | 仓库:{unique['repos']:,} | 组织:{unique['orgs']:,}")
         
     except Exception as e:
         logger.error(f"❌ 更新失败: {e}")
@@ -592,8 +1198,11 @@ def update_event_stats_daily(days=30):
     finally:
         cursor.close()
         conn.close()
+        if stream_conn:
+            stream_conn.close()
 
 
+@profiler.job
 def show_summary():
     """显示所有统计表的摘要"""
     conn = get_db_connection()
@@ -609,7 +1218,11 @@ def show_summary():
             ('active_developers', '活跃开发者榜单'),
             ('actor_stats_cache', '用户统计缓存'),
             ('repo_stats_cache', '仓库统计缓存'),
-            ('event_stats_daily', '每日事件统计')
+            ('event_stats_daily', '每日事件统计'),
+            ('repo_activity_hourly', '仓库小时汇总'),
+            ('actor_activity_daily', '用户每日汇总'),
+            ('repo_actor_sketches', '仓库关注者/贡献者草图'),
+            ('overview_counters', '概览计数器')
         ]
         
         for table, name in tables:
@@ -644,7 +1257,30 @@ def show_summary():
         conn.close()
 
 
-def main():
+def publish_stats_version():
+    """统计数据已刷新：更新数据版本，Web 端的响应缓存随之失效"""
+    conn = get_db_connection()
+    try:
+        bump_version(conn, STATS)
+    finally:
+        conn.close()
+
+
+def rebuild(target, chunk_size=None, restart=False,
+            max_lag=DEFAULT_MAX_REPLICA_LAG, max_lock_waits=DEFAULT_MAX_LOCK_WAITS):
+    """只分块全量重建指定缓存表（可在业务时间运行，中断后重新执行即续跑）"""
+    throttle = {'restart': restart, 'max_lag': max_lag, 'max_lock_waits': max_lock_waits}
+    if target == 'actor_stats':
+        update_actor_stats_cache(full=True, chunk_size=chunk_size or 1000, **throttle)
+    elif target == 'repo_stats':
+        update_repo_stats_cache(chunk_size=chunk_size or 5000, **throttle)
+    elif target == 'overview':
+        update_overview_counters()
+    publish_stats_version()
+
+
+def main(chunk_size=None, max_lag=DEFAULT_MAX_REPLICA_LAG, max_lock_waits=DEFAULT_MAX_LOCK_WAITS,
+         backend='sql'):
     """主函数 - 执行所有统计更新"""
     
     start_time = datetime.now()
@@ -654,15 +1290,22 @@ def main():
     logger.info(" 🚀 " + "=" * 58)
     logger.info(f"开始时间: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
     logger.info("更新范围: 所有统计数据")
+    logger.info(f"聚合后端: {backend}")
     logger.info("")
     
+    throttle = {'max_lag': max_lag, 'max_lock_waits': max_lock_waits}
+    
     # 无条件更新所有统计数据
-    update_hot_repos()
-    update_active_developers()
-    update_actor_stats_cache()
-    update_repo_stats_cache()
-    update_event_stats_daily(30)  # 默认更新30天的每日统计
+    update_repo_activity_hourly()  # 先保证小时汇总表可用，热门榜和仓库缓存依赖它
+    update_hot_repos(backend)
+    update_actor_activity_daily()  # 活跃开发者榜和用户缓存依赖用户每日汇总表
+    update_active_developers(backend)
+    update_actor_stats_cache(chunk_size=chunk_size or 1000, **throttle)
+    update_repo_actor_sketches()  # 仓库缓存的关注者/贡献者数取自草图
+    update_repo_stats_cache(chunk_size=chunk_size or 5000, backend=backend, **throttle)
+    update_event_stats_daily()  # 只重算摄取后标记为脏的日期-类型组
     update_base_statistics()  # 更新基础统计数据
+    publish_stats_version()
     
     # 显示摘要
     show_summary()
@@ -674,12 +1317,37 @@ def main():
     logger.info("=" * 60)
     logger.info("\n💡 提示:")
     logger.info("  - 可设置定时任务每小时运行: 0 * * * * python update_all_stats.py")
+    logger.info("  - 业务时间全量重建缓存: python update_all_stats.py --rebuild actor_stats")
     logger.info("=" * 60)
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='GHPulse 统计更新脚本')
+    parser.add_argument('--rebuild', choices=['actor_stats', 'repo_stats', 'overview'],
+                        help='只全量重建指定缓存表（缓存表分块、中断后重新执行即续跑；overview 为概览计数器校准）')
+    parser.add_argument('--restart', action='store_true', help='忽略未完成的重建进度，从头开始')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='每块处理的ID数（默认用户1000、仓库5000）')
+    parser.add_argument('--max-lag', type=float, default=DEFAULT_MAX_REPLICA_LAG,
+                        help='从库延迟超过该秒数时暂停（需配置 REPLICA_HOST）')
+    parser.add_argument('--max-lock-waits', type=int, default=DEFAULT_MAX_LOCK_WAITS,
+                        help='当前行锁等待数超过该值时暂停')
+    parser.add_argument('--backend', choices=['sql', 'numpy'], default='sql',
+                        help='热门仓库/活跃开发者/仓库缓存的聚合方式：数据库内 SQL 或流式读取后 NumPy 聚合')
+    parser.add_argument('--no-profile', action='store_true', help='关闭逐条语句的性能剖析')
+    parser.add_argument('--report-dir', default=None,
+                        help='剖析 JSON 报告目录（默认 STATS_REPORT_DIR 或 stats_reports/）')
+    args = parser.parse_args()
+    
+    profile_conn = None
     try:
-        main()
+        if not args.no_profile:
+            profile_conn = get_db_connection()
+            profiler.start_run(profile_conn)
+        if args.rebuild:
+            rebuild(args.rebuild, args.chunk_size, args.restart, args.max_lag, args.max_lock_waits)
+        else:
+            main(args.chunk_size, args.max_lag, args.max_lock_waits, args.backend)
     except KeyboardInterrupt:
         logger.warning("\n⚠️  用户中断执行")
         sys.exit(1)
@@ -687,4 +1355,9 @@ if __name__ == '__main__':
         logger.error(f"\n❌ 执行失败: {e}")
         import traceback
         logger.error(traceback.format_exc())
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
+    finally:
+        if profile_conn:
+            # 中断或失败时也保留已完成作业的剖析结果
+            profiler.finish_run(profile_conn, args.report_dir)
+            profile_conn.close()
\ No newline at end of file
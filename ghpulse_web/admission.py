@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+自定义查询的准入控制
+- 代价预检：先 EXPLAIN，按执行计划估算扫描行数和访问的分区数，超过硬上限直接拒绝，
+  超过重查询阈值的放入并发为 1 的重查询通道排队执行
+- 每个客户端同时执行的查询数有上限，超出的在队列中等待，等待超时或队列已满返回 429
+- AsyncAdmission 是供 ASGI 服务使用的协程版本，沿用同一组限额和计数
+- 自定义查询从连接池借用连接时为仪表盘接口预留若干连接（见 ConnectionPool.get 的 reserve），
+  自定义查询再多也不会占满连接池
+"""
+
+import re
+import math
+import asyncio
+import threading
+from collections import defaultdict
+from contextlib import contextmanager, asynccontextmanager
+
+# 语句末尾的 LIMIT（LIMIT n / LIMIT m, n / LIMIT n OFFSET m）
+LIMIT_PATTERN = re.compile(r'\bLIMIT\s+(\d+)(?:\s*,\s*(\d+)|\s+OFFSET\s+(\d+))?\s*;?\s*$', re.IGNORECASE)
+
+# 出现这些标记时需要先读完全部候选行（排序、分组、临时表），LIMIT 不能提前结束扫描
+FULL_READ_MARKERS = ('Using filesort', 'Using temporary')
+
+
+class AdmissionRejected(Exception):
+    """查询未被准入：status 为建议的 HTTP 状态码"""
+
+    def __init__(self, message, status, cost=None):
+        super().__init__(message)
+        self.status = status
+        self.cost = cost
+
+
+class QueryCost:
+    """执行计划估算的代价"""
+
+    def __init__(self, rows_examined, partitions, full_scans):
+        self.rows_examined = rows_examined
+        self.partitions = partitions  # 单表访问的最多分区数（未分区表为 0）
+        self.full_scans = full_scans  # 全表扫描的表名
+
+    def to_dict(self):
+        return {
+            'rows_examined': self.rows_examined,
+            'partitions': self.partitions,
+            'full_scans': self.full_scans,
+        }
+
+
+def statement_limit(sql):
+    """语句末尾 LIMIT 需要读取的行数（偏移 + 行数），没有 LIMIT 时返回 None"""
+    match = LIMIT_PATTERN.search(sql)
+    if not match:
+        return None
+    first, second, offset = match.groups()
+    if second is not None:
+        return int(first) + int(second)
+    return int(first) + int(offset or 0)
+
+
+def _select_rows(plan_rows, needed):
+    """
+    单个 SELECT（同一 id）的嵌套循环估算：每张表的扫描行数 = 前面各表产出行数之积 × 本表每次扫描行数
+
+    needed 不为 None 时（有 LIMIT 且不需要排序/分组），驱动表只需读到产出 needed 行为止。
+    """
+    selectivity = 1.0
+    for row in plan_rows:
+        selectivity *= float(row.get('filtered') or 100) / 100
+    examined = 0
+    produced = 1.0
+    for i, row in enumerate(plan_rows):
+        rows = float(row.get('rows') or 1)
+        if i == 0 and needed is not None:
+            rows = min(rows, math.ceil(needed / max(selectivity, 0.001)))
+        examined += produced * rows
+        produced *= rows * float(row.get('filtered') or 100) / 100
+    return examined
+
+
+def explain_cost(cursor, sql):
+    """对语句执行 EXPLAIN 并估算代价（游标需返回字典行）"""
+    cursor.execute(f"EXPLAIN {sql}")
+    return plan_cost(cursor.fetchall(), sql)
+
+
+def plan_cost(plan, sql):
+    """按 EXPLAIN 结果（字典行）估算代价"""
+    limit = statement_limit(sql)
+    if any(marker in (row.get('Extra') or '') for row in plan for marker in FULL_READ_MARKERS):
+        limit = None
+
+    selects = defaultdict(list)
+    partitions = 0
+    full_scans = []
+    for row in plan:
+        selects[row.get('id')].append(row)
+        if row.get('partitions'):
+            partitions = max(partitions, len(row['partitions'].split(',')))
+        if row.get('type') == 'ALL' and row.get('table'):
+            full_scans.append(row['table'])
+
+    # LIMIT 只作用于最外层（第一个）SELECT
+    ids = list(selects)
+    examined = sum(
+        _select_rows(selects[select_id], limit if i == 0 and len(ids) == 1 else None)
+        for i, select_id in enumerate(ids)
+    )
+    return QueryCost(int(examined), partitions, full_scans)
+
+
+class AdmissionController:
+    """代价预算 + 按客户端的并发限制与等待队列 + 重查询通道"""
+
+    def __init__(self, max_rows=10_000_000, heavy_rows=1_000_000, max_partitions=12,
+                 per_client=2, queue_depth=4, queue_timeout=10.0, heavy_concurrency=1):
+        """
+        Args:
+            max_rows: 估算扫描行数的硬上限，超过直接拒绝
+            heavy_rows: 超过该估算行数的查询进入重查询通道
+            max_partitions: 单表最多访问的分区数（events 按月分区）
+            per_client: 每个客户端同时执行的查询数
+            queue_depth: 每个客户端最多排队等待的查询数
+            queue_timeout: 排队等待的最长时间（秒）
+            heavy_concurrency: 重查询通道的并发数
+        """
+        self.max_rows = max_rows
+        self.heavy_rows = heavy_rows
+        self.max_partitions = max_partitions
+        self.per_client = per_client
+        self.queue_depth = queue_depth
+        self.queue_timeout = queue_timeout
+        self.heavy_concurrency = heavy_concurrency
+
+        self._lock = threading.Condition()
+        self._running = defaultdict(int)   # 客户端 -> 执行中的查询数
+        self._waiting = defaultdict(int)   # 客户端 -> 排队中的查询数
+        self._heavy = threading.Semaphore(heavy_concurrency)
+        self.counters = defaultdict(int)
+
+    @contextmanager
+    def client_slot(self, client):
+        """占用客户端的一个执行名额，已满时排队等待"""
+        with self._lock:
+            if self._running[client] >= self.per_client:
+                if self._waiting[client] >= self.queue_depth:
+                    self.counters['rejected_queue_full'] += 1
+                    raise AdmissionRejected(
+                        f"该客户端已有 {self._running[client]} 个查询执行、{self._waiting[client]} 个排队，请稍后重试", 429)
+                self._waiting[client] += 1
+                self.counters['queued'] += 1
+                try:
+                    admitted = self._lock.wait_for(
+                        lambda: self._running[client] < self.per_client, self.queue_timeout)
+                finally:
+                    self._waiting[client] -= 1
+                if not admitted:
+                    self.counters['rejected_queue_timeout'] += 1
+                    raise AdmissionRejected(f"排队等待超过 {self.queue_timeout} 秒，请稍后重试", 429)
+            self._running[client] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._running[client] -= 1
+                if not self._running[client]:
+                    del self._running[client]
+                if not self._waiting[client]:
+                    self._waiting.pop(client, None)
+                self._lock.notify_all()
+
+    def check(self, cost):
+        """按预算检查代价：超过硬上限时抛出 AdmissionRejected，返回是否为重查询"""
+        if cost.rows_examined > self.max_rows:
+            self.counters['rejected_cost'] += 1
+            raise AdmissionRejected(
+                f"预估扫描 {cost.rows_examined:,} 行，超过上限 {self.max_rows:,} 行；"
+                f"请增加能走索引的过滤条件（如 created_at_date 范围）", 422, cost)
+        if cost.partitions > self.max_partitions:
+            self.counters['rejected_cost'] += 1
+            raise AdmissionRejected(
+                f"需要访问 {cost.partitions} 个分区，超过上限 {self.max_partitions} 个；"
+                f"请按 created_at_date 限定时间范围", 422, cost)
+        return cost.rows_examined > self.heavy_rows
+
+    @contextmanager
+    def lane(self, heavy):
+        """重查询在专用通道中排队（并发 heavy_concurrency），普通查询直接执行"""
+        if not heavy:
+            self.counters['admitted'] += 1
+            yield
+            return
+        if not self._heavy.acquire(timeout=self.queue_timeout):
+            self.counters['rejected_queue_timeout'] += 1
+            raise AdmissionRejected(f"重查询通道排队超过 {self.queue_timeout} 秒，请稍后重试", 429)
+        self.counters['admitted_heavy'] += 1
+        try:
+            yield
+        finally:
+            self._heavy.release()
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self.counters,
+                running=sum(self._running.values()),
+                waiting=sum(self._waiting.values()),
+                clients=len(self._running),
+            )
+
+
+class AsyncAdmission:
+    """AdmissionController 的协程版本（ASGI 服务使用）：限额和计数取自同一个 controller，等待不阻塞事件循环"""
+
+    def __init__(self, controller):
+        self.controller = controller
+        self._cond = None
+        self._heavy = None
+        self._running = defaultdict(int)
+        self._waiting = defaultdict(int)
+
+    def _primitives(self):
+        # 在事件循环中首次使用时创建
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+            self._heavy = asyncio.Semaphore(self.controller.heavy_concurrency)
+        return self._cond, self._heavy
+
+    @asynccontextmanager
+    async def client_slot(self, client):
+        """占用客户端的一个执行名额，已满时排队等待"""
+        controller = self.controller
+        cond, _ = self._primitives()
+        async with cond:
+            if self._running[client] >= controller.per_client:
+                if self._waiting[client] >= controller.queue_depth:
+                    controller.counters['rejected_queue_full'] += 1
+                    raise AdmissionRejected(
+                        f"该客户端已有 {self._running[client]} 个查询执行、{self._waiting[client]} 个排队，请稍后重试", 429)
+                self._waiting[client] += 1
+                controller.counters['queued'] += 1
+                try:
+                    await asyncio.wait_for(
+                        cond.wait_for(lambda: self._running[client] < controller.per_client),
+                        controller.queue_timeout)
+                except asyncio.TimeoutError:
+                    controller.counters['rejected_queue_timeout'] += 1
+                    raise AdmissionRejected(f"排队等待超过 {controller.queue_timeout} 秒，请稍后重试", 429)
+                finally:
+                    self._waiting[client] -= 1
+            self._running[client] += 1
+        try:
+            yield
+        finally:
+            async with cond:
+                self._running[client] -= 1
+                if not self._running[client]:
+                    del self._running[client]
+                if not self._waiting[client]:
+                    self._waiting.pop(client, None)
+                cond.notify_all()
+
+    @asynccontextmanager
+    async def lane(self, heavy):
+        """重查询在专用通道中排队，普通查询直接执行"""
+        controller = self.controller
+        if not heavy:
+            controller.counters['admitted'] += 1
+            yield
+            return
+        _, semaphore = self._primitives()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), controller.queue_timeout)
+        except asyncio.TimeoutError:
+            controller.counters['rejected_queue_timeout'] += 1
+            raise AdmissionRejected(f"重查询通道排队超过 {controller.queue_timeout} 秒，请稍后重试", 429)
+        controller.counters['admitted_heavy'] += 1
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+    def stats(self):
+        return dict(
+            self.controller.counters,
+            running=sum(self._running.values()),
+            waiting=sum(self._waiting.values()),
+            clients=len(self._running),
+        )
@@ -4,14 +4,24 @@
 GHPulse 数据查询Web应用
 """
 
-from flask import Flask, jsonify, request, render_template
+from flask import Flask, Response, jsonify, request, render_template
 import pymysql
 from pymysql import cursors
 import os
+import json
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import date, datetime
 import logging
 import traceback
+from contextlib import ExitStack
+from db_pool import ConnectionPool, PoolTimeout
+from response_cache import ResponseCache, LocalBackend, RedisBackend
+from table_pages import PAGE_TABLES, MAX_PAGE_SIZE, InvalidCursor, TableMetadata, fetch_page
+from query_export import QueryExporter, ExportBusy, FORMATS as EXPORT_FORMATS
+from admission import AdmissionController, AdmissionRejected, explain_cost
+from query_cache import QueryResultCache, normalize_sql
+from event_type_stats import GRANULARITIES, parse_date, event_type_counts, summarize
+from trending import SchemaInfo, StaleWhileRevalidate, fallback_repos, fallback_developers
 
 # 配置日志
 logging.basicConfig(
@@ -38,6 +48,35 @@ DB_CONFIG = {
     'connect_timeout': 10
 }
 
+# 连接池配置
+db_pool = ConnectionPool(
+    DB_CONFIG,
+    max_size=int(os.getenv('DB_POOL_SIZE', 10)),
+    timeout=float(os.getenv('DB_POOL_TIMEOUT', 5)),
+    max_lifetime=int(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+)
+
+# 自定义查询的准入控制：代价预算、按客户端的并发与排队、连接池中给仪表盘接口预留的连接数
+admission = AdmissionController(
+    max_rows=int(os.getenv('QUERY_MAX_ROWS_EXAMINED', 10_000_000)),
+    heavy_rows=int(os.getenv('QUERY_HEAVY_ROWS', 1_000_000)),
+    max_partitions=int(os.getenv('QUERY_MAX_PARTITIONS', 12)),
+    per_client=int(os.getenv('QUERY_PER_CLIENT', 2)),
+    queue_depth=int(os.getenv('QUERY_QUEUE_DEPTH', 4)),
+    queue_timeout=float(os.getenv('QUERY_QUEUE_TIMEOUT', 10)),
+)
+QUERY_POOL_RESERVE = min(int(os.getenv('QUERY_POOL_RESERVE', 3)), db_pool.max_size - 1)
+
+# 自定义查询结果缓存：压缩后总字节数上限、单条上限、最长保留时间
+query_cache = QueryResultCache(
+    max_bytes=int(os.getenv('QUERY_CACHE_BYTES', 64 * 1024 * 1024)),
+    max_entry_bytes=int(os.getenv('QUERY_CACHE_MAX_ENTRY_BYTES', 2 * 1024 * 1024)),
+    ttl=int(os.getenv('QUERY_CACHE_TTL', 300)),
+)
+
+# 冷数据归档目录（与 archive_events.py 的 ARCHIVE_DIR 一致）
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', 'archive')
+
 # 显示配置（隐藏密码）
 logger.info("=" * 60)
 logger.info("数据库配置:")
@@ -45,21 +84,68 @@ logger.info(f"  Host: {DB_CONFIG['host']}")
 logger.info(f"  Port: {DB_CONFIG['port']}")
 logger.info(f"  User: {DB_CONFIG['user']}")
 logger.info(f"  Database: {DB_CONFIG['database']}")
+logger.info(f"  Pool: 最多 {db_pool.max_size} 个连接，借用超时 {db_pool.timeout} 秒")
 logger.info("=" * 60)
 
 
-def get_db_connection():
-    """获取数据库连接"""
+def get_db_connection(reserve=0):
+    """从连接池借用数据库连接（conn.close() 归还；reserve 见 ConnectionPool.get）"""
     try:
-        conn = pymysql.connect(**DB_CONFIG)
-        logger.debug("数据库连接成功")
-        return conn
+        return db_pool.get(reserve)
+    except PoolTimeout as e:
+        logger.error(f"数据库连接池已满: {e} {db_pool.stats()}")
+        raise
     except Exception as e:
         logger.error(f"数据库连接失败: {e}")
         logger.error(traceback.format_exc())
         raise
 
 
+def _load_data_versions():
+    """读取 ETL 任务维护的数据版本号（响应缓存键的一部分）"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name, version FROM data_versions")
+        versions = {row['name']: row['version'] for row in cursor.fetchall()}
+        cursor.close()
+        return versions
+    finally:
+        conn.close()
+
+
+def _cache_backend():
+    """配置 REDIS_URL 时使用 Redis 共享缓存（需安装 redis），否则使用进程内 LRU"""
+    redis_url = os.getenv('REDIS_URL')
+    if redis_url:
+        try:
+            return RedisBackend(redis_url)
+        except ImportError:
+            logger.warning("已配置 REDIS_URL 但未安装 redis，改用进程内缓存")
+    return LocalBackend(int(os.getenv('RESPONSE_CACHE_SIZE', 512)))
+
+
+response_cache = ResponseCache(_cache_backend(), _load_data_versions)
+
+# 表浏览的列信息和总行数缓存
+table_metadata = TableMetadata()
+
+# 表和列信息：启动时读取一次，之后按间隔在后台刷新
+schema_info = SchemaInfo(get_db_connection, interval=int(os.getenv('SCHEMA_REFRESH_INTERVAL', 600)))
+schema_info.refresh()
+
+# 热门榜单降级结果（stale-while-revalidate）
+trending_fallback = StaleWhileRevalidate(fresh_for=int(os.getenv('TRENDING_FALLBACK_FRESH', 300)))
+
+# 流式导出：独立连接（不占用连接池），KILL QUERY 借用连接池中的连接执行
+query_exporter = QueryExporter(
+    DB_CONFIG,
+    get_db_connection,
+    max_concurrent=int(os.getenv('EXPORT_MAX_CONCURRENT', 2)),
+    max_execution_time=float(os.getenv('EXPORT_MAX_EXECUTION_TIME', 600)),
+)
+
+
 # ==================== 前端路由 ====================
 
 @app.route('/')
@@ -79,12 +165,12 @@ def index():
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """健康检查"""
+    conn = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT 1")
         cursor.close()
-        conn.close()
         return jsonify({
             'status': 'ok', 
             'message': '数据库连接正常',
@@ -92,18 +178,27 @@ def health_check():
                 'host': DB_CONFIG['host'],
                 'port': DB_CONFIG['port'],
                 'database': DB_CONFIG['database']
-            }
+            },
+            'pool': db_pool.stats(),
+            'cache': response_cache.stats(),
+            'admission': admission.stats(),
+            'query_cache': query_cache.stats()
         })
     except Exception as e:
         logger.error(f"健康检查失败: {e}")
         return jsonify({
             'status': 'error', 
             'message': str(e),
+            'pool': db_pool.stats(),
             'traceback': traceback.format_exc()
-        }), 500
+        }), 503 if isinstance(e, PoolTimeout) else 500
+    finally:
+        if conn:
+            conn.close()
 
 
 @app.route('/api/tables', methods=['GET'])
+@response_cache.cached(ttl=300, depends=('events', 'stats', 'archive'))
 def get_tables():
     """获取所有表及其统计信息"""
     conn = None
@@ -154,36 +249,23 @@ def get_tables():
 
 @app.route('/api/table/<table_name>', methods=['GET'])
 def get_table_data(table_name):
-    """获取表数据（分页）"""
+    """获取表数据（按主键键集分页，cursor 为上一次返回的 next_cursor / prev_cursor）"""
     conn = None
     try:
-        page = int(request.args.get('page', 1))
-        page_size = int(request.args.get('page_size', 20))
-        offset = (page - 1) * page_size
+        page_size = min(max(int(request.args.get('page_size', 20)), 1), MAX_PAGE_SIZE)
+        token = request.args.get('cursor') or None
         
         # 验证表名（防止SQL注入）
-        valid_tables = [
-            'actors', 'repos', 'organizations', 'events',
-            'payload_push', 'payload_issue', 'payload_pull_request',
-            'payload_star', 'payload_fork', 'payload_create', 'payload_delete',
-            'payload_watch',
-            'hot_repos', 'active_developers', 'event_stats_daily',
-            'user_repo_relation', 'repo_stats_cache', 'actor_stats_cache'
-        ]
-        
-        if table_name not in valid_tables:
+        if table_name not in PAGE_TABLES:
             return jsonify({'success': False, 'error': f'无效的表名: {table_name}'}), 400
         
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # 获取总行数
-        cursor.execute(f"SELECT COUNT(*) as total FROM `{table_name}`")
-        total = cursor.fetchone()['total']
-        
-        # 获取数据
-        cursor.execute(f"SELECT * FROM `{table_name}` LIMIT %s OFFSET %s", (page_size, offset))
-        rows = cursor.fetchall()
+        try:
+            rows, next_cursor, prev_cursor = fetch_page(cursor, table_name, page_size, token)
+        except InvalidCursor as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
         # 转换datetime为字符串
         for row in rows:
@@ -191,17 +273,9 @@ def get_table_data(table_name):
                 if isinstance(value, datetime):
                     row[key] = value.isoformat()
         
-        # 获取列信息
-        cursor.execute(f"DESCRIBE `{table_name}`")
-        columns = [
-            {
-                'field': col['Field'],
-                'type': col['Type'],
-                'key': col['Key'],
-                'comment': col.get('Extra', '')
-            }
-            for col in cursor.fetchall()
-        ]
+        # 列信息和总行数按表缓存，不再每页 DESCRIBE / COUNT(*)
+        columns = table_metadata.columns(cursor, table_name)
+        total, estimated = table_metadata.total(cursor, table_name, DB_CONFIG['database'])
         
         cursor.close()
         
@@ -211,10 +285,11 @@ def get_table_data(table_name):
                 'rows': rows,
                 'columns': columns,
                 'pagination': {
-                    'page': page,
                     'page_size': page_size,
                     'total': total,
-                    'total_pages': (total + page_size - 1) // page_size
+                    'total_estimated': estimated,
+                    'next_cursor': next_cursor,
+                    'prev_cursor': prev_cursor
                 }
             }
         })
@@ -232,41 +307,98 @@ def get_table_data(table_name):
             conn.close()
 
 
+def _client_id():
+    """准入控制按客户端地址计数（部署在反向代理后时需用 ProxyFix 还原真实地址）"""
+    return request.remote_addr or 'unknown'
+
+
+def _check_select(sql):
+    """只读检查：返回错误信息，通过时返回 None"""
+    if not sql:
+        return 'SQL不能为空'
+    
+    # 安全检查：只允许SELECT语句
+    sql_upper = sql.upper()
+    if not sql_upper.startswith('SELECT'):
+        return '只允许执行SELECT查询'
+    
+    # 禁止的关键字
+    forbidden_keywords = ['INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE', 'ALTER', 'TRUNCATE']
+    for keyword in forbidden_keywords:
+        if keyword in sql_upper:
+            return f'禁止使用 {keyword} 语句'
+    return None
+
+
 @app.route('/api/query', methods=['POST'])
 def execute_query():
-    """执行自定义SQL查询（只读）"""
+    """
+    执行自定义SQL查询（只读）
+    
+    请求体可为 JSON 或表单；带 format=ndjson/csv 时不限行数、流式返回（见 _stream_query）
+    """
     conn = None
     try:
-        data = request.get_json()
-        sql = data.get('sql', '').strip()
-        
-        if not sql:
-            return jsonify({'success': False, 'error': 'SQL不能为空'}), 400
-        
-        # 安全检查：只允许SELECT语句
+        data = request.get_json(silent=True) or request.form
+        # 去掉末尾分号（前端示例语句带分号），以便追加 LIMIT 和 EXPLAIN
+        sql = data.get('sql', '').strip().rstrip(';').rstrip()
+        
+        error = _check_select(sql)
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
+        
+        export_format = data.get('format')
+        if export_format:
+            if export_format not in EXPORT_FORMATS:
+                return jsonify({'success': False, 'error': f'不支持的导出格式: {export_format}'}), 400
+            # 导出同样经过代价预检和准入控制，客户端名额和重查询通道占用到流式响应结束
+            holds = ExitStack()
+            try:
+                holds.enter_context(admission.client_slot(_client_id()))
+                conn = get_db_connection(reserve=QUERY_POOL_RESERVE)
+                cursor = conn.cursor()
+                cost = explain_cost(cursor, sql)
+                cursor.close()
+                conn.close()
+                conn = None
+                holds.enter_context(admission.lane(admission.check(cost)))
+            except BaseException:
+                holds.close()
+                raise
+            return _stream_query(sql, export_format, holds)
         sql_upper = sql.upper()
-        if not sql_upper.startswith('SELECT'):
-            return jsonify({'success': False, 'error': '只允许执行SELECT查询'}), 400
-        
-        # 禁止的关键字
-        forbidden_keywords = ['INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE', 'ALTER', 'TRUNCATE']
-        for keyword in forbidden_keywords:
-            if keyword in sql_upper:
-                return jsonify({'success': False, 'error': f'禁止使用 {keyword} 语句'}), 400
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
         
         # 限制返回行数
         max_rows = 1000
         if 'LIMIT' not in sql_upper:
             sql = f"{sql} LIMIT {max_rows}"
         
-        # 执行查询
-        start_time = datetime.now()
-        cursor.execute(sql)
-        rows = cursor.fetchall()
-        execution_time = (datetime.now() - start_time).total_seconds()
+        # 结果缓存：规范化 SQL + 数据版本号，命中时不经过准入控制、不访问数据库
+        normalized, cacheable = normalize_sql(sql)
+        cache_key = query_cache.make_key(normalized, response_cache.versions()) if cacheable else None
+        cached = query_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            return jsonify({'success': True, 'data': dict(json.loads(cached), cached=True)})
+        
+        with admission.client_slot(_client_id()):
+            # 代价预检：EXPLAIN 估算扫描行数和分区数，超预算拒绝，重查询排队
+            conn = get_db_connection(reserve=QUERY_POOL_RESERVE)
+            cursor = conn.cursor()
+            cost = explain_cost(cursor, sql)
+            cursor.close()
+            conn.close()
+            conn = None
+            heavy = admission.check(cost)
+            
+            with admission.lane(heavy):
+                conn = get_db_connection(reserve=QUERY_POOL_RESERVE)
+                cursor = conn.cursor()
+                
+                # 执行查询
+                start_time = datetime.now()
+                cursor.execute(sql)
+                rows = cursor.fetchall()
+                execution_time = (datetime.now() - start_time).total_seconds()
         
         # 转换datetime
         for row in rows:
@@ -279,16 +411,33 @@ def execute_query():
         
         cursor.close()
         
+        result = {
+            'rows': rows,
+            'columns': columns,
+            'count': len(rows),
+            'execution_time': execution_time,
+            'cost': cost.to_dict()
+        }
+        if cache_key:
+            query_cache.put(cache_key, app.json.dumps(result).encode('utf-8'))
+        else:
+            query_cache.note_uncacheable()
+        
         return jsonify({
             'success': True,
-            'data': {
-                'rows': rows,
-                'columns': columns,
-                'count': len(rows),
-                'execution_time': execution_time
-            }
+            'data': dict(result, cached=False)
         })
     
+    except AdmissionRejected as e:
+        logger.warning(f"查询未准入: {e}")
+        response = jsonify({
+            'success': False,
+            'error': str(e),
+            'cost': e.cost.to_dict() if e.cost else None
+        })
+        if e.status == 429:
+            response.headers['Retry-After'] = str(int(admission.queue_timeout))
+        return response, e.status
     except Exception as e:
         logger.error(f"查询执行失败: {e}")
         logger.error(traceback.format_exc())
@@ -302,7 +451,41 @@ def execute_query():
             conn.close()
 
 
+def _stream_query(sql, export_format, holds):
+    """
+    流式导出查询结果（独立连接 + SSCursor，客户端断开时终止查询）
+    
+    holds 为已占用的准入名额（ExitStack），响应关闭时（发送结束或客户端断开）释放
+    """
+    compress = 'gzip' in request.headers.get('Accept-Encoding', '')
+    try:
+        body = query_exporter.start(sql, export_format, compress)
+    except ExportBusy as e:
+        holds.close()
+        return jsonify({'success': False, 'error': str(e)}), 429
+    except pymysql.MySQLError as e:
+        holds.close()
+        logger.error(f"导出查询失败: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except BaseException:
+        holds.close()
+        raise
+    
+    filename = f"query_{datetime.now():%Y%m%d-%H%M%S}.{export_format}"
+    response = Response(body, mimetype=EXPORT_FORMATS[export_format])
+    response.call_on_close(holds.close)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # 关闭反向代理缓冲，逐块转发给客户端
+    response.headers['X-Accel-Buffering'] = 'no'
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+    logger.info(f"开始流式导出（{export_format}{'，gzip' if compress else ''}）: {sql[:200]}")
+    return response
+
+
 @app.route('/api/stats/overview', methods=['GET'])
+@response_cache.cached(ttl=60, depends=('events', 'stats', 'archive'))
 def get_overview_stats():
     """获取总体统计"""
     conn = None
@@ -310,24 +493,24 @@ def get_overview_stats():
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        stats = {}
-        
-        cursor.execute("SELECT COUNT(*) as total FROM events")
-        stats['total_events'] = cursor.fetchone()['total']
-        
-        cursor.execute("SELECT COUNT(*) as total FROM actors")
-        stats['total_actors'] = cursor.fetchone()['total']
-        
-        cursor.execute("SELECT COUNT(*) as total FROM repos")
-        stats['total_repos'] = cursor.fetchone()['total']
-        
-        cursor.execute("SELECT COUNT(*) as total FROM organizations")
-        stats['total_orgs'] = cursor.fetchone()['total']
-        
-        cursor.execute("SELECT MAX(created_at) as latest FROM events")
-        result = cursor.fetchone()
-        latest = result['latest'] if result else None
-        stats['latest_event'] = latest.isoformat() if latest else None
+        # 计数器由摄取增量维护，一次主键查询代替各表 COUNT(*) 全索引扫描
+        cursor.execute("""
+            SELECT total_events, total_actors, total_repos, total_orgs, latest_event, updated_at
+            FROM overview_counters
+            WHERE id = 1
+        """)
+        row = cursor.fetchone() or {}
+        
+        latest = row.get('latest_event')
+        updated_at = row.get('updated_at')
+        stats = {
+            'total_events': row.get('total_events', 0),
+            'total_actors': row.get('total_actors', 0),
+            'total_repos': row.get('total_repos', 0),
+            'total_orgs': row.get('total_orgs', 0),
+            'latest_event': latest.isoformat() if latest else None,
+            'counters_updated_at': updated_at.isoformat() if updated_at else None
+        }
         
         cursor.close()
         
@@ -349,29 +532,40 @@ def get_overview_stats():
 
 
 @app.route('/api/stats/event_types', methods=['GET'])
+@response_cache.cached(ttl=300, depends=('events', 'stats'))
 def get_event_type_stats():
-    """获取事件类型分布"""
+    """
+    获取事件类型分布
+    
+    参数：from / to（YYYY-MM-DD，默认全部历史到今天）、granularity（total/day/week/month，默认 total）。
+    已汇总的日期读 event_stats_daily，只有尚未重算的日期从 events 实时统计。
+    """
     conn = None
     try:
+        granularity = request.args.get('granularity', 'total')
+        if granularity not in GRANULARITIES:
+            return jsonify({'success': False, 'error': f'无效的 granularity: {granularity}'}), 400
+        try:
+            date_from = parse_date(request.args.get('from'), 'from')
+            date_to = parse_date(request.args.get('to'), 'to') or date.today()
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        if date_from and date_from > date_to:
+            return jsonify({'success': False, 'error': 'from 不能晚于 to'}), 400
+        
         conn = get_db_connection()
         cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT 
-                event_type,
-                COUNT(*) as count
-            FROM events
-            GROUP BY event_type
-            ORDER BY count DESC
-            LIMIT 20
-        """)
-        
-        results = cursor.fetchall()
+        counts, meta = event_type_counts(cursor, date_from, date_to)
         cursor.close()
         
         return jsonify({
             'success': True,
-            'data': results
+            'data': summarize(counts, granularity),
+            'meta': dict(
+                meta,
+                granularity=granularity,
+                **{'from': date_from.isoformat() if date_from else None, 'to': date_to.isoformat()}
+            )
         })
     
     except Exception as e:
@@ -382,24 +576,39 @@ def get_event_type_stats():
             conn.close()
 
 
+def _fallback(name, limit, query):
+    """降级查询：结果保留在内存中，过期后先返回旧结果并在后台重算"""
+    def compute():
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            rows = query(cursor, schema_info, limit)
+            cursor.close()
+            return rows
+        finally:
+            conn.close()
+
+    rows, computed_at, stale = trending_fallback.get((name, limit), compute)
+    return rows, {
+        'computed_at': datetime.fromtimestamp(computed_at).isoformat(timespec='seconds'),
+        'stale': stale,
+    }
+
+
 @app.route('/api/trending/repos', methods=['GET'])
+@response_cache.cached(ttl=300, depends=('events', 'stats'))
 def get_trending_repos():
-    """获取热门仓库（自动降级）"""
+    """获取热门仓库（hot_repos 为空时降级为有界的实时统计）"""
     conn = None
     try:
-        limit = int(request.args.get('limit', 10))
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # 先尝试从热门表获取
-        cursor.execute("SHOW TABLES LIKE 'hot_repos'")
-        table_exists = cursor.fetchone()
+        limit = min(int(request.args.get('limit', 10)), 100)
         
         repos = []
         source = 'empty'
         
-        if table_exists:
+        if schema_info.has_table('hot_repos'):
+            conn = get_db_connection()
+            cursor = conn.cursor()
             cursor.execute("""
                 SELECT 
                     repo_id,
@@ -414,62 +623,24 @@ def get_trending_repos():
                 LIMIT %s
             """, (limit,))
             repos = cursor.fetchall()
+            cursor.close()
+            conn.close()
+            conn = None
             source = 'cached'
         
-        # 如果热门表为空或不存在，使用降级查询
+        result = {}
         if not repos:
             logger.warning("hot_repos表为空，使用降级查询")
-            
-            # 检查 repos 表的实际列名
-            cursor.execute("SHOW COLUMNS FROM repos")
-            columns = [row['Field'] for row in cursor.fetchall()]
-            logger.info(f"repos表列名: {columns}")
-            
-            # 使用实际的列名（根据你的表结构调整）
-            name_column = 'name' if 'name' in columns else 'full_name'
-            stars_column = 'total_stars' if 'total_stars' in columns else 'stargazers_count'
-            
-            cursor.execute(f"""
-                SELECT 
-                    r.repo_id,
-                    r.{name_column} as repo_name,
-                    COALESCE(r.{stars_column}, 0) as score,
-                    COUNT(CASE 
-                        WHEN e.event_type = 'WatchEvent' 
-                        AND e.created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY) 
-                        THEN 1 
-                    END) as stars_7d,
-                    COUNT(CASE 
-                        WHEN e.event_type = 'ForkEvent' 
-                        AND e.created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY) 
-                        THEN 1 
-                    END) as forks_7d,
-                    COUNT(CASE 
-                        WHEN e.event_type = 'PullRequestEvent' 
-                        AND e.created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY) 
-                        THEN 1 
-                    END) as prs_7d,
-                    ROW_NUMBER() OVER (ORDER BY r.{stars_column} DESC) as rank_position
-                FROM repos r
-                LEFT JOIN events e ON r.repo_id = e.repo_id 
-                    AND e.created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY)
-                GROUP BY r.repo_id, r.{name_column}, r.{stars_column}
-                ORDER BY score DESC
-                LIMIT %s
-            """, (limit,))
-            repos = cursor.fetchall()
+            repos, result['fallback'] = _fallback('repos', limit, fallback_repos)
             source = 'realtime'
         
-        cursor.close()
-        
         logger.info(f"返回 {len(repos)} 个热门仓库 (来源: {source})")
-        if repos and len(repos) > 0:
-            logger.info(f"第一条数据: {repos[0]}")
         
         return jsonify({
             'success': True,
             'data': repos,
-            'source': source
+            'source': source,
+            **result
         })
     
     except Exception as e:
@@ -482,23 +653,19 @@ def get_trending_repos():
 
 
 @app.route('/api/trending/developers', methods=['GET'])
+@response_cache.cached(ttl=300, depends=('events', 'stats'))
 def get_trending_developers():
-    """获取活跃开发者（自动降级）"""
+    """获取活跃开发者（active_developers 为空时降级为有界的实时统计）"""
     conn = None
     try:
-        limit = int(request.args.get('limit', 10))
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # 先尝试从活跃表获取
-        cursor.execute("SHOW TABLES LIKE 'active_developers'")
-        table_exists = cursor.fetchone()
+        limit = min(int(request.args.get('limit', 10)), 100)
         
         developers = []
         source = 'empty'
         
-        if table_exists:
+        if schema_info.has_table('active_developers'):
+            conn = get_db_connection()
+            cursor = conn.cursor()
             cursor.execute("""
                 SELECT 
                     actor_id,
@@ -513,62 +680,24 @@ def get_trending_developers():
                 LIMIT %s
             """, (limit,))
             developers = cursor.fetchall()
+            cursor.close()
+            conn.close()
+            conn = None
             source = 'cached'
         
-        # 如果活跃表为空或不存在，使用降级查询
+        result = {}
         if not developers:
             logger.warning("active_developers表为空，使用降级查询")
-            
-            # 检查 actors 表的实际列名
-            cursor.execute("SHOW COLUMNS FROM actors")
-            columns = [row['Field'] for row in cursor.fetchall()]
-            logger.info(f"actors表列名: {columns}")
-            
-            # 使用实际的列名
-            login_column = 'login' if 'login' in columns else 'username'
-            events_column = 'total_events' if 'total_events' in columns else 'public_events'
-            
-            cursor.execute(f"""
-                SELECT 
-                    a.actor_id,
-                    a.{login_column} as actor_login,
-                    COALESCE(a.{events_column}, 0) as activity_score,
-                    COUNT(CASE 
-                        WHEN e.event_type = 'PushEvent' 
-                        AND e.created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY) 
-                        THEN 1 
-                    END) as commits_7d,
-                    COUNT(CASE 
-                        WHEN e.event_type = 'PullRequestEvent' 
-                        AND e.created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY) 
-                        THEN 1 
-                    END) as prs_7d,
-                    COUNT(CASE 
-                        WHEN e.event_type = 'IssuesEvent' 
-                        AND e.created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY) 
-                        THEN 1 
-                    END) as issues_7d,
-                    ROW_NUMBER() OVER (ORDER BY a.{events_column} DESC) as rank_position
-                FROM actors a
-                LEFT JOIN events e ON a.actor_id = e.actor_id 
-                    AND e.created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY)
-                GROUP BY a.actor_id, a.{login_column}, a.{events_column}
-                ORDER BY activity_score DESC
-                LIMIT %s
-            """, (limit,))
-            developers = cursor.fetchall()
+            developers, result['fallback'] = _fallback('developers', limit, fallback_developers)
             source = 'realtime'
         
-        cursor.close()
-        
         logger.info(f"返回 {len(developers)} 个活跃开发者 (来源: {source})")
-        if developers and len(developers) > 0:
-            logger.info(f"第一条数据: {developers[0]}")
         
         return jsonify({
             'success': True,
             'data': developers,
-            'source': source
+            'source': source,
+            **result
         })
     
     except Exception as e:
@@ -580,6 +709,204 @@ def get_trending_developers():
             conn.close()
 
 
+@app.route('/api/repo/<int:repo_id>/activity', methods=['GET'])
+def get_repo_activity(repo_id):
+    """获取仓库任意时间窗口内的活跃度（读取小时汇总表，最多720个桶）"""
+    conn = None
+    try:
+        hours = int(request.args.get('hours', 24 * 7))
+        if hours < 1 or hours > 720:
+            return jsonify({'success': False, 'error': 'hours 必须在 1-720 之间'}), 400
+        
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT 
+                COALESCE(SUM(event_count), 0) as events,
+                COALESCE(SUM(star_count), 0) as stars,
+                COALESCE(SUM(fork_count), 0) as forks,
+                COALESCE(SUM(pr_count), 0) as prs,
+                COALESCE(SUM(push_count), 0) as pushes,
+                COALESCE(SUM(issue_count), 0) as issues,
+                COUNT(*) as buckets
+            FROM repo_activity_hourly
+            WHERE repo_id = %s
+              AND stats_hour >= DATE_SUB(NOW(), INTERVAL %s HOUR)
+        """, (repo_id, hours))
+        
+        result = cursor.fetchone()
+        cursor.close()
+        
+        # SUM 返回 Decimal，转为 int 便于序列化
+        data = {key: int(value) for key, value in result.items()}
+        data['repo_id'] = repo_id
+        data['hours'] = hours
+        
+        return jsonify({
+            'success': True,
+            'data': data
+        })
+    
+    except Exception as e:
+        logger.error(f"获取仓库活跃度失败: {e}")
+        logger.error(traceback.format_exc())
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
+
+
+@app.route('/api/repo/<int:repo_id>/related', methods=['GET'])
+def get_related_repos(repo_id):
+    """获取相关仓库（读取 related_repos.py 预计算的 repo_related 表）"""
+    conn = None
+    try:
+        kind = request.args.get('kind', 'star')
+        if kind not in ('star', 'contributor'):
+            return jsonify({'success': False, 'error': 'kind 必须是 star 或 contributor'}), 400
+        limit = int(request.args.get('limit', 10))
+        if limit < 1 or limit > 100:
+            return jsonify({'success': False, 'error': 'limit 必须在 1-100 之间'}), 400
+        
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT 
+                rr.related_repo_id as repo_id,
+                r.name as repo_name,
+                rr.shared_actors,
+                rr.score,
+                rr.rank_position,
+                rr.updated_at
+            FROM repo_related rr
+            LEFT JOIN repos r ON r.repo_id = rr.related_repo_id
+            WHERE rr.repo_id = %s AND rr.relation_kind = %s
+            ORDER BY rr.rank_position
+            LIMIT %s
+        """, (repo_id, kind, limit))
+        
+        related = cursor.fetchall()
+        cursor.close()
+        
+        for row in related:
+            row['score'] = float(row['score'])
+        
+        return jsonify({
+            'success': True,
+            'data': related,
+            'repo_id': repo_id,
+            'kind': kind
+        })
+    
+    except Exception as e:
+        logger.error(f"获取相关仓库失败: {e}")
+        logger.error(traceback.format_exc())
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
+
+
+def _archive_events(month, filters, limit):
+    """从归档 Parquet 文件按条件读取事件（谓词下推到行组统计信息）"""
+    import pyarrow.dataset as ds
+    
+    path = os.path.join(ARCHIVE_DIR, 'events', f'month={month}', 'events.parquet')
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"归档文件不存在: {path}")
+    
+    expression = None
+    for column, value in filters.items():
+        condition = ds.field(column) == value
+        expression = condition if expression is None else expression & condition
+    
+    table = ds.dataset(path, format='parquet').head(limit, filter=expression)
+    rows = table.to_pylist()
+    for row in rows:
+        row['created_at'] = row['created_at'].strftime('%Y-%m-%d %H:%M:%S')
+        row['created_at_date'] = row['created_at_date'].isoformat()
+    return rows
+
+
+@app.route('/api/archive/months', methods=['GET'])
+def get_archive_months():
+    """获取已归档的月份"""
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT month, row_count, file_bytes, status, dropped_at
+            FROM events_archive
+            ORDER BY month
+        """)
+        months = cursor.fetchall()
+        cursor.close()
+        
+        return jsonify({
+            'success': True,
+            'data': months
+        })
+    
+    except Exception as e:
+        logger.error(f"获取归档月份失败: {e}")
+        logger.error(traceback.format_exc())
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
+
+
+@app.route('/api/archive/events', methods=['GET'])
+def get_archive_events():
+    """查询已归档月份的事件（读取 Parquet 文件，不访问 events 表）"""
+    conn = None
+    try:
+        month = request.args.get('month', '')
+        try:
+            datetime.strptime(month, '%Y-%m')
+        except ValueError:
+            return jsonify({'success': False, 'error': 'month 格式应为 YYYY-MM'}), 400
+        limit = int(request.args.get('limit', 100))
+        if limit < 1 or limit > 1000:
+            return jsonify({'success': False, 'error': 'limit 必须在 1-1000 之间'}), 400
+        
+        filters = {}
+        for column in ('repo_id', 'actor_id'):
+            if request.args.get(column):
+                filters[column] = int(request.args[column])
+        if request.args.get('event_type'):
+            filters['event_type'] = request.args['event_type']
+        
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT status FROM events_archive WHERE month = %s", (month,))
+        archived = cursor.fetchone()
+        cursor.close()
+        # 只导出未删除分区的月份仍以 events 表为准
+        if not archived or archived['status'] != 'dropped':
+            return jsonify({'success': False, 'error': f'{month} 未归档，请直接查询 events 表'}), 404
+        
+        events = _archive_events(month, filters, limit)
+        
+        return jsonify({
+            'success': True,
+            'data': events,
+            'month': month,
+            'source': 'archive'
+        })
+    
+    except Exception as e:
+        logger.error(f"查询归档事件失败: {e}")
+        logger.error(traceback.format_exc())
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
+
+
 # 错误处理
 @app.errorhandler(404)
 def not_found(e):
@@ -0,0 +1,893 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+GHPulse 数据查询Web应用（ASGI 异步模式）
+- Starlette + aiomysql 异步连接池：等待数据库时不占用线程，少量进程即可承载数千个并发的仪表盘连接
+- 所有查询接口（健康检查、统计、表数据、自定义查询、事件类型分布、热门榜单、仓库、归档）由协程直接处理，
+  路由和 JSON 结构与 app.py 相同；多步查询与同步模式共用 query_steps 分步查询，归档 Parquet 文件在线程中读取
+- 只有流式导出（/api/query 带 format）和前端页面、静态文件交给 Flask 应用在线程池中处理
+- 每个请求有超时；自定义查询超时或客户端断开时取消请求并对该连接执行 KILL QUERY
+
+启动：cd ghpulse_web && uvicorn asgi_app:app --host 0.0.0.0 --port 5000 --workers 4
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+import traceback
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from urllib.parse import parse_qsl
+
+import aiomysql
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+import query_steps
+from app import (
+    app as flask_app, DB_CONFIG, QUERY_POOL_RESERVE,
+    admission, query_cache, table_metadata, schema_info, _check_select, _archive_events,
+)
+from admission import AsyncAdmission, AdmissionRejected, plan_cost
+from event_type_stats import GRANULARITIES, parse_date, event_type_steps, summarize
+from query_cache import normalize_sql
+from response_cache import LocalBackend
+from table_pages import (
+    PAGE_TABLES, MAX_PAGE_SIZE, COUNTER_COLUMNS, ESTIMATE_SQL, InvalidCursor, page_query, page_result,
+)
+from trending import AsyncStaleWhileRevalidate, fallback_repos_steps, fallback_developers_steps
+
+logger = logging.getLogger(__name__)
+
+# 异步连接池大小与借用超时（秒）
+ASYNC_POOL_MIN = int(os.getenv('ASYNC_DB_POOL_MIN', 2))
+ASYNC_POOL_MAX = int(os.getenv('ASYNC_DB_POOL_SIZE', 20))
+ASYNC_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 5))
+
+# 普通接口的请求超时和自定义查询的执行超时（秒）
+REQUEST_TIMEOUT = float(os.getenv('ASYNC_REQUEST_TIMEOUT', 15))
+QUERY_TIMEOUT = float(os.getenv('ASYNC_QUERY_TIMEOUT', 60))
+
+# 挂载的 Flask 应用使用的线程数（同时也受 app.py 连接池 DB_POOL_SIZE 限制）
+WSGI_WORKERS = int(os.getenv('ASGI_WSGI_WORKERS', 10))
+
+# 检查客户端是否断开的间隔（秒）
+DISCONNECT_POLL = 0.5
+
+# 数据版本号的缓存时间（秒），与同步模式的 ResponseCache.version_interval 一致
+VERSION_INTERVAL = 2.0
+
+pool = None
+query_slots = None  # 自定义查询可同时占用的连接数（连接池大小减去给仪表盘接口预留的 QUERY_POOL_RESERVE）
+async_admission = AsyncAdmission(admission)
+
+
+class RequestTimeout(Exception):
+    """请求超过时限"""
+
+
+class ClientGone(Exception):
+    """客户端已断开"""
+
+
+def _json(data, status=200, headers=None):
+    """与 Flask jsonify 相同的序列化规则（日期、Decimal 等），保证两种模式的 JSON 完全一致"""
+    return Response(flask_app.json.dumps(data), status_code=status, headers=headers,
+                    media_type='application/json')
+
+
+@asynccontextmanager
+async def _connection():
+    """从异步连接池借用连接；出错或被取消时关闭连接（可能停在查询中途），不放回池中复用"""
+    try:
+        conn = await asyncio.wait_for(pool.acquire(), ASYNC_POOL_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise RequestTimeout(f"等待数据库连接超过 {ASYNC_POOL_TIMEOUT} 秒")
+    try:
+        yield conn
+    except BaseException:
+        conn.close()
+        raise
+    finally:
+        pool.release(conn)
+
+
+async def _fetchall(conn, sql, params=None):
+    async with conn.cursor() as cursor:
+        await cursor.execute(sql, params)
+        return await cursor.fetchall()
+
+
+async def _fetchone(conn, sql, params=None):
+    rows = await _fetchall(conn, sql, params)
+    return rows[0] if rows else None
+
+
+async def _kill(conn):
+    """用另一个连接终止 conn 上正在执行的语句"""
+    try:
+        async with _connection() as killer:
+            await _fetchall(killer, f"KILL QUERY {int(conn.thread_id())}")
+        logger.warning(f"已终止连接 {conn.thread_id()} 上的查询")
+    except Exception as e:
+        logger.warning(f"终止查询失败: {e}")
+
+
+async def _wait_disconnect(request):
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL)
+
+
+async def _cancellable(request, conn, coro, timeout):
+    """执行 coro；超时或客户端断开时取消它并 KILL QUERY，随后 conn 由 _connection 关闭"""
+    task = asyncio.ensure_future(coro)
+    watcher = asyncio.ensure_future(_wait_disconnect(request))
+    try:
+        done, _ = await asyncio.wait({task, watcher}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    except BaseException:
+        task.cancel()
+        await _kill(conn)
+        raise
+    finally:
+        watcher.cancel()
+    if task in done:
+        return task.result()
+    task.cancel()
+    await _kill(conn)
+    if watcher in done:
+        raise ClientGone("客户端已断开")
+    raise RequestTimeout(f"查询执行超过 {timeout} 秒，已终止")
+
+
+class _AsyncResponseCache:
+    """进程内响应缓存：键含数据版本号（与同步模式相同的失效规则），同一键的并发未命中只查一次库"""
+
+    def __init__(self, max_entries):
+        self.backend = LocalBackend(max_entries)
+        self._versions = {}
+        self._versions_at = 0.0
+        self._flights = {}
+        self.counters = {'hits': 0, 'misses': 0, 'coalesced': 0, 'errors': 0}
+
+    async def versions(self):
+        now = time.monotonic()
+        if now - self._versions_at >= VERSION_INTERVAL:
+            self._versions_at = now
+            try:
+                async with _connection() as conn:
+                    rows = await _fetchall(conn, "SELECT name, version FROM data_versions")
+                self._versions = {row['name']: row['version'] for row in rows}
+            except Exception as e:
+                logger.warning(f"读取数据版本失败，沿用上次的版本: {e}")
+        return self._versions
+
+    def cached(self, ttl, depends):
+        def decorator(view):
+            async def wrapper(request):
+                versions = await self.versions()
+                params = '&'.join(f"{name}={value}" for name, value in sorted(request.query_params.multi_items())
+                                  if value != '')
+                stamp = '.'.join(f"{name}{versions.get(name, 0)}" for name in depends)
+                key = f"{request.url.path}?{params}#{stamp}"
+
+                value = self.backend.get(key)
+                status = 'HIT'
+                if value is not None:
+                    self.counters['hits'] += 1
+                elif key in self._flights:
+                    value = await self._join(self._flights[key])
+                    status = 'COALESCED'
+                if value is None:
+                    value = await self._lead(key, ttl, view, request)
+                    status = 'MISS'
+                media_type, body, code = value
+                return Response(body, status_code=code, media_type=media_type, headers={'X-Cache': status})
+            return wrapper
+        return decorator
+
+    async def _join(self, flight):
+        """等待同一键进行中的查库；它失败或被取消时返回 None，由调用者自行查库"""
+        try:
+            value = await asyncio.shield(flight)
+        except asyncio.CancelledError:
+            if not flight.cancelled():
+                raise  # 本请求自身被取消
+            return None
+        except Exception:
+            return None
+        self.counters['coalesced'] += 1
+        return value
+
+    async def _lead(self, key, ttl, view, request):
+        self.counters['misses'] += 1
+        flight = self._flights[key] = asyncio.get_running_loop().create_future()
+        try:
+            response = await view(request)
+            value = (response.media_type, response.body, response.status_code)
+            if response.status_code == 200:
+                self.backend.set(key, value, ttl)
+            flight.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except Exception as e:
+            flight.set_exception(e)
+            flight.exception()  # 没有等待者时不报未取回的异常
+            raise
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def stats(self):
+        return dict(self.counters, backend='local', size=self.backend.size())
+
+
+response_cache = _AsyncResponseCache(int(os.getenv('RESPONSE_CACHE_SIZE', 512)))
+
+# 热门榜单降级结果（新鲜期与同步模式相同）
+trending_fallback = AsyncStaleWhileRevalidate(fresh_for=int(os.getenv('TRENDING_FALLBACK_FRESH', 300)))
+
+
+def _with_timeout(view):
+    """普通接口的请求超时：超时后取消处理协程（借用的连接随之关闭）"""
+    async def wrapper(request):
+        try:
+            return await asyncio.wait_for(view(request), REQUEST_TIMEOUT)
+        except (asyncio.TimeoutError, RequestTimeout) as e:
+            logger.error(f"请求超时: {request.url.path} {e}")
+            return _json({'success': False, 'error': str(e) or f'请求超过 {REQUEST_TIMEOUT} 秒'}, 504)
+    return wrapper
+
+
+# ==================== API路由 ====================
+
+@_with_timeout
+async def health_check(request):
+    """健康检查"""
+    pool_stats = {'size': pool.size, 'free': pool.freesize, 'max_size': pool.maxsize}
+    try:
+        async with _connection() as conn:
+            await _fetchall(conn, "SELECT 1")
+        return _json({
+            'status': 'ok',
+            'message': '数据库连接正常',
+            'config': {
+                'host': DB_CONFIG['host'],
+                'port': DB_CONFIG['port'],
+                'database': DB_CONFIG['database']
+            },
+            'pool': pool_stats,
+            'cache': response_cache.stats(),
+            'admission': async_admission.stats(),
+            'query_cache': query_cache.stats()
+        })
+    except Exception as e:
+        logger.error(f"健康检查失败: {e}")
+        return _json({
+            'status': 'error',
+            'message': str(e),
+            'pool': pool_stats,
+            'traceback': traceback.format_exc()
+        }, 503 if isinstance(e, RequestTimeout) else 500)
+
+
+@_with_timeout
+@response_cache.cached(ttl=300, depends=('events', 'stats', 'archive'))
+async def get_tables(request):
+    """获取所有表及其统计信息"""
+    try:
+        async with _connection() as conn:
+            tables = await _fetchall(conn, """
+                SELECT
+                    TABLE_NAME as name,
+                    TABLE_COMMENT as comment,
+                    TABLE_ROWS as row_count,
+                    ROUND((DATA_LENGTH + INDEX_LENGTH) / 1024 / 1024, 2) as size_mb,
+                    ENGINE as engine,
+                    CREATE_TIME as created_at
+                FROM information_schema.TABLES
+                WHERE TABLE_SCHEMA = %s
+                ORDER BY TABLE_NAME
+            """, (DB_CONFIG['database'],))
+
+        for table in tables:
+            if table.get('created_at'):
+                table['created_at'] = table['created_at'].isoformat()
+
+        return _json({
+            'success': True,
+            'data': tables,
+            'count': len(tables)
+        })
+
+    except RequestTimeout:
+        raise
+    except Exception as e:
+        logger.error(f"获取表列表失败: {e}")
+        logger.error(traceback.format_exc())
+        return _json({
+            'success': False,
+            'error': str(e),
+            'traceback': traceback.format_exc()
+        }, 500)
+
+
+async def _table_total(conn, table_name):
+    """同 TableMetadata.total，结果写入同一个缓存"""
+    total = table_metadata.cached_total(table_name)
+    if total is None:
+        column = COUNTER_COLUMNS.get(table_name)
+        row = None
+        if column:
+            row = await _fetchone(conn, f"SELECT {column} AS total FROM overview_counters WHERE id = 1")
+        if row:
+            total = (int(row['total']), False)
+        else:
+            row = await _fetchone(conn, ESTIMATE_SQL, (DB_CONFIG['database'], table_name))
+            total = (int(row['total'] or 0) if row else 0, True)
+        table_metadata.store_total(table_name, total)
+    return total
+
+
+@_with_timeout
+async def get_table_data(request):
+    """获取表数据（按主键键集分页，cursor 为上一次返回的 next_cursor / prev_cursor）"""
+    table_name = request.path_params['table_name']
+    try:
+        page_size = min(max(int(request.query_params.get('page_size', 20)), 1), MAX_PAGE_SIZE)
+        token = request.query_params.get('cursor') or None
+
+        if table_name not in PAGE_TABLES:
+            return _json({'success': False, 'error': f'无效的表名: {table_name}'}, 400)
+
+        try:
+            sql, params, state = page_query(table_name, page_size, token)
+        except InvalidCursor as e:
+            return _json({'success': False, 'error': str(e)}, 400)
+
+        async with _connection() as conn:
+            rows, next_cursor, prev_cursor = page_result(await _fetchall(conn, sql, params), state)
+
+            columns = table_metadata.cached_columns(table_name)
+            if columns is None:
+                columns = table_metadata.store_columns(
+                    table_name, await _fetchall(conn, f"DESCRIBE `{table_name}`"))
+            total, estimated = await _table_total(conn, table_name)
+
+        for row in rows:
+            for key, value in list(row.items()):
+                if isinstance(value, datetime):
+                    row[key] = value.isoformat()
+
+        return _json({
+            'success': True,
+            'data': {
+                'rows': rows,
+                'columns': columns,
+                'pagination': {
+                    'page_size': page_size,
+                    'total': total,
+                    'total_estimated': estimated,
+                    'next_cursor': next_cursor,
+                    'prev_cursor': prev_cursor
+                }
+            }
+        })
+
+    except RequestTimeout:
+        raise
+    except Exception as e:
+        logger.error(f"获取表数据失败: {e}")
+        logger.error(traceback.format_exc())
+        return _json({
+            'success': False,
+            'error': str(e),
+            'traceback': traceback.format_exc()
+        }, 500)
+
+
+@asynccontextmanager
+async def _query_connection():
+    """自定义查询借用连接：最多占用 query_slots 个，其余留给仪表盘接口"""
+    try:
+        await asyncio.wait_for(query_slots.acquire(), ASYNC_POOL_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise RequestTimeout(f"等待数据库连接超过 {ASYNC_POOL_TIMEOUT} 秒")
+    try:
+        async with _connection() as conn:
+            yield conn
+    finally:
+        query_slots.release()
+
+
+async def _run_query(request, sql):
+    """代价预检 + 准入 + 执行（可取消），返回结果字典"""
+    async with async_admission.client_slot(request.client.host if request.client else 'unknown'):
+        async with _query_connection() as conn:
+            cost = plan_cost(await _fetchall(conn, f"EXPLAIN {sql}"), sql)
+        heavy = admission.check(cost)
+
+        async with async_admission.lane(heavy):
+            async with _query_connection() as conn:
+                async def execute():
+                    async with conn.cursor() as cursor:
+                        start_time = datetime.now()
+                        await cursor.execute(sql)
+                        rows = await cursor.fetchall()
+                        columns = [desc[0] for desc in cursor.description] if cursor.description else []
+                        return rows, columns, (datetime.now() - start_time).total_seconds()
+
+                rows, columns, execution_time = await _cancellable(request, conn, execute(), QUERY_TIMEOUT)
+
+    for row in rows:
+        for key, value in list(row.items()):
+            if isinstance(value, datetime):
+                row[key] = value.isoformat()
+
+    return {
+        'rows': rows,
+        'columns': columns,
+        'count': len(rows),
+        'execution_time': execution_time,
+        'cost': cost.to_dict()
+    }
+
+
+async def _query_params(request):
+    """请求体（JSON 或 urlencoded 表单）"""
+    body = await request.body()
+    if request.headers.get('content-type', '').startswith('application/json'):
+        try:
+            data = json.loads(body or b'null')
+        except ValueError:
+            data = None
+        return data if isinstance(data, dict) else {}
+    return dict(parse_qsl(body.decode('utf-8', 'replace')))
+
+
+class QueryEndpoint:
+    """
+    /api/query（ASGI 层处理）：带 format 的流式导出转给 Flask 应用处理（准入控制和导出见 app.py 的 execute_query / _stream_query），
+    已读出的请求体重放给 WSGI 层
+    """
+
+    async def __call__(self, scope, receive, send):
+        request = Request(scope, receive)
+        data = await _query_params(request)
+        if data.get('format'):
+            body = await request.body()
+            replayed = False
+
+            async def replay():
+                nonlocal replayed
+                if not replayed:
+                    replayed = True
+                    return {'type': 'http.request', 'body': body, 'more_body': False}
+                return await receive()
+
+            await wsgi_app(scope, replay, send)
+            return
+        response = await execute_query(request, data)
+        await response(scope, receive, send)
+
+
+async def execute_query(request, data):
+    """执行自定义SQL查询（只读）"""
+    try:
+        sql = (data.get('sql') or '').strip().rstrip(';').rstrip()
+        error = _check_select(sql)
+        if error:
+            return _json({'success': False, 'error': error}, 400)
+
+        if 'LIMIT' not in sql.upper():
+            sql = f"{sql} LIMIT 1000"
+
+        normalized, cacheable = normalize_sql(sql)
+        cache_key = query_cache.make_key(normalized, await response_cache.versions()) if cacheable else None
+        cached = query_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            return _json({'success': True, 'data': dict(json.loads(cached), cached=True)})
+
+        result = await _run_query(request, sql)
+        if cache_key:
+            query_cache.put(cache_key, flask_app.json.dumps(result).encode('utf-8'))
+        else:
+            query_cache.note_uncacheable()
+
+        return _json({
+            'success': True,
+            'data': dict(result, cached=False)
+        })
+
+    except AdmissionRejected as e:
+        logger.warning(f"查询未准入: {e}")
+        headers = {'Retry-After': str(int(admission.queue_timeout))} if e.status == 429 else None
+        return _json({
+            'success': False,
+            'error': str(e),
+            'cost': e.cost.to_dict() if e.cost else None
+        }, e.status, headers)
+    except RequestTimeout as e:
+        logger.error(f"查询超时: {e}")
+        return _json({'success': False, 'error': str(e)}, 504)
+    except ClientGone:
+        logger.warning("客户端已断开，查询已终止")
+        return Response(status_code=499)
+    except Exception as e:
+        logger.error(f"查询执行失败: {e}")
+        logger.error(traceback.format_exc())
+        return _json({
+            'success': False,
+            'error': str(e),
+            'traceback': traceback.format_exc()
+        }, 500)
+
+
+@_with_timeout
+@response_cache.cached(ttl=60, depends=('events', 'stats', 'archive'))
+async def get_overview_stats(request):
+    """获取总体统计"""
+    try:
+        async with _connection() as conn:
+            row = await _fetchone(conn, """
+                SELECT total_events, total_actors, total_repos, total_orgs, latest_event, updated_at
+                FROM overview_counters
+                WHERE id = 1
+            """) or {}
+
+        latest = row.get('latest_event')
+        updated_at = row.get('updated_at')
+        return _json({
+            'success': True,
+            'data': {
+                'total_events': row.get('total_events', 0),
+                'total_actors': row.get('total_actors', 0),
+                'total_repos': row.get('total_repos', 0),
+                'total_orgs': row.get('total_orgs', 0),
+                'latest_event': latest.isoformat() if latest else None,
+                'counters_updated_at': updated_at.isoformat() if updated_at else None
+            }
+        })
+
+    except RequestTimeout:
+        raise
+    except Exception as e:
+        logger.error(f"获取统计失败: {e}")
+        logger.error(traceback.format_exc())
+        return _json({
+            'success': False,
+            'error': str(e)
+        }, 500)
+
+
+async def _run_steps(conn, steps):
+    """在 conn 上执行分步查询（见 query_steps）"""
+    return await query_steps.run_async(lambda sql, params: _fetchall(conn, sql, params), steps)
+
+
+@_with_timeout
+@response_cache.cached(ttl=300, depends=('events', 'stats'))
+async def get_event_type_stats(request):
+    """获取事件类型分布（参数与同步模式相同）"""
+    try:
+        granularity = request.query_params.get('granularity', 'total')
+        if granularity not in GRANULARITIES:
+            return _json({'success': False, 'error': f'无效的 granularity: {granularity}'}, 400)
+        try:
+            date_from = parse_date(request.query_params.get('from'), 'from')
+            date_to = parse_date(request.query_params.get('to'), 'to') or date.today()
+        except ValueError as e:
+            return _json({'success': False, 'error': str(e)}, 400)
+        if date_from and date_from > date_to:
+            return _json({'success': False, 'error': 'from 不能晚于 to'}, 400)
+
+        async with _connection() as conn:
+            counts, meta = await _run_steps(conn, event_type_steps(date_from, date_to))
+
+        return _json({
+            'success': True,
+            'data': summarize(counts, granularity),
+            'meta': dict(
+                meta,
+                granularity=granularity,
+                **{'from': date_from.isoformat() if date_from else None, 'to': date_to.isoformat()}
+            )
+        })
+
+    except RequestTimeout:
+        raise
+    except Exception as e:
+        logger.error(f"获取事件类型统计失败: {e}")
+        return _json({'success': False, 'error': str(e)}, 500)
+
+
+async def _fallback(name, limit, steps):
+    """降级查询：结果保留在内存中，过期后先返回旧结果并在后台重算"""
+    async def compute():
+        async with _connection() as conn:
+            return await _run_steps(conn, steps(schema_info, limit))
+
+    rows, computed_at, stale = await trending_fallback.get((name, limit), compute)
+    return rows, {
+        'computed_at': datetime.fromtimestamp(computed_at).isoformat(timespec='seconds'),
+        'stale': stale,
+    }
+
+
+async def _trending(request, table, columns, name, steps, label):
+    """热门榜单：读取预计算表，为空时降级为有界的实时统计"""
+    try:
+        limit = min(int(request.query_params.get('limit', 10)), 100)
+
+        rows = []
+        source = 'empty'
+
+        if schema_info.has_table(table):
+            async with _connection() as conn:
+                rows = await _fetchall(conn, f"""
+                    SELECT {columns}
+                    FROM {table}
+                    ORDER BY rank_position
+                    LIMIT %s
+                """, (limit,))
+            source = 'cached'
+
+        result = {}
+        if not rows:
+            logger.warning(f"{table}表为空，使用降级查询")
+            rows, result['fallback'] = await _fallback(name, limit, steps)
+            source = 'realtime'
+
+        logger.info(f"返回 {len(rows)} 个{label} (来源: {source})")
+
+        return _json({
+            'success': True,
+            'data': rows,
+            'source': source,
+            **result
+        })
+
+    except RequestTimeout:
+        raise
+    except Exception as e:
+        logger.error(f"获取{label}失败: {e}")
+        logger.error(traceback.format_exc())
+        return _json({'success': False, 'error': str(e)}, 500)
+
+
+@_with_timeout
+@response_cache.cached(ttl=300, depends=('events', 'stats'))
+async def get_trending_repos(request):
+    """获取热门仓库（hot_repos 为空时降级为有界的实时统计）"""
+    return await _trending(
+        request, 'hot_repos', 'repo_id, repo_name, score, stars_7d, forks_7d, prs_7d, rank_position',
+        'repos', fallback_repos_steps, '热门仓库')
+
+
+@_with_timeout
+@response_cache.cached(ttl=300, depends=('events', 'stats'))
+async def get_trending_developers(request):
+    """获取活跃开发者（active_developers 为空时降级为有界的实时统计）"""
+    return await _trending(
+        request, 'active_developers',
+        'actor_id, actor_login, activity_score, commits_7d, prs_7d, issues_7d, rank_position',
+        'developers', fallback_developers_steps, '活跃开发者')
+
+
+@_with_timeout
+async def get_repo_activity(request):
+    """获取仓库任意时间窗口内的活跃度（读取小时汇总表，最多720个桶）"""
+    repo_id = request.path_params['repo_id']
+    try:
+        hours = int(request.query_params.get('hours', 24 * 7))
+        if hours < 1 or hours > 720:
+            return _json({'success': False, 'error': 'hours 必须在 1-720 之间'}, 400)
+
+        async with _connection() as conn:
+            result = await _fetchone(conn, """
+                SELECT
+                    COALESCE(SUM(event_count), 0) as events,
+                    COALESCE(SUM(star_count), 0) as stars,
+                    COALESCE(SUM(fork_count), 0) as forks,
+                    COALESCE(SUM(pr_count), 0) as prs,
+                    COALESCE(SUM(push_count), 0) as pushes,
+                    COALESCE(SUM(issue_count), 0) as issues,
+                    COUNT(*) as buckets
+                FROM repo_activity_hourly
+                WHERE repo_id = %s
+                  AND stats_hour >= DATE_SUB(NOW(), INTERVAL %s HOUR)
+            """, (repo_id, hours))
+
+        # SUM 返回 Decimal，转为 int 便于序列化
+        data = {key: int(value) for key, value in result.items()}
+        data['repo_id'] = repo_id
+        data['hours'] = hours
+
+        return _json({
+            'success': True,
+            'data': data
+        })
+
+    except RequestTimeout:
+        raise
+    except Exception as e:
+        logger.error(f"获取仓库活跃度失败: {e}")
+        logger.error(traceback.format_exc())
+        return _json({'success': False, 'error': str(e)}, 500)
+
+
+@_with_timeout
+async def get_related_repos(request):
+    """获取相关仓库（读取 related_repos.py 预计算的 repo_related 表）"""
+    repo_id = request.path_params['repo_id']
+    try:
+        kind = request.query_params.get('kind', 'star')
+        if kind not in ('star', 'contributor'):
+            return _json({'success': False, 'error': 'kind 必须是 star 或 contributor'}, 400)
+        limit = int(request.query_params.get('limit', 10))
+        if limit < 1 or limit > 100:
+            return _json({'success': False, 'error': 'limit 必须在 1-100 之间'}, 400)
+
+        async with _connection() as conn:
+            related = await _fetchall(conn, """
+                SELECT
+                    rr.related_repo_id as repo_id,
+                    r.name as repo_name,
+                    rr.shared_actors,
+                    rr.score,
+                    rr.rank_position,
+                    rr.updated_at
+                FROM repo_related rr
+                LEFT JOIN repos r ON r.repo_id = rr.related_repo_id
+                WHERE rr.repo_id = %s AND rr.relation_kind = %s
+                ORDER BY rr.rank_position
+                LIMIT %s
+            """, (repo_id, kind, limit))
+
+        for row in related:
+            row['score'] = float(row['score'])
+
+        return _json({
+            'success': True,
+            'data': related,
+            'repo_id': repo_id,
+            'kind': kind
+        })
+
+    except RequestTimeout:
+        raise
+    except Exception as e:
+        logger.error(f"获取相关仓库失败: {e}")
+        logger.error(traceback.format_exc())
+        return _json({'success': False, 'error': str(e)}, 500)
+
+
+@_with_timeout
+async def get_archive_months(request):
+    """获取已归档的月份"""
+    try:
+        async with _connection() as conn:
+            months = await _fetchall(conn, """
+                SELECT month, row_count, file_bytes, status, dropped_at
+                FROM events_archive
+                ORDER BY month
+            """)
+
+        return _json({
+            'success': True,
+            'data': months
+        })
+
+    except RequestTimeout:
+        raise
+    except Exception as e:
+        logger.error(f"获取归档月份失败: {e}")
+        logger.error(traceback.format_exc())
+        return _json({'success': False, 'error': str(e)}, 500)
+
+
+@_with_timeout
+async def get_archive_events(request):
+    """查询已归档月份的事件（Parquet 文件在线程中读取，不阻塞事件循环）"""
+    params = request.query_params
+    try:
+        month = params.get('month', '')
+        try:
+            datetime.strptime(month, '%Y-%m')
+        except ValueError:
+            return _json({'success': False, 'error': 'month 格式应为 YYYY-MM'}, 400)
+        limit = int(params.get('limit', 100))
+        if limit < 1 or limit > 1000:
+            return _json({'success': False, 'error': 'limit 必须在 1-1000 之间'}, 400)
+
+        filters = {}
+        for column in ('repo_id', 'actor_id'):
+            if params.get(column):
+                filters[column] = int(params[column])
+        if params.get('event_type'):
+            filters['event_type'] = params['event_type']
+
+        async with _connection() as conn:
+            archived = await _fetchone(conn, "SELECT status FROM events_archive WHERE month = %s", (month,))
+        # 只导出未删除分区的月份仍以 events 表为准
+        if not archived or archived['status'] != 'dropped':
+            return _json({'success': False, 'error': f'{month} 未归档，请直接查询 events 表'}, 404)
+
+        # 超时返回 504 后线程中的读取仍会读完（结果丢弃），最多占用一个默认线程池线程
+        events = await asyncio.to_thread(_archive_events, month, filters, limit)
+
+        return _json({
+            'success': True,
+            'data': events,
+            'month': month,
+            'source': 'archive'
+        })
+
+    except RequestTimeout:
+        raise
+    except Exception as e:
+        logger.error(f"查询归档事件失败: {e}")
+        logger.error(traceback.format_exc())
+        return _json({'success': False, 'error': str(e)}, 500)
+
+
+async def not_found(request, exc):
+    """与同步模式相同的 404 响应"""
+    return _json({'success': False, 'error': '页面未找到'}, 404)
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    global pool, query_slots
+    query_slots = asyncio.Semaphore(max(ASYNC_POOL_MAX - QUERY_POOL_RESERVE, 1))
+    pool = await aiomysql.create_pool(
+        host=DB_CONFIG['host'],
+        port=DB_CONFIG['port'],
+        user=DB_CONFIG['user'],
+        password=DB_CONFIG['password'],
+        db=DB_CONFIG['database'],
+        charset=DB_CONFIG['charset'],
+        cursorclass=aiomysql.DictCursor,
+        connect_timeout=DB_CONFIG['connect_timeout'],
+        autocommit=True,
+        minsize=ASYNC_POOL_MIN,
+        maxsize=ASYNC_POOL_MAX,
+        pool_recycle=int(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+    )
+    logger.info(f"异步连接池已创建: 最多 {ASYNC_POOL_MAX} 个连接")
+    try:
+        yield
+    finally:
+        pool.close()
+        await pool.wait_closed()
+
+
+# 前端页面、静态文件和流式导出：Flask 应用在线程池中处理
+wsgi_app = WSGIMiddleware(flask_app, workers=WSGI_WORKERS)
+
+app = Starlette(
+    routes=[
+        Route('/api/health', health_check, methods=['GET']),
+        Route('/api/tables', get_tables, methods=['GET']),
+        Route('/api/table/{table_name}', get_table_data, methods=['GET']),
+        Route('/api/query', QueryEndpoint(), methods=['POST']),
+        Route('/api/stats/overview', get_overview_stats, methods=['GET']),
+        Route('/api/stats/event_types', get_event_type_stats, methods=['GET']),
+        Route('/api/trending/repos', get_trending_repos, methods=['GET']),
+        Route('/api/trending/developers', get_trending_developers, methods=['GET']),
+        Route('/api/repo/{repo_id:int}/activity', get_repo_activity, methods=['GET']),
+        Route('/api/repo/{repo_id:int}/related', get_related_repos, methods=['GET']),
+        Route('/api/archive/months', get_archive_months, methods=['GET']),
+        Route('/api/archive/events', get_archive_events, methods=['GET']),
+        Route('/', wsgi_app, methods=['GET']),
+        Route('/static/{path:path}', wsgi_app, methods=['GET']),
+    ],
+    exception_handlers={404: not_found},
+    lifespan=lifespan,
+)
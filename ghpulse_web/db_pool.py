@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Web 端数据库连接池
+线程安全、有上限：连接数达到上限时借用方最多等待 timeout 秒；借出前检查空闲较久的连接是否存活，
+超过最大寿命的连接在归还/借出时关闭重建。借出的连接调用 close() 即归还连接池，路由代码不需要改动。
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+
+import pymysql
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """等待空闲连接超时"""
+
+
+class PooledConnection:
+    """借出的连接：close() 归还连接池，其余属性透传给 pymysql 连接"""
+
+    def __init__(self, pool, conn, created_at):
+        self._pool = pool
+        self._conn = conn
+        self._created_at = created_at
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._pool._release(self._conn, self._created_at)
+
+
+class ConnectionPool:
+    """有上限的 pymysql 连接池"""
+
+    def __init__(self, config, max_size=10, timeout=5.0, max_lifetime=1800, ping_after=5.0):
+        """
+        Args:
+            config: pymysql.connect 参数
+            max_size: 最大连接数（空闲 + 借出）
+            timeout: 借用等待超时（秒）
+            max_lifetime: 连接最大寿命（秒），超过后重建
+            ping_after: 空闲超过该秒数的连接借出前先 ping
+        """
+        self.config = config
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.ping_after = ping_after
+
+        self._lock = threading.Condition()
+        self._idle = deque()  # (conn, created_at, released_at)
+        self._size = 0
+        self._waiting = 0
+        self._counters = {
+            'borrowed': 0,
+            'created': 0,
+            'timeouts': 0,
+            'recycled': 0,
+            'broken': 0,
+            'wait_ms_total': 0.0,
+            'wait_ms_max': 0.0,
+        }
+
+    def get(self, reserve=0):
+        """
+        借用一个连接，超时抛出 PoolTimeout
+
+        Args:
+            reserve: 借出后至少还要留给其他借用方的连接数（低优先级借用方用来给仪表盘接口预留连接）
+        """
+        started = time.monotonic()
+        deadline = started + self.timeout
+        with self._lock:
+            self._waiting += 1
+            try:
+                while True:
+                    in_use = self._size - len(self._idle)
+                    if in_use < self.max_size - reserve:
+                        if self._idle:
+                            conn, created_at, released_at = self._idle.pop()
+                            break
+                        if self._size < self.max_size:
+                            # 先占位，在锁外建立连接
+                            self._size += 1
+                            conn = None
+                            break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters['timeouts'] += 1
+                        raise PoolTimeout(f"等待数据库连接超时（{self.timeout} 秒，连接池上限 {self.max_size}"
+                                          + (f"，预留 {reserve}" if reserve else '') + "）")
+                    self._lock.wait(remaining)
+            finally:
+                self._waiting -= 1
+
+        if conn is not None:
+            conn, created_at = self._checkout(conn, created_at, released_at)
+        if conn is None:
+            conn, created_at = self._connect()
+
+        waited = (time.monotonic() - started) * 1000
+        with self._lock:
+            self._counters['borrowed'] += 1
+            self._counters['wait_ms_total'] += waited
+            self._counters['wait_ms_max'] = max(self._counters['wait_ms_max'], waited)
+        return PooledConnection(self, conn, created_at)
+
+    def _connect(self):
+        """建立新连接（已占用一个名额，失败时释放）"""
+        try:
+            conn = pymysql.connect(**self.config)
+        except Exception:
+            self._discard()
+            raise
+        with self._lock:
+            self._counters['created'] += 1
+        return conn, time.monotonic()
+
+    def _checkout(self, conn, created_at, released_at):
+        """检查空闲连接：超过寿命或 ping 失败则关闭（名额保留给调用方新建）"""
+        now = time.monotonic()
+        if now - created_at > self.max_lifetime:
+            self._close_quietly(conn)
+            with self._lock:
+                self._counters['recycled'] += 1
+            return None, None
+        if now - released_at > self.ping_after:
+            try:
+                conn.ping(reconnect=False)
+            except Exception:
+                self._close_quietly(conn)
+                with self._lock:
+                    self._counters['broken'] += 1
+                return None, None
+        return conn, created_at
+
+    def _release(self, conn, created_at):
+        """归还连接：结束未提交的事务，断开或超龄的连接直接关闭"""
+        healthy = conn.open
+        if healthy:
+            try:
+                conn.rollback()
+            except Exception:
+                healthy = False
+        if not healthy:
+            self._close_quietly(conn)
+            with self._lock:
+                self._counters['broken'] += 1
+            self._discard()
+            return
+        if time.monotonic() - created_at > self.max_lifetime:
+            self._close_quietly(conn)
+            with self._lock:
+                self._counters['recycled'] += 1
+            self._discard()
+            return
+        with self._lock:
+            self._idle.append((conn, created_at, time.monotonic()))
+            # 等待者的预留要求不同，唤醒全部，由各自重新判断
+            self._lock.notify_all()
+
+    def _discard(self):
+        """释放一个连接名额"""
+        with self._lock:
+            self._size -= 1
+            self._lock.notify_all()
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        """连接池指标"""
+        with self._lock:
+            borrowed = self._counters['borrowed']
+            return {
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'waiting': self._waiting,
+                'borrowed': borrowed,
+                'created': self._counters['created'],
+                'timeouts': self._counters['timeouts'],
+                'recycled': self._counters['recycled'],
+                'broken': self._counters['broken'],
+                'wait_ms_avg': round(self._counters['wait_ms_total'] / borrowed, 2) if borrowed else 0,
+                'wait_ms_max': round(self._counters['wait_ms_max'], 2),
+            }
+
+    def close_all(self):
+        """关闭所有空闲连接"""
+        with self._lock:
+            while self._idle:
+                conn, _, _ = self._idle.pop()
+                self._close_quietly(conn)
+                self._size -= 1
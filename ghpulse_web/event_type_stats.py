@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+事件类型分布查询
+- 已汇总的日期直接读 event_stats_daily（每天每类型一行，行数与 events 大小无关）
+- 摄取后尚未重算的日期（stats_dirty_days 中有标记，通常只有今天）从 events 实时统计：
+  按 created_at_date 裁剪分区，再在 idx_event_type (type_code, created_at) 上做范围扫描
+- 实时统计最多 MAX_LIVE_DAYS 天（最近的几天），更早的脏日期沿用汇总值并在结果中标出
+- 查询写成分步查询（见 query_steps），同步和异步模式共用
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+import query_steps
+
+GRANULARITIES = ('total', 'day', 'week', 'month')
+
+# 最多实时统计的天数
+MAX_LIVE_DAYS = 3
+
+# granularity=total 时返回的类型数（与原接口一致）
+TOTAL_LIMIT = 20
+
+
+def parse_date(value, name):
+    """解析 YYYY-MM-DD，格式错误抛出 ValueError"""
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} 日期格式应为 YYYY-MM-DD: {value}")
+
+
+def period_of(day, granularity):
+    """日期所属的统计周期"""
+    if granularity == 'day':
+        return day.isoformat()
+    if granularity == 'week':
+        return (day - timedelta(days=day.weekday())).isoformat()
+    if granularity == 'month':
+        return day.strftime('%Y-%m')
+    return None
+
+
+def _live_counts(day, type_names):
+    """实时统计某一天各类型事件数（分步查询）"""
+    codes = list(type_names)
+    day_start = datetime.combine(day, datetime.min.time())
+    rows = yield f"""
+        SELECT type_code, COUNT(*) AS count
+        FROM events
+        WHERE created_at_date = %s
+          AND type_code IN ({', '.join(['%s'] * len(codes))})
+          AND created_at >= %s AND created_at < %s
+        GROUP BY type_code
+    """, [day] + codes + [day_start, day_start + timedelta(days=1)]
+    return {type_names[row['type_code']]: int(row['count']) for row in rows}
+
+
+def event_type_steps(date_from, date_to):
+    """
+    区间内每天各类型的事件数（分步查询，见 query_steps）
+
+    Returns:
+        ({(日期, 类型名): 数量}, 元信息)
+    """
+    range_sql = "stats_date <= %s" + (" AND stats_date >= %s" if date_from else '')
+    range_params = [date_to] + ([date_from] if date_from else [])
+
+    rows = yield f"""
+        SELECT stats_date, event_type, total_count
+        FROM event_stats_daily
+        WHERE {range_sql}
+    """, range_params
+    counts = {(row['stats_date'], row['event_type']): int(row['total_count']) for row in rows}
+
+    rows = yield f"""
+        SELECT DISTINCT stats_date
+        FROM stats_dirty_days
+        WHERE {range_sql}
+        ORDER BY stats_date DESC
+    """, range_params
+    dirty = [row['stats_date'] for row in rows]
+    live_days = sorted(dirty[:MAX_LIVE_DAYS])
+    stale_days = sorted(dirty[MAX_LIVE_DAYS:])
+
+    if live_days:
+        rows = yield "SELECT type_code, type_name FROM event_types", None
+        type_names = {row['type_code']: row['type_name'] for row in rows}
+        for day in live_days:
+            for key in [key for key in counts if key[0] == day]:
+                del counts[key]
+            live = yield from _live_counts(day, type_names)
+            for event_type, count in live.items():
+                counts[(day, event_type)] = count
+
+    meta = {
+        'live_days': [day.isoformat() for day in live_days],
+        'stale_days': [day.isoformat() for day in stale_days],
+    }
+    return counts, meta
+
+
+def event_type_counts(cursor, date_from, date_to):
+    """同 event_type_steps，用同步游标执行"""
+    return query_steps.run(cursor, event_type_steps(date_from, date_to))
+
+
+def summarize(counts, granularity):
+    """按统计周期汇总；total 返回前 TOTAL_LIMIT 个类型"""
+    if granularity == 'total':
+        totals = defaultdict(int)
+        for (_, event_type), count in counts.items():
+            totals[event_type] += count
+        ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:TOTAL_LIMIT]
+        return [{'event_type': event_type, 'count': count} for event_type, count in ranked]
+
+    periods = defaultdict(int)
+    for (day, event_type), count in counts.items():
+        periods[(period_of(day, granularity), event_type)] += count
+    return [
+        {'period': period, 'event_type': event_type, 'count': count}
+        for (period, event_type), count in sorted(periods.items(), key=lambda item: (item[0][0], -item[1]))
+    ]
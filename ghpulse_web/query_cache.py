@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+自定义查询的结果缓存
+- 键：规范化后的 SQL + 数据版本号（data_versions，由 ETL 任务递增）
+  规范化只改写不影响结果的部分：空白与注释、关键字大小写、字符串引号与转义写法、整数前导零；
+  标识符大小写和其他字面量原样保留
+- 结果集压缩后存储，总字节数有上限（LRU 淘汰），单条结果过大时不缓存
+- 含 NOW()/RAND() 等不确定函数或读取 information_schema/performance_schema 的语句不缓存
+"""
+
+import re
+import time
+import zlib
+import hashlib
+import threading
+from collections import OrderedDict
+
+# 注释按 MySQL 规则识别：-- 后须有空白（否则是两个减号）；/*! */ 和 /*+ */ 会被执行或影响执行，原样保留
+TOKEN_PATTERN = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<hint>/\*[!+].*?\*/)
+  | (?P<comment>--(?=\s|$)[^\n]*|\#[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*")
+  | (?P<quoted>`(?:[^`]|``)*`)
+  | (?P<number>0[xX][0-9a-fA-F]+|0[bB][01]+|\d+(?:\.\d*)?(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)
+  | (?P<word>[A-Za-z_$][A-Za-z0-9_$]*)
+  | (?P<symbol><=>|<=|>=|<>|!=|\|\||&&|:=|.)
+""", re.VERBOSE | re.DOTALL)
+
+# 统一为大写的关键字和常用函数名（其余单词视为标识符，保留原样：表名在 Linux 上区分大小写）
+KEYWORDS = frozenset("""
+    SELECT FROM WHERE AND OR NOT IN IS NULL LIKE BETWEEN EXISTS AS ON USING JOIN INNER LEFT RIGHT OUTER CROSS
+    STRAIGHT_JOIN NATURAL GROUP BY HAVING ORDER ASC DESC LIMIT OFFSET UNION ALL DISTINCT DISTINCTROW CASE WHEN
+    THEN ELSE END WITH RECURSIVE OVER PARTITION ROWS RANGE WINDOW INTERVAL DAY HOUR MINUTE SECOND MONTH YEAR
+    WEEK TRUE FALSE DIV MOD XOR REGEXP RLIKE ESCAPE FORCE USE IGNORE INDEX KEY FOR SQL_NO_CACHE
+    COUNT SUM AVG MIN MAX COALESCE IFNULL NULLIF IF CAST CONVERT DATE DATETIME DATE_SUB DATE_ADD DATE_FORMAT
+    CONCAT LOWER UPPER SUBSTRING LENGTH ROUND FLOOR CEIL ABS GREATEST LEAST JSON_EXTRACT SIGNED UNSIGNED CHAR
+    DECIMAL ROW_NUMBER RANK DENSE_RANK LAG LEAD
+""".split())
+
+# 出现这些单词（函数或库名）的语句结果随时间或会话变化，不缓存
+NON_CACHEABLE = frozenset("""
+    NOW SYSDATE CURDATE CURTIME CURRENT_DATE CURRENT_TIME CURRENT_TIMESTAMP UTC_DATE UTC_TIME UTC_TIMESTAMP
+    LOCALTIME LOCALTIMESTAMP UNIX_TIMESTAMP RAND UUID UUID_SHORT CONNECTION_ID LAST_INSERT_ID FOUND_ROWS
+    ROW_COUNT SLEEP BENCHMARK GET_LOCK RELEASE_LOCK IS_FREE_LOCK USER CURRENT_USER SESSION_USER SYSTEM_USER
+    INFORMATION_SCHEMA PERFORMANCE_SCHEMA SYS MYSQL
+""".split())
+
+
+def _canonical_string(token):
+    """字符串字面量统一为单引号写法（先还原内容，再按单一规则转义）"""
+    quote = token[0]
+    body = token[1:-1]
+    value = []
+    i = 0
+    while i < len(body):
+        ch = body[i]
+        if ch == '\\' and i + 1 < len(body):
+            value.append(body[i:i + 2])
+            i += 2
+            continue
+        if ch == quote and i + 1 < len(body) and body[i + 1] == quote:
+            value.append(quote)
+            i += 2
+            continue
+        value.append(ch)
+        i += 1
+    text = ''.join(part if part.startswith('\\') else part.replace("'", "\\'") for part in value)
+    return f"'{text}'"
+
+
+def normalize_sql(sql):
+    """
+    规范化 SQL，返回 (规范化文本, 是否可缓存)
+
+    规范化文本只作为缓存键，执行的仍是原语句。
+    """
+    tokens = []
+    cacheable = True
+    for match in TOKEN_PATTERN.finditer(sql):
+        kind = match.lastgroup
+        token = match.group()
+        if kind in ('space', 'comment'):
+            continue
+        if kind == 'string':
+            token = _canonical_string(token)
+        elif kind == 'number':
+            if token.isdigit():
+                token = str(int(token))
+        elif kind == 'word':
+            upper = token.upper()
+            if upper in NON_CACHEABLE:
+                cacheable = False
+            if upper in KEYWORDS or upper in NON_CACHEABLE:
+                token = upper
+        elif kind == 'quoted':
+            if token[1:-1].upper() in NON_CACHEABLE:
+                cacheable = False
+        tokens.append(token)
+    while tokens and tokens[-1] == ';':
+        tokens.pop()
+    return ' '.join(tokens), cacheable
+
+
+class QueryResultCache:
+    """按字节预算淘汰的 LRU 结果缓存（值为压缩后的序列化结果）"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entry_bytes=2 * 1024 * 1024, ttl=300):
+        """
+        Args:
+            max_bytes: 所有条目压缩后的总字节数上限
+            max_entry_bytes: 单条结果压缩后的字节数上限，超过不缓存
+            ttl: 条目最长保留时间（秒），数据版本未覆盖的表也能在此时间后刷新
+        """
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # 键 -> (过期时间, 压缩数据)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'stored': 0, 'too_large': 0, 'evicted': 0, 'uncacheable': 0}
+
+    @staticmethod
+    def make_key(normalized, versions):
+        stamp = '.'.join(f"{name}{version}" for name, version in sorted(versions.items()))
+        return hashlib.sha1(f"{normalized}#{stamp}".encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """命中返回序列化结果（bytes），否则返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters['hits'] += 1
+            data = entry[1]
+        return zlib.decompress(data)
+
+    def put(self, key, payload):
+        """存入序列化结果，返回是否已缓存"""
+        data = zlib.compress(payload, 1)
+        if len(data) > self.max_entry_bytes:
+            with self._lock:
+                self.counters['too_large'] += 1
+            return False
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, data)
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.counters['evicted'] += 1
+            self.counters['stored'] += 1
+        return True
+
+    def note_uncacheable(self):
+        """记录一次不可缓存的查询"""
+        with self._lock:
+            self.counters['uncacheable'] += 1
+
+    def _remove(self, key):
+        _, data = self._entries.pop(key)
+        self._bytes -= len(data)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, entries=len(self._entries), bytes=self._bytes, max_bytes=self.max_bytes)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+自定义查询的流式导出（NDJSON / CSV）
+- 独立连接 + 无缓冲的 SSCursor，每次 fetchmany 一块、序列化后立即发送，内存占用与结果行数无关
+- 可边生成边 gzip 压缩（客户端 Accept-Encoding 含 gzip 时）
+- 会话级 max_execution_time 限制语句在服务端的执行时间（包括向慢客户端发送结果的时间）
+- 客户端中途断开时对该连接执行 KILL QUERY，服务端不再继续读取
+- 导出连接不占用 Web 连接池，同时进行的导出数单独限制
+"""
+
+import io
+import csv
+import json
+import zlib
+import base64
+import inspect
+import logging
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+
+import pymysql
+from pymysql import cursors
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+# 每次从服务端读取的行数
+CHUNK_ROWS = 1000
+
+
+class ExportBusy(Exception):
+    """同时进行的导出数已达上限"""
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode('ascii')
+    raise TypeError(f"无法序列化 {type(value).__name__}")
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode('ascii')
+    return value
+
+
+class QueryExporter:
+    """流式导出：执行查询后逐块产出响应体"""
+
+    def __init__(self, config, kill_connection, max_concurrent=2, max_execution_time=600):
+        """
+        Args:
+            config: pymysql.connect 参数（游标类型会替换为 SSCursor）
+            kill_connection: 返回一个可执行 KILL QUERY 的连接的函数（用完 close()）
+            max_concurrent: 同时进行的导出数上限
+            max_execution_time: 单条导出语句的服务端执行时间上限（秒）
+        """
+        self.config = dict(config, cursorclass=cursors.SSCursor)
+        self.kill_connection = kill_connection
+        self.max_concurrent = max_concurrent
+        self.max_execution_time = max_execution_time
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+
+    def start(self, sql, fmt, compress=False):
+        """
+        获取导出名额、建立连接并执行查询（语法错误等在此处抛出，尚未开始发送响应）
+
+        Returns:
+            逐块产出响应体字节的可迭代对象（带 close()）
+        """
+        if not self._slots.acquire(blocking=False):
+            raise ExportBusy(f"同时进行的导出已达上限（{self.max_concurrent}）")
+        conn = None
+        try:
+            conn = pymysql.connect(**self.config)
+            cursor = conn.cursor()
+            cursor.execute("SET SESSION max_execution_time = %s", (int(self.max_execution_time * 1000),))
+            cursor.execute(sql)
+        except Exception:
+            if conn:
+                conn.close()
+            self._slots.release()
+            raise
+        return _ExportStream(self, conn, cursor, fmt, compress)
+
+    def _stream(self, conn, cursor, fmt, compress):
+        columns = [desc[0] for desc in cursor.description] if cursor.description else []
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        finished = False
+        rows_sent = 0
+        try:
+            if fmt == 'csv':
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(columns)
+            while True:
+                try:
+                    rows = cursor.fetchmany(CHUNK_ROWS)
+                except pymysql.MySQLError as e:
+                    # 超过 max_execution_time 等服务端错误：NDJSON 以错误记录结尾，CSV 直接中断传输
+                    logger.error(f"导出中途失败（已发送 {rows_sent} 行）: {e}")
+                    if fmt != 'ndjson':
+                        raise
+                    chunk = json.dumps({'_error': str(e), '_rows': rows_sent}, ensure_ascii=False) + '\n'
+                    yield self._encode(chunk, compressor)
+                    break
+                if not rows:
+                    break
+                if fmt == 'csv':
+                    writer.writerows([_csv_value(value) for value in row] for row in rows)
+                    chunk = buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+                else:
+                    chunk = ''.join(
+                        json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=_json_default) + '\n'
+                        for row in rows
+                    )
+                rows_sent += len(rows)
+                yield self._encode(chunk, compressor)
+            if compressor:
+                yield compressor.flush()
+            finished = True
+            logger.info(f"导出完成: {rows_sent} 行")
+        finally:
+            self._finish(conn, cursor, finished)
+
+    def _finish(self, conn, cursor, finished):
+        """释放导出连接和名额；未读完时（客户端断开或出错）先终止服务端语句，否则关闭游标会把剩余结果读完"""
+        if finished:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        else:
+            self._kill(conn)
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self._slots.release()
+
+    @staticmethod
+    def _encode(chunk, compressor):
+        data = chunk.encode('utf-8')
+        return compressor.compress(data) if compressor else data
+
+    def _kill(self, conn):
+        """用另一个连接终止导出连接上正在执行的语句"""
+        try:
+            thread_id = conn.thread_id()
+            killer = self.kill_connection()
+            try:
+                killer_cursor = killer.cursor()
+                killer_cursor.execute(f"KILL QUERY {int(thread_id)}")
+                killer_cursor.close()
+            finally:
+                killer.close()
+            logger.warning(f"导出未完成，已终止连接 {thread_id} 上的查询")
+        except Exception as e:
+            logger.warning(f"终止导出查询失败: {e}")
+
+
+class _ExportStream:
+    """响应体：WSGI 服务器在发送结束或客户端断开时调用 close()，生成器尚未开始执行时也能释放连接"""
+
+    def __init__(self, exporter, conn, cursor, fmt, compress):
+        self._exporter = exporter
+        self._conn = conn
+        self._cursor = cursor
+        self._chunks = exporter._stream(conn, cursor, fmt, compress)
+
+    def __iter__(self):
+        return self._chunks
+
+    def close(self):
+        # 未开始执行的生成器 close() 不会进入 finally，需要单独释放
+        if inspect.getgeneratorstate(self._chunks) == inspect.GEN_CREATED:
+            self._chunks.close()
+            self._exporter._finish(self._conn, self._cursor, False)
+        else:
+            self._chunks.close()
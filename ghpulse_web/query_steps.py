@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分步查询：同步模式（app.py，pymysql）和异步模式（asgi_app.py，aiomysql）共用同一份查询逻辑
+- 查询逻辑写成生成器：每次 yield (sql, 参数)，接收该语句返回的字典行，最后 return 结果
+- run 用同步游标执行，run_async 用协程取数函数执行，SQL 和结果处理只写一份
+"""
+
+
+def run(cursor, steps):
+    """用同步游标（返回字典行）执行分步查询，返回生成器的结果"""
+    rows = None
+    while True:
+        try:
+            sql, params = steps.send(rows)
+        except StopIteration as stop:
+            return stop.value
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+
+async def run_async(fetchall, steps):
+    """
+    用协程执行分步查询
+
+    Args:
+        fetchall: 协程函数 (sql, 参数) -> 字典行列表
+    """
+    rows = None
+    while True:
+        try:
+            sql, params = steps.send(rows)
+        except StopIteration as stop:
+            return stop.value
+        rows = await fetchall(sql, params)
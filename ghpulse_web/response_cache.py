@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+只读 API 的响应缓存
+- 键：接口路径 + 规范化的查询参数 + 所依赖数据的版本号（data_versions 表，由 ETL 任务递增）
+- 每个接口单独设置 TTL；进程内缓存为有上限的 LRU
+- 单飞（single-flight）：同一键的并发未命中只有一个请求查库，其余等待其结果
+- 配置 REDIS_URL 且安装 redis 时改用 Redis 存储，多个 worker 进程共享缓存，
+  并用 SET NX 锁让跨进程的并发未命中也只查一次库
+"""
+
+import time
+import logging
+import functools
+import threading
+from collections import OrderedDict
+
+from flask import request, make_response
+
+logger = logging.getLogger(__name__)
+
+# 单飞等待首个请求完成的最长时间（秒），超时后自行查库
+FLIGHT_WAIT = 30
+
+# 跨进程锁的有效期（秒）和等待其他进程结果时的轮询间隔
+SHARED_LOCK_TTL = 30
+SHARED_POLL_INTERVAL = 0.05
+
+
+class LocalBackend:
+    """进程内有上限的 LRU 缓存"""
+
+    shared = False
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (过期时间, 值)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def size(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Redis 共享缓存（容量由 Redis 的 maxmemory 策略控制，建议 allkeys-lru）"""
+
+    shared = True
+
+    def __init__(self, url, prefix='ghpulse:resp:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            return None
+        mimetype, _, body = value.partition(b'\n')
+        return mimetype.decode('ascii'), body, 200
+
+    def set(self, key, value, ttl):
+        mimetype, body, _ = value
+        self.client.set(self.prefix + key, mimetype.encode('ascii') + b'\n' + body, ex=max(1, int(ttl)))
+
+    def acquire(self, key):
+        return bool(self.client.set(self.prefix + 'lock:' + key, b'1', nx=True, ex=SHARED_LOCK_TTL))
+
+    def release(self, key):
+        self.client.delete(self.prefix + 'lock:' + key)
+
+    def size(self):
+        return None
+
+
+class _Flight:
+    """一次进行中的查库"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+
+
+class ResponseCache:
+    """带单飞和数据版本失效的响应缓存"""
+
+    def __init__(self, backend, version_loader, version_interval=2.0):
+        """
+        Args:
+            backend: LocalBackend 或 RedisBackend
+            version_loader: 返回 {名称: 版本号} 的函数（查询 data_versions）
+            version_interval: 版本号的进程内缓存时间（秒），即 ETL 写入后缓存失效的最大延迟
+        """
+        self.backend = backend
+        self.version_loader = version_loader
+        self.version_interval = version_interval
+        self._versions = {}
+        self._versions_at = 0.0
+        self._versions_lock = threading.Lock()
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'coalesced': 0, 'errors': 0}
+        self._counters_lock = threading.Lock()
+
+    def _count(self, name):
+        """计数器在多个请求线程中递增，需加锁"""
+        with self._counters_lock:
+            self.counters[name] += 1
+
+    def versions(self):
+        """当前数据版本（最多每 version_interval 秒查询一次）"""
+        now = time.monotonic()
+        if now - self._versions_at < self.version_interval:
+            return self._versions
+        with self._versions_lock:
+            if now - self._versions_at >= self.version_interval:
+                try:
+                    self._versions = self.version_loader()
+                except Exception as e:
+                    logger.warning(f"读取数据版本失败，沿用上次的版本: {e}")
+                self._versions_at = now
+        return self._versions
+
+    def make_key(self, path, args, depends):
+        """路径 + 排序后的非空查询参数 + 依赖数据的版本号"""
+        params = '&'.join(
+            f"{name}={','.join(sorted(values))}"
+            for name, values in sorted(args.lists())
+            if any(value != '' for value in values)
+        )
+        versions = self.versions()
+        stamp = '.'.join(f"{name}{versions.get(name, 0)}" for name in depends)
+        return f"{path}?{params}#{stamp}"
+
+    def get_or_compute(self, key, ttl, compute):
+        """
+        命中直接返回；未命中时同一键只有一个调用者执行 compute，其余等待其结果
+
+        compute 返回 (值, 是否可缓存)；不可缓存的结果（如错误响应）也会交给正在等待的调用者。
+        Returns:
+            (值, 'HIT' / 'MISS' / 'COALESCED')
+        """
+        value = self._get(key)
+        if value is not None:
+            self._count('hits')
+            return value, 'HIT'
+
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait(FLIGHT_WAIT)
+            if flight.value is not None:
+                self._count('coalesced')
+                return flight.value, 'COALESCED'
+            value, _ = compute()
+            return value, 'MISS'
+
+        try:
+            value, status = self._compute_shared(key, ttl, compute)
+            flight.value = value
+            return value, status
+        finally:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def _get(self, key):
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            self._count('errors')
+            logger.warning(f"读取响应缓存失败: {e}")
+            return None
+
+    def _set(self, key, value, ttl):
+        try:
+            self.backend.set(key, value, ttl)
+        except Exception as e:
+            self._count('errors')
+            logger.warning(f"写入响应缓存失败: {e}")
+
+    def _compute_shared(self, key, ttl, compute):
+        """共享后端下先抢跨进程锁，抢不到时等待持锁进程写入的结果"""
+        locked = False
+        if self.backend.shared:
+            try:
+                locked = self.backend.acquire(key)
+                if not locked:
+                    deadline = time.monotonic() + SHARED_LOCK_TTL
+                    while time.monotonic() < deadline:
+                        time.sleep(SHARED_POLL_INTERVAL)
+                        value = self._get(key)
+                        if value is not None:
+                            self._count('coalesced')
+                            return value, 'COALESCED'
+            except Exception as e:
+                self._count('errors')
+                logger.warning(f"响应缓存加锁失败: {e}")
+        try:
+            self._count('misses')
+            value, cacheable = compute()
+            if cacheable:
+                self._set(key, value, ttl)
+            return value, 'MISS'
+        finally:
+            if locked:
+                try:
+                    self.backend.release(key)
+                except Exception:
+                    pass
+
+    def stats(self):
+        with self._counters_lock:
+            counters = dict(self.counters)
+        return dict(counters, backend='redis' if self.backend.shared else 'local', size=self.backend.size())
+
+    def cached(self, ttl, depends):
+        """
+        Flask 视图装饰器：缓存状态码为 200 的响应
+
+        Args:
+            ttl: 缓存时间（秒）
+            depends: 响应依赖的数据版本名称，如 ('events', 'stats')
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                key = self.make_key(request.path, request.args, depends)
+
+                def compute():
+                    response = make_response(view(*args, **kwargs))
+                    value = (response.mimetype, response.get_data(), response.status_code)
+                    return value, response.status_code == 200
+
+                (mimetype, body, code), status = self.get_or_compute(key, ttl, compute)
+                response = make_response(body, code)
+                response.mimetype = mimetype
+                response.headers['X-Cache'] = status
+                return response
+            return wrapper
+        return decorator
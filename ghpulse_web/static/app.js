@@ -16,11 +16,15 @@ const app = createApp({
         const tables = ref([]);
         const tableData = ref([]);
         const tableColumns = ref([]);
+        // 键集分页：page 只用于显示，翻页靠服务端返回的游标
         const pagination = reactive({
             page: 1,
             page_size: 20,
             total: 0,
-            total_pages: 0
+            total_estimated: false,
+            cursor: null,
+            next_cursor: null,
+            prev_cursor: null
         });
         
         const stats = ref({
@@ -28,7 +32,8 @@ const app = createApp({
             total_actors: 0,
             total_repos: 0,
             total_orgs: 0,
-            latest_event: null
+            latest_event: null,
+            counters_updated_at: null
         });
         
         const customSQL = ref('');
@@ -36,12 +41,14 @@ const app = createApp({
             rows: null,
             columns: [],
             count: 0,
-            execution_time: 0
+            execution_time: 0,
+            cached: false
         });
         
         const trendingRepos = ref([]);
         const trendingDevelopers = ref([]);
         const eventTypeStats = ref([]);
+        const eventTypeRange = ref(null);  // [from, to]，为空表示全部历史
 
         const trendingReposTableRef = ref(null);
         const trendingDevelopersTableRef = ref(null);
@@ -102,8 +109,9 @@ const app = createApp({
             
             try {
                 loading.value = true;
+                const cursor = pagination.cursor ? `&cursor=${encodeURIComponent(pagination.cursor)}` : '';
                 const result = await api.get(
-                    `/table/${currentTable.value}?page=${pagination.page}&page_size=${pagination.page_size}`
+                    `/table/${currentTable.value}?page_size=${pagination.page_size}${cursor}`
                 );
                 
                 if (result.success) {
@@ -136,8 +144,9 @@ const app = createApp({
                     queryResult.columns = result.data.columns;
                     queryResult.count = result.data.count;
                     queryResult.execution_time = result.data.execution_time.toFixed(3);
+                    queryResult.cached = result.data.cached;
                     console.log(`查询成功，返回 ${result.data.count} 行`);
-                    ElMessage.success(`查询成功，返回 ${result.data.count} 行数据`);
+                    ElMessage.success(`查询成功，返回 ${result.data.count} 行数据${result.data.cached ? '（缓存结果）' : ''}`);
                 } else {
                     ElMessage.error('查询失败: ' + result.error);
                 }
@@ -150,6 +159,30 @@ const app = createApp({
             }
         };
         
+        // 流式导出查询结果（不限行数）：用表单提交，浏览器边接收边写入下载文件
+        const exportQuery = (format) => {
+            if (!customSQL.value.trim()) {
+                ElMessage.warning('请输入SQL查询语句');
+                return;
+            }
+            
+            const form = document.createElement('form');
+            form.method = 'POST';
+            form.action = `${API_BASE_URL}/query`;
+            form.target = '_blank';
+            for (const [name, value] of Object.entries({ sql: customSQL.value, format })) {
+                const input = document.createElement('input');
+                input.type = 'hidden';
+                input.name = name;
+                input.value = value;
+                form.appendChild(input);
+            }
+            document.body.appendChild(form);
+            form.submit();
+            document.body.removeChild(form);
+            ElMessage.success('已开始导出，文件将在下载完成后保存');
+        };
+        
         // 加载热门仓库
         const loadTrendingRepos = async () => {
             try {
@@ -202,7 +235,12 @@ const app = createApp({
         const loadEventTypeStats = async () => {
             try {
                 loading.value = true;
-                const result = await api.get('/stats/event_types');
+                const [from, to] = eventTypeRange.value || [];
+                const params = new URLSearchParams();
+                if (from) params.set('from', from);
+                if (to) params.set('to', to);
+                const query = params.toString();
+                const result = await api.get(`/stats/event_types${query ? '?' + query : ''}`);
                 if (result.success) {
                     eventTypeStats.value = result.data;
                     console.log(`加载事件类型统计: ${result.data.length} 种类型`);
@@ -230,7 +268,7 @@ const app = createApp({
                 const tableName = index.replace('table-', '');
                 currentTable.value = tableName;
                 activeView.value = 'table';
-                pagination.page = 1;
+                resetPagination();
                 loadTableData();
             } else if (index === 'query') {
                 activeView.value = 'query';
@@ -246,14 +284,35 @@ const app = createApp({
         };
         
         // 分页处理
-        const handlePageChange = (page) => {
-            pagination.page = page;
+        const resetPagination = () => {
+            pagination.page = 1;
+            pagination.cursor = null;
+            pagination.next_cursor = null;
+            pagination.prev_cursor = null;
+        };
+        
+        const handleFirstPage = () => {
+            resetPagination();
+            loadTableData();
+        };
+        
+        const handleNextPage = () => {
+            if (!pagination.next_cursor) return;
+            pagination.cursor = pagination.next_cursor;
+            pagination.page += 1;
+            loadTableData();
+        };
+        
+        const handlePrevPage = () => {
+            if (!pagination.prev_cursor) return;
+            pagination.cursor = pagination.prev_cursor;
+            pagination.page = Math.max(1, pagination.page - 1);
             loadTableData();
         };
         
         const handleSizeChange = (size) => {
             pagination.page_size = size;
-            pagination.page = 1;
+            resetPagination();
             loadTableData();
         };
         
@@ -326,7 +385,8 @@ const app = createApp({
                 total_actors: '总用户数',
                 total_repos: '总仓库数',
                 total_orgs: '总组织数',
-                latest_event: '最新事件时间'
+                latest_event: '最新事件时间',
+                counters_updated_at: '统计更新时间'
             };
             return labels[key] || key;
         };
@@ -335,7 +395,7 @@ const app = createApp({
         const formatStatValue = (key, value) => {
             if (value === null || value === undefined) return '-';
             
-            if (key === 'latest_event') {
+            if (key === 'latest_event' || key === 'counters_updated_at') {
                 if (!value) return '-';
                 try {
                     return new Date(value).toLocaleString('zh-CN', {
@@ -402,15 +462,19 @@ const app = createApp({
             trendingRepos,
             trendingDevelopers,
             eventTypeStats,
+            eventTypeRange,
             trendingReposTableRef,
             trendingDevelopersTableRef,
             
             // 方法
             handleMenuSelect,
-            handlePageChange,
+            handleFirstPage,
+            handleNextPage,
+            handlePrevPage,
             handleSizeChange,
             loadTableData,
             executeQuery,
+            exportQuery,
             loadTrendingRepos,
             loadTrendingDevelopers,
             loadEventTypeStats,
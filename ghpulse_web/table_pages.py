@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+表数据浏览的键集（seek）分页
+- 按主键顺序翻页：WHERE 主键 > 上一页最后一行 ORDER BY 主键 LIMIT n，第 N 页与第 1 页代价相同
+- 前后翻页用不透明的游标令牌（表名 + 方向 + 边界行主键值，base64url 编码的 JSON）
+- 总行数取 overview_counters 中维护的计数或 information_schema 的估计值，列信息按表缓存
+"""
+
+import json
+import time
+import base64
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+
+# 可浏览的表及其主键列（按主键顺序）
+PAGE_TABLES = {
+    'actors': ('actor_id',),
+    'repos': ('repo_id',),
+    'organizations': ('org_id',),
+    'events': ('event_id', 'created_at_date'),
+    'payload_push': ('payload_id',),
+    'payload_issue': ('payload_id',),
+    'payload_pull_request': ('payload_id',),
+    'payload_star': ('payload_id',),
+    'payload_fork': ('payload_id',),
+    'payload_create': ('payload_id',),
+    'payload_delete': ('payload_id',),
+    'payload_watch': ('payload_id',),
+    'hot_repos': ('repo_id',),
+    'active_developers': ('actor_id',),
+    'event_stats_daily': ('stats_id', 'stats_date'),
+    'user_repo_relation': ('relation_id',),
+    'repo_stats_cache': ('repo_id',),
+    'actor_stats_cache': ('actor_id',),
+    'repo_activity_hourly': ('repo_id', 'stats_hour'),
+    'event_types': ('type_code',),
+}
+
+# 行数由摄取维护在 overview_counters 中的表（精确计数）
+COUNTER_COLUMNS = {
+    'events': 'total_events',
+    'actors': 'total_actors',
+    'repos': 'total_repos',
+    'organizations': 'total_orgs',
+}
+
+MAX_PAGE_SIZE = 1000
+
+# 列信息缓存时间（秒）和总行数缓存时间（秒）
+COLUMNS_TTL = 600
+TOTAL_TTL = 60
+
+
+# 其余表的总行数估计值
+ESTIMATE_SQL = """
+    SELECT TABLE_ROWS AS total FROM information_schema.TABLES
+    WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s
+"""
+
+
+class InvalidCursor(ValueError):
+    """游标令牌无法解析或不属于该表"""
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'n': str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'd' in value:
+            return date.fromisoformat(value['d'])
+        if 'n' in value:
+            return Decimal(value['n'])
+        raise InvalidCursor("未知的游标值类型")
+    return value
+
+
+def encode_cursor(table_name, direction, row, key_columns):
+    """生成游标令牌：direction 为 'after'（下一页）或 'before'（上一页）"""
+    payload = {
+        't': table_name,
+        'd': direction,
+        'k': [_encode_value(row[column]) for column in key_columns],
+    }
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, table_name, key_columns):
+    """解析游标令牌，返回 (方向, 主键值列表)"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw.decode('utf-8'))
+        direction = payload['d']
+        values = [_decode_value(value) for value in payload['k']]
+    except InvalidCursor:
+        raise
+    except Exception:
+        raise InvalidCursor("无效的分页游标")
+    if payload.get('t') != table_name or direction not in ('after', 'before') or len(values) != len(key_columns):
+        raise InvalidCursor("分页游标与当前表不匹配")
+    return direction, values
+
+
+def seek_condition(key_columns, values, op):
+    """
+    展开的多列比较：(a, b) > (x, y) 写成 a > x OR (a = x AND b > y)，
+    优化器可据此在主键上做范围扫描（行构造器比较不一定能走范围扫描）
+    """
+    clauses = []
+    params = []
+    for i, column in enumerate(key_columns):
+        parts = [f"`{prev}` = %s" for prev in key_columns[:i]] + [f"`{column}` {op} %s"]
+        clauses.append('(' + ' AND '.join(parts) + ')')
+        params.extend(values[:i] + [values[i]])
+    return ' OR '.join(clauses), params
+
+
+def page_query(table_name, page_size, token=None):
+    """
+    生成一页的查询语句
+
+    Returns:
+        (sql, params, state)；state 交给 page_result
+    """
+    key_columns = PAGE_TABLES[table_name]
+    direction, values = decode_cursor(token, table_name, key_columns) if token else ('after', None)
+    backward = direction == 'before'
+
+    order = ', '.join(f"`{column}` {'DESC' if backward else 'ASC'}" for column in key_columns)
+    where = ''
+    params = []
+    if values is not None:
+        condition, params = seek_condition(key_columns, values, '<' if backward else '>')
+        where = f"WHERE {condition}"
+
+    # 多取一行判断该方向上是否还有数据
+    sql = f"SELECT * FROM `{table_name}` {where} ORDER BY {order} LIMIT %s"
+    return sql, params + [page_size + 1], (table_name, page_size, backward, values is not None)
+
+
+def page_result(rows, state):
+    """
+    由查询结果得到一页
+
+    Returns:
+        (rows, next_cursor, prev_cursor)；没有下一页/上一页时对应游标为 None
+    """
+    table_name, page_size, backward, has_cursor = state
+    key_columns = PAGE_TABLES[table_name]
+    rows = list(rows)
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backward:
+        rows.reverse()
+
+    if not rows:
+        return rows, None, None
+    # 向后翻时一定还有下一页（来自那里）；向前翻时有游标即说明前面还有数据
+    has_next = more if not backward else True
+    has_prev = more if backward else has_cursor
+    next_cursor = encode_cursor(table_name, 'after', rows[-1], key_columns) if has_next else None
+    prev_cursor = encode_cursor(table_name, 'before', rows[0], key_columns) if has_prev else None
+    return rows, next_cursor, prev_cursor
+
+
+def fetch_page(cursor, table_name, page_size, token=None):
+    """
+    读取一页
+
+    Returns:
+        (rows, next_cursor, prev_cursor)；没有下一页/上一页时对应游标为 None
+    """
+    sql, params, state = page_query(table_name, page_size, token)
+    cursor.execute(sql, params)
+    return page_result(cursor.fetchall(), state)
+
+
+class TableMetadata:
+    """按表缓存列信息和总行数"""
+
+    def __init__(self, columns_ttl=COLUMNS_TTL, total_ttl=TOTAL_TTL):
+        self.columns_ttl = columns_ttl
+        self.total_ttl = total_ttl
+        self._columns = {}  # 表名 -> (过期时间, 列信息)
+        self._totals = {}   # 表名 -> (过期时间, (总行数, 是否为估计值))
+        self._lock = threading.Lock()
+
+    def _cached(self, store, table_name):
+        with self._lock:
+            entry = store.get(table_name)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def _store(self, store, table_name, value, ttl):
+        with self._lock:
+            store[table_name] = (time.monotonic() + ttl, value)
+
+    def cached_columns(self, table_name):
+        return self._cached(self._columns, table_name)
+
+    def store_columns(self, table_name, describe_rows):
+        """由 DESCRIBE 结果生成并缓存列信息"""
+        columns = [
+            {
+                'field': col['Field'],
+                'type': col['Type'],
+                'key': col['Key'],
+                'comment': col.get('Extra', '')
+            }
+            for col in describe_rows
+        ]
+        self._store(self._columns, table_name, columns, self.columns_ttl)
+        return columns
+
+    def cached_total(self, table_name):
+        return self._cached(self._totals, table_name)
+
+    def store_total(self, table_name, total):
+        self._store(self._totals, table_name, total, self.total_ttl)
+        return total
+
+    def columns(self, cursor, table_name):
+        """列信息（DESCRIBE 结果）"""
+        columns = self.cached_columns(table_name)
+        if columns is None:
+            cursor.execute(f"DESCRIBE `{table_name}`")
+            columns = self.store_columns(table_name, cursor.fetchall())
+        return columns
+
+    def total(self, cursor, table_name, database):
+        """
+        总行数：events/actors/repos/organizations 取 overview_counters 的计数，
+        其余取 information_schema.TABLES.TABLE_ROWS 估计值
+
+        Returns:
+            (总行数, 是否为估计值)
+        """
+        total = self.cached_total(table_name)
+        if total is None:
+            column = COUNTER_COLUMNS.get(table_name)
+            row = None
+            if column:
+                cursor.execute(f"SELECT {column} AS total FROM overview_counters WHERE id = 1")
+                row = cursor.fetchone()
+            if row:
+                total = (int(row['total']), False)
+            else:
+                cursor.execute(ESTIMATE_SQL, (database, table_name))
+                row = cursor.fetchone()
+                total = (int(row['total'] or 0) if row else 0, True)
+            self.store_total(table_name, total)
+        return total
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+热门榜单的降级查询（hot_repos / active_developers 为空时）
+- 表和列信息启动时读取一次，之后按固定间隔在后台刷新，请求路径上不再执行 SHOW TABLES / SHOW COLUMNS
+- 降级查询有界：先按 idx_total_stars / idx_total_events 取候选，再只统计这些候选最近 WINDOW_DAYS 天的事件，
+  优化器可选用 idx_repo_type (repo_id, type_code, created_at) / idx_actor_type_date (actor_id, type_code, created_at_date)，
+  不强制索引（旧库或切换到 ingest 索引方案时这些索引不存在，FORCE INDEX 会直接报错）
+- 降级结果保留在内存中：过期后先返回上次结果，同时在后台重新计算（stale-while-revalidate），
+  重新计算失败时继续返回旧结果
+- 降级查询写成分步查询（见 query_steps），同步和异步模式共用；AsyncStaleWhileRevalidate 供异步模式使用
+"""
+
+import time
+import asyncio
+import logging
+import threading
+
+import query_steps
+
+logger = logging.getLogger(__name__)
+
+# 降级查询统计的近期窗口（天）
+WINDOW_DAYS = 7
+
+# 表结构信息的刷新间隔（秒）
+SCHEMA_INTERVAL = 600
+
+# 降级结果的新鲜期（秒），过期后仍可返回，同时后台重算
+FALLBACK_FRESH = 300
+
+# 降级查询统计的事件类型：字段名 -> type_code
+REPO_EVENT_COLUMNS = {'stars_7d': 4, 'forks_7d': 5, 'prs_7d': 2}
+ACTOR_EVENT_COLUMNS = {'commits_7d': 1, 'prs_7d': 2, 'issues_7d': 3}
+
+
+class SchemaInfo:
+    """缓存的表名和列名"""
+
+    def __init__(self, connect, tables=('repos', 'actors'), interval=SCHEMA_INTERVAL):
+        """
+        Args:
+            connect: 返回数据库连接的函数（DictCursor，用完 close()）
+            tables: 需要列信息的表
+            interval: 刷新间隔（秒）
+        """
+        self.connect = connect
+        self.column_tables = tables
+        self.interval = interval
+        self.tables = set()
+        self.columns = {}
+        self.loaded_at = 0.0
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """重新读取表和列信息，失败时保留上次的结果"""
+        conn = None
+        try:
+            conn = self.connect()
+            cursor = conn.cursor()
+            cursor.execute("SHOW TABLES")
+            tables = {list(row.values())[0] for row in cursor.fetchall()}
+            columns = {}
+            for table in self.column_tables:
+                if table in tables:
+                    cursor.execute(f"SHOW COLUMNS FROM `{table}`")
+                    columns[table] = {row['Field'] for row in cursor.fetchall()}
+            cursor.close()
+            self.tables, self.columns = tables, columns
+            logger.debug(f"表结构信息已刷新: {len(tables)} 张表")
+        except Exception as e:
+            logger.warning(f"读取表结构信息失败，沿用上次的结果: {e}")
+        finally:
+            if conn:
+                conn.close()
+            self.loaded_at = time.monotonic()
+
+    def _maybe_refresh(self):
+        """超过刷新间隔时在后台线程中刷新（当前请求使用已有信息）"""
+        if time.monotonic() - self.loaded_at < self.interval:
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name='schema-refresh', daemon=True).start()
+
+    def has_table(self, table):
+        self._maybe_refresh()
+        return table in self.tables
+
+    def column(self, table, preferred, fallback):
+        """表中存在 preferred 列时返回它，否则返回 fallback"""
+        self._maybe_refresh()
+        return preferred if preferred in self.columns.get(table, ()) else fallback
+
+
+class StaleWhileRevalidate:
+    """按键保存最近一次成功的计算结果；过期时返回旧结果并在后台重算（同一键同时只有一个重算）"""
+
+    def __init__(self, fresh_for=FALLBACK_FRESH):
+        self.fresh_for = fresh_for
+        self._entries = {}       # 键 -> (计算时间 time.time(), 值)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        """
+        Returns:
+            (值, 计算时间, 是否为过期结果)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return self._compute(key, compute) + (False,)
+        computed_at, value = entry
+        if time.time() - computed_at < self.fresh_for:
+            return value, computed_at, False
+
+        with self._lock:
+            start = key not in self._refreshing
+            if start:
+                self._refreshing.add(key)
+        if start:
+            threading.Thread(target=self._revalidate, args=(key, compute),
+                             name='fallback-revalidate', daemon=True).start()
+        return value, computed_at, True
+
+    def _compute(self, key, compute):
+        value = compute()
+        computed_at = time.time()
+        with self._lock:
+            self._entries[key] = (computed_at, value)
+        return value, computed_at
+
+    def _revalidate(self, key, compute):
+        try:
+            self._compute(key, compute)
+        except Exception as e:
+            logger.warning(f"后台重算降级结果失败，继续返回旧结果: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+
+class AsyncStaleWhileRevalidate:
+    """StaleWhileRevalidate 的协程版本（ASGI 模式）：compute 为协程函数，后台重算用任务代替线程"""
+
+    def __init__(self, fresh_for=FALLBACK_FRESH):
+        self.fresh_for = fresh_for
+        self._entries = {}       # 键 -> (计算时间 time.time(), 值)
+        self._refreshing = set()
+        self._tasks = set()      # 进行中的后台重算（保留引用，避免任务被回收）
+
+    async def get(self, key, compute):
+        """
+        Returns:
+            (值, 计算时间, 是否为过期结果)
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return await self._compute(key, compute) + (False,)
+        computed_at, value = entry
+        if time.time() - computed_at < self.fresh_for:
+            return value, computed_at, False
+
+        if key not in self._refreshing:
+            self._refreshing.add(key)
+            # 独立任务：请求超时或客户端断开取消请求时不影响重算
+            task = asyncio.ensure_future(self._revalidate(key, compute))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return value, computed_at, True
+
+    async def _compute(self, key, compute):
+        value = await compute()
+        computed_at = time.time()
+        self._entries[key] = (computed_at, value)
+        return value, computed_at
+
+    async def _revalidate(self, key, compute):
+        try:
+            await self._compute(key, compute)
+        except Exception as e:
+            logger.warning(f"后台重算降级结果失败，继续返回旧结果: {e}")
+        finally:
+            self._refreshing.discard(key)
+
+
+def _window_start():
+    """近期窗口起点（按数据库时间，与原实时查询的 NOW() 一致），作为常量传入以便裁剪分区"""
+    rows = yield "SELECT DATE_SUB(NOW(), INTERVAL %s DAY) AS since", (WINDOW_DAYS,)
+    return rows[0]['since']
+
+
+def _window_counts(sql, ids, type_codes, window_params):
+    """候选 ID 在窗口内按类型的事件数：{(id, type_code): 数量}"""
+    placeholders = ', '.join(['%s'] * len(ids))
+    types = ', '.join(['%s'] * len(type_codes))
+    rows = yield sql.format(ids=placeholders, types=types), list(ids) + list(type_codes) + list(window_params)
+    return {(row['id'], row['type_code']): int(row['count']) for row in rows}
+
+
+def _rank(rows, id_column, counts, event_columns):
+    for position, row in enumerate(rows, 1):
+        for column, type_code in event_columns.items():
+            row[column] = counts.get((row[id_column], type_code), 0)
+        row['rank_position'] = position
+    return rows
+
+
+def fallback_repos_steps(schema, limit):
+    """按总星标取前 limit 个仓库，再统计其近 7 天的星标/Fork/PR 事件（分步查询，见 query_steps）"""
+    name_column = schema.column('repos', 'name', 'full_name')
+    stars_column = schema.column('repos', 'total_stars', 'stargazers_count')
+    rows = yield f"""
+        SELECT repo_id, `{name_column}` AS repo_name, COALESCE(`{stars_column}`, 0) AS score
+        FROM repos
+        ORDER BY `{stars_column}` DESC
+        LIMIT %s
+    """, (limit,)
+    repos = list(rows)
+    if not repos:
+        return repos
+    since = yield from _window_start()
+    counts = yield from _window_counts("""
+        SELECT repo_id AS id, type_code, COUNT(*) AS count
+        FROM events
+        WHERE repo_id IN ({ids}) AND type_code IN ({types})
+          AND created_at >= %s AND created_at_date >= %s
+        GROUP BY repo_id, type_code
+    """, [row['repo_id'] for row in repos], REPO_EVENT_COLUMNS.values(), (since, since.date()))
+    return _rank(repos, 'repo_id', counts, REPO_EVENT_COLUMNS)
+
+
+def fallback_developers_steps(schema, limit):
+    """按总事件数取前 limit 个开发者，再统计其近 7 天的 Push/PR/Issue 事件（分步查询，见 query_steps）"""
+    login_column = schema.column('actors', 'login', 'username')
+    events_column = schema.column('actors', 'total_events', 'public_events')
+    rows = yield f"""
+        SELECT actor_id, `{login_column}` AS actor_login, COALESCE(`{events_column}`, 0) AS activity_score
+        FROM actors
+        ORDER BY `{events_column}` DESC
+        LIMIT %s
+    """, (limit,)
+    developers = list(rows)
+    if not developers:
+        return developers
+    # 窗口按整天计，存在 idx_actor_type_date 时可作为覆盖索引，不回表
+    since = yield from _window_start()
+    counts = yield from _window_counts("""
+        SELECT actor_id AS id, type_code, COUNT(*) AS count
+        FROM events
+        WHERE actor_id IN ({ids}) AND type_code IN ({types})
+          AND created_at_date >= %s
+        GROUP BY actor_id, type_code
+    """, [row['actor_id'] for row in developers], ACTOR_EVENT_COLUMNS.values(), (since.date(),))
+    return _rank(developers, 'actor_id', counts, ACTOR_EVENT_COLUMNS)
+
+
+def fallback_repos(cursor, schema, limit):
+    """同 fallback_repos_steps，用同步游标执行"""
+    return query_steps.run(cursor, fallback_repos_steps(schema, limit))
+
+
+def fallback_developers(cursor, schema, limit):
+    """同 fallback_developers_steps，用同步游标执行"""
+    return query_steps.run(cursor, fallback_developers_steps(schema, limit))